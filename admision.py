@@ -0,0 +1,215 @@
+"""
+Control de admisión de las escrituras públicas (POST /api/reportes y /bulk),
+para que una ráfaga de envíos no deje sin hilos ni BD al dashboard.
+
+- Cubetas de tokens por IP (`creado_por_ip`) y por baño (`id_bano`):
+  ADMISION_IP_POR_MIN / ADMISION_IP_RAFAGA y ADMISION_BANO_POR_MIN /
+  ADMISION_BANO_RAFAGA (0 = sin límite). Sin tokens, la app responde 429 con
+  Retry-After = lo que falta para que alcancen.
+- Por defecto las cubetas viven en memoria de cada worker (el límite real es
+  el configurado × workers). ADMISION_STORE=<ruta> las guarda en un archivo
+  SQLite que comparten todos los workers del mismo host.
+- Presupuestos de hilos por proceso: como mucho ADMISION_ESCRITURAS
+  escrituras, ADMISION_LECTURAS lecturas cortas de la API del dashboard y
+  ADMISION_STREAMS respuestas largas (exportación, SSE) a la vez; por omisión
+  se reparten los WEB_THREADS sin pasarse (3/8 escrituras, 2/8 streams y el
+  resto lecturas). La que no consigue lugar en ADMISION_ESPERA_MS recibe 503
+  + Retry-After en vez de hacer cola: ni las escrituras ni las descargas
+  largas ocupan todos los hilos de gthread, y los KPIs siempre tienen lugar.
+  El tope de clientes SSE (eventos.STREAM_MAX_CLIENTES) sale de
+  ADMISION_STREAMS.
+- Cada rechazo suma `admision_rechazos_total{motivo, endpoint}` en /api/metrics.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+import metricas
+
+ADMISION_IP_POR_MIN = float(os.getenv("ADMISION_IP_POR_MIN", "30"))
+ADMISION_IP_RAFAGA = float(os.getenv("ADMISION_IP_RAFAGA", "60"))
+ADMISION_BANO_POR_MIN = float(os.getenv("ADMISION_BANO_POR_MIN", "10"))
+ADMISION_BANO_RAFAGA = float(os.getenv("ADMISION_BANO_RAFAGA", "20"))
+ADMISION_STORE = os.getenv("ADMISION_STORE", "").strip()
+WEB_THREADS = int(os.getenv("WEB_THREADS", "8"))                  # --threads de gunicorn
+# Por proceso, suman WEB_THREADS; con 8 hilos: 3 escrituras, 3 lecturas cortas, 2 streams
+ADMISION_ESCRITURAS = int(os.getenv("ADMISION_ESCRITURAS") or max(1, WEB_THREADS * 3 // 8))
+ADMISION_STREAMS = int(os.getenv("ADMISION_STREAMS") or max(1, WEB_THREADS * 2 // 8))
+ADMISION_LECTURAS = int(
+    os.getenv("ADMISION_LECTURAS") or max(1, WEB_THREADS - ADMISION_ESCRITURAS - ADMISION_STREAMS)
+)
+ADMISION_ESPERA_MS = float(os.getenv("ADMISION_ESPERA_MS", "50"))
+ADMISION_REINTENTO_S = int(os.getenv("ADMISION_REINTENTO_S", "2"))  # Retry-After de los 503
+ADMISION_MAX_CLAVES = int(os.getenv("ADMISION_MAX_CLAVES", "10000"))  # cubetas en memoria
+
+log = logging.getLogger(__name__)
+
+metricas.registrar_contador(
+    "admision_rechazos_total", "Peticiones (o reportes de un lote) rechazadas por control de admisión"
+)
+
+
+def contar_rechazo(motivo: str, endpoint: str, n: int = 1) -> None:
+    metricas.registro.incrementar("admision_rechazos_total", n, motivo=motivo, endpoint=endpoint)
+
+
+def _rellenar(
+    estado: Optional[Tuple[float, float]], tasa: float, rafaga: float, costo: float, ahora: float
+) -> Tuple[float, float]:
+    """(tokens, t) guardados -> (tokens restantes, espera en s; 0 = admitido)."""
+    if estado is None:
+        tokens = rafaga
+    else:
+        tokens = min(rafaga, estado[0] + max(0.0, ahora - estado[1]) * tasa)
+    costo = min(costo, rafaga)   # un lote más grande que la ráfaga pasa con la cubeta llena
+    if tokens >= costo:
+        return tokens - costo, 0.0
+    return tokens, (costo - tokens) / tasa
+
+
+class AlmacenMemoria:
+    """Cubetas del proceso: clave -> (tokens, t monotónico), LRU acotado."""
+
+    def __init__(self, max_claves: int = ADMISION_MAX_CLAVES):
+        self.max_claves = max_claves
+        self._lock = threading.Lock()
+        self._datos: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def tomar(self, pedidos: Sequence[Tuple[str, float]], tasa: float, rafaga: float) -> List[float]:
+        ahora = time.monotonic()
+        esperas = []
+        with self._lock:
+            for clave, costo in pedidos:
+                tokens, espera = _rellenar(self._datos.get(clave), tasa, rafaga, costo, ahora)
+                self._datos[clave] = (tokens, ahora)
+                self._datos.move_to_end(clave)
+                esperas.append(espera)
+            # Lo más viejo queda al frente; olvidar una cubeta llena no cambia nada
+            lleno_s = rafaga / tasa
+            while self._datos:
+                clave, (_, t) = next(iter(self._datos.items()))
+                if ahora - t < lleno_s and len(self._datos) <= self.max_claves:
+                    break
+                del self._datos[clave]
+        return esperas
+
+
+class AlmacenSqlite:
+    """
+    Cubetas en un archivo SQLite compartido por los workers del host (t en
+    tiempo de reloj). Cada llamada es una transacción BEGIN IMMEDIATE corta;
+    una conexión por hilo.
+    """
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._local = threading.local()
+        self._llamadas = 0
+
+    def _conexion(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.ruta, timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")   # perder cubetas en un apagón no importa
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cubetas ("
+                "clave TEXT PRIMARY KEY, tokens REAL NOT NULL, t REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def tomar(self, pedidos: Sequence[Tuple[str, float]], tasa: float, rafaga: float) -> List[float]:
+        conn = self._conexion()
+        ahora = time.time()
+        esperas = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for clave, costo in pedidos:
+                fila = conn.execute("SELECT tokens, t FROM cubetas WHERE clave = ?", (clave,)).fetchone()
+                tokens, espera = _rellenar(fila, tasa, rafaga, costo, ahora)
+                conn.execute(
+                    "INSERT INTO cubetas (clave, tokens, t) VALUES (?, ?, ?) "
+                    "ON CONFLICT(clave) DO UPDATE SET tokens = excluded.tokens, t = excluded.t",
+                    (clave, tokens, ahora),
+                )
+                esperas.append(espera)
+            self._llamadas += 1
+            if self._llamadas % 1000 == 0:
+                # Cubetas ya llenas otra vez: equivalen a no tener fila
+                prefijo = pedidos[0][0].split(":", 1)[0] if pedidos else ""
+                conn.execute(
+                    "DELETE FROM cubetas WHERE clave LIKE ? AND t < ?",
+                    (f"{prefijo}:%", ahora - rafaga / tasa),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return esperas
+
+
+class Cubeta:
+    """Cubeta de tokens por clave: `por_min` tokens por minuto, hasta `rafaga` acumulados."""
+
+    def __init__(self, nombre: str, por_min: float, rafaga: float, almacen):
+        self.nombre = nombre
+        self.tasa = por_min / 60.0
+        self.rafaga = max(1.0, rafaga)
+        self.almacen = almacen
+
+    @property
+    def activa(self) -> bool:
+        return self.tasa > 0
+
+    def tomar_varios(self, pedidos: Sequence[Tuple[str, float]]) -> List[float]:
+        """
+        Cobra cada (clave, costo) en orden. Devuelve, por pedido, 0 si se admitió
+        o los segundos que faltan para que alcance (sin cobrar). Si el almacén
+        compartido falla se admite todo: la admisión no debe tumbar el envío.
+        """
+        if not self.activa or not pedidos:
+            return [0.0] * len(pedidos)
+        try:
+            return self.almacen.tomar(
+                [(f"{self.nombre}:{clave}", costo) for clave, costo in pedidos], self.tasa, self.rafaga
+            )
+        except sqlite3.Error as e:
+            log.warning(f"Admisión: almacén de cubetas no disponible ({e}); se admite")
+            return [0.0] * len(pedidos)
+
+    def tomar(self, clave: str, costo: float = 1.0) -> float:
+        return self.tomar_varios([(clave, costo)])[0]
+
+
+class Presupuesto:
+    """Cupos de hilos de este proceso para un tipo de petición (0 = sin límite)."""
+
+    def __init__(self, maximo: int, espera_s: float = ADMISION_ESPERA_MS / 1000):
+        self.maximo = maximo
+        self.espera_s = espera_s
+        self._sem = threading.BoundedSemaphore(maximo) if maximo > 0 else None
+
+    def entrar(self) -> bool:
+        return self._sem is None or self._sem.acquire(timeout=self.espera_s)
+
+    def salir(self) -> None:
+        if self._sem is not None:
+            self._sem.release()
+
+
+def _almacen():
+    return AlmacenSqlite(ADMISION_STORE) if ADMISION_STORE else AlmacenMemoria()
+
+
+por_ip = Cubeta("ip", ADMISION_IP_POR_MIN, ADMISION_IP_RAFAGA, _almacen())
+por_bano = Cubeta("bano", ADMISION_BANO_POR_MIN, ADMISION_BANO_RAFAGA, _almacen())
+escrituras = Presupuesto(ADMISION_ESCRITURAS)
+lecturas = Presupuesto(ADMISION_LECTURAS)
+streams = Presupuesto(ADMISION_STREAMS)
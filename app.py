@@ -1,23 +1,117 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory, redirect, url_for
-from werkzeug.utils import secure_filename
-import os, datetime
+from flask import Flask, request, jsonify, render_template, send_from_directory, redirect, url_for, g, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.middleware.proxy_fix import ProxyFix
+import os, io, csv, contextlib, zlib, datetime, hashlib, json, math, queue, threading, time
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FuturoTimeout
 from pathlib import Path
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError, OperationalError
 from zoneinfo import ZoneInfo  # Python 3.9+
 
 # Importa helpers ORM (tu models.py actual ya está OK)
 from models import (
-    SessionLocal, init_db,
-    get_banos, create_reporte, list_reportes, fetch_rows_for_kpis,
-    Bano
+    SessionLocal, sesion_lectura,
+    get_bano, catalogo_banos,
+    create_reporte, reporte_por_uuid, insertar_lote_cliente, validar_bano, creado_cliente,
+    ORIGENES_CLIENTE,
+    list_reportes, kpis_resumen, kpis_heatmap, kpis_series, marca_agua,
+    reportes_desde, iter_reportes, COLUMNAS_EXPORT, iniciar_mantenimiento_sqlite,
 )
+from migraciones import SCHEMA_VERSION, AUTO_MIGRATE, version_esquema, migrar, sembrar_banos
+from eventos import difusor
+from escritura import cola_escritura, GROUP_COMMIT_TIMEOUT_S
+import fotos
+import admision
+import assets
+import codigos_qr
+import idempotencia
+import metricas
+
+STREAM_MAX_S = float(os.getenv("STREAM_MAX_S", "300"))    # el navegador reconecta solo
+STREAM_PING_S = float(os.getenv("STREAM_PING_S", "15"))
+BULK_MAX = int(os.getenv("BULK_MAX", "100"))              # reportes por lote de la cola offline
+PROXY_SALTOS = int(os.getenv("PROXY_SALTOS", "0"))        # proxies delante (Render: 1) para la IP real
+
+# Presupuesto de hilos (admision.py) de cada endpoint; los streams ocupan su
+# hilo minutos y van aparte para no dejar sin lugar a las lecturas cortas
+ENDPOINTS_ESCRITURA = {"crear_reporte", "crear_reportes_bulk"}
+ENDPOINTS_LECTURA = {"reportes_list", "kpis", "kpis_heatmap_api", "kpis_series_api"}
+ENDPOINTS_STREAM = {"reportes_export", "stream"}
+
+class CacheRespuestas:
+    """
+    LRU en memoria de cuerpos JSON ya serializados, por clave de filtros.
+    Cada entrada guarda la marca de agua con la que se calculó; si la marca
+    cambió (llegó un reporte, cambió el catálogo) se recalcula.
+    """
+
+    def __init__(self, max_items: int = 256):
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+    def get(self, key, marca):
+        with self._lock:
+            hit = self._items.get(key)
+            if hit is None or hit[0] != marca:
+                return None
+            self._items.move_to_end(key)
+            return hit[1]
+
+    def put(self, key, marca, body: bytes) -> None:
+        with self._lock:
+            self._items[key] = (marca, body)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+
+# JSON_ENGINE=orjson (requiere `pip install orjson`) serializa las respuestas
+# con orjson; sin el paquete se usa el json de la biblioteca estándar.
+JSON_ENGINE = os.getenv("JSON_ENGINE", "std").strip().lower()
+
+
+def proveedor_json(app):
+    """Proveedor JSON de Flask con orjson, o None si no aplica."""
+    if JSON_ENGINE != "orjson":
+        return None
+    try:
+        import orjson
+    except ImportError:
+        app.logger.warning("JSON_ENGINE=orjson pero orjson no está instalado; se usa json")
+        return None
+
+    opciones = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    class ProveedorOrjson(DefaultJSONProvider):
+        # Mismas llaves ordenadas y mismo `default` (fechas HTTP, Decimal, UUID)
+        # que el proveedor de Flask; el texto sale en UTF-8 sin escapar
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj, default=self.default, option=opciones).decode()
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+    return ProveedorOrjson(app)
+
 
 def create_app():
     app = Flask(__name__, template_folder="templates", static_folder="static")
+    app.json = proveedor_json(app) or app.json
 
     # --- Config básica ---
     app.config["UPLOAD_FOLDER"] = os.getenv("UPLOAD_FOLDER", "uploads")
     app.config["MAX_CONTENT_LENGTH"] = 3 * 1024 * 1024  # 3 MB para uploads
     Path(app.config["UPLOAD_FOLDER"]).mkdir(parents=True, exist_ok=True)
+    if PROXY_SALTOS:
+        # X-Forwarded-For/-Proto del proxy: remote_addr (creado_por_ip y las
+        # cubetas por IP) es el cliente y no el balanceador
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_SALTOS, x_proto=PROXY_SALTOS)
+
+    # Assets con huella + gzip/brotli + WebP/AVIF ya calculados en el build
+    # (`manage.py assets`): aquí solo se lee el manifiesto; plantillas usan asset_url()
+    assets.registrar(app)
 
     # ---- Helpers de fecha / Zona Horaria ----
     DEFAULT_TZ = os.getenv("DEFAULT_TZ", "America/Monterrey")
@@ -42,48 +136,139 @@ def create_app():
         except Exception:
             return datetime.timezone(datetime.timedelta(hours=-6))
 
-    # ---- Init schema + semilla (idempotente) ----
-    def ensure_seed():
+    def campos_pedidos():
+        """?fields=a,b,c -> ["a", "b", "c"] (None si no se pidió)."""
+        valor = request.args.get("fields") or ""
+        return [c.strip() for c in valor.split(",") if c.strip()] or None
+
+    def fechas_pedidas():
         """
-        Crea tablas si no existen (init_db) y agrega la semilla de baños
-        SOLO si la tabla 'banos' está vacía. Funciona con Postgres/SQLite.
+        (desde, hasta) de ?desde=&hasta= como 'YYYY-MM-DD' (None si faltan).
+        ValueError si alguna no es fecha: el endpoint responde 400.
         """
-        init_db()
-        seed_banos = [
-            # RH
-            ("RH-PB-H", "Baños RH – Planta Baja Hombres", "RH", "PB", "Hombres", True),
-            ("RH-PB-M", "Baños RH – Planta Baja Mujeres", "RH", "PB", "Mujeres", True),
-            ("RH-PA-H", "Baños RH – Planta Alta Hombres", "RH", "PA", "Hombres", True),
-            ("RH-PA-M", "Baños RH – Planta Alta Mujeres", "RH", "PA", "Mujeres", True),
-            # Planta 1
-            ("P1-ADM-H",  "Baños Planta 1 – Administrativos Hombres", "Planta 1", "1", "Hombres", True),
-            ("P1-ADM-M",  "Baños Planta 1 – Administrativos Mujeres", "Planta 1", "1", "Mujeres", True),
-            ("P1-PROD-H", "Baños Planta 1 – Producción Hombres",     "Planta 1", "1", "Hombres", True),
-            ("P1-PROD-M", "Baños Planta 1 – Producción Mujeres",     "Planta 1", "1", "Mujeres", True),
-            # Planta 2
-            ("P2-H", "Baños Planta 2 Hombres", "Planta 2", "2", "Hombres", True),
-            ("P2-M", "Baños Planta 2 Mujeres", "Planta 2", "2", "Mujeres", True),
-            # Planta 3
-            ("P3-H", "Baños Planta 3 Hombres", "Planta 3", "3", "Hombres", True),
-            ("P3-M", "Baños Planta 3 Mujeres", "Planta 3", "3", "Mujeres", True),
-        ]
-        with SessionLocal() as s:
-            have_any = s.query(Bano).count() > 0
-            if not have_any:
-                for id_, nombre, zona, piso, sexo, activo in seed_banos:
-                    s.add(Bano(id=id_, nombre=nombre, zona=zona, piso=piso, sexo=sexo, activo=bool(activo)))
-                s.commit()
-                print(f"[seed] Insertados {len(seed_banos)} baños.")
-            else:
-                print("[seed] Ya existen baños; no se inserta.")
-
-    # Ejecuta init+seed al arrancar el proceso
+        fechas = []
+        for k in ("desde", "hasta"):
+            valor = (request.args.get(k) or "").strip() or None
+            if valor is not None:
+                try:
+                    datetime.date.fromisoformat(valor)
+                except ValueError:
+                    raise ValueError(f"Fecha inválida en '{k}' (usa AAAA-MM-DD)") from None
+            fechas.append(valor)
+        return tuple(fechas)
+
+    # ---- Caché de respuestas + peticiones condicionales ----
+    cache_respuestas = CacheRespuestas(int(os.getenv("RESP_CACHE_MAX", "256")))
+
+    def respuesta_cacheada(calcular, tzinfo):
+        """
+        Sirve el JSON de `calcular()` desde caché mientras la marca de agua
+        (último id, número de reportes y catálogo) no cambie. Con If-None-Match
+        vigente responde 304 sin calcular nada.
+        """
+        # Los vacíos cuentan: ?cursor= (primera página por cursor) no es la paginación por offset
+        args = tuple(sorted(
+            (k, v.strip()) for k, v in request.args.items(multi=True) if k != "tz"
+        ))
+        key = (request.path, args, getattr(tzinfo, "key", str(tzinfo)))
+        with sesion_lectura() as s:
+            marca, ultimo = marca_agua(s)
+        etag = hashlib.sha1(repr((key, marca)).encode()).hexdigest()[:20]
+
+        body = None
+        if etag not in request.if_none_match:
+            body = cache_respuestas.get(key, marca)
+            if body is None:
+                datos = calcular()
+                t0 = time.perf_counter()
+                # Mismos bytes con o sin orjson: compacto, UTF-8 sin escapar
+                # (el proveedor orjson ignora estos argumentos: ya es así)
+                body = app.json.dumps(datos, separators=(",", ":"), ensure_ascii=False).encode()
+                metricas.tramo("ser", time.perf_counter() - t0)
+                cache_respuestas.put(key, marca, body)
+        resp = app.response_class(body or b"", mimetype="application/json")
+        resp.set_etag(etag)
+        if ultimo is not None:
+            resp.last_modified = ultimo
+        resp.headers["Cache-Control"] = "no-cache"
+        return resp.make_conditional(request)
+
+    # ---- Esquema: las migraciones corren en `manage.py migrate` (una vez por
+    # deploy); el worker solo compara la versión (una consulta) ----
     try:
-        ensure_seed()
+        version = version_esquema()
+        if version < SCHEMA_VERSION:
+            if AUTO_MIGRATE:
+                migrar()
+                sembrar_banos()
+            else:
+                app.logger.warning(
+                    f"Esquema en versión {version}, se esperaba {SCHEMA_VERSION}: "
+                    "ejecuta `python manage.py migrate`"
+                )
     except Exception as e:
-        # No bloquea el arranque si falla la seed por permisos/conexión,
-        # pero deja huella en logs para diagnosticar.
-        app.logger.warning(f"Seed/init warning: {e}")
+        # No bloquea el arranque si la BD no responde; deja huella en logs
+        app.logger.warning(f"Schema check warning: {e}")
+
+    # Checkpoint/optimize periódico si SQLITE_MODO=produccion
+    iniciar_mantenimiento_sqlite()
+
+    # ---- Métricas por petición + Server-Timing ----
+    @app.before_request
+    def metricas_inicio():
+        metricas.iniciar_peticion()
+
+    @app.after_request
+    def metricas_fin(resp):
+        endpoint = request.url_rule.rule if request.url_rule else "sin_ruta"
+        timing = metricas.terminar_peticion(endpoint, request.method, resp.status_code)
+        if timing:
+            resp.headers["Server-Timing"] = timing
+        return resp
+
+    # ---- Control de admisión: presupuestos de hilos + cubetas (admision.py) ----
+    def rechazo(status, motivo, espera_s, n=1):
+        endpoint = request.url_rule.rule if request.url_rule else "sin_ruta"
+        admision.contar_rechazo(motivo, endpoint, n)
+        if status == 429:
+            error = "Demasiados reportes seguidos, intenta en unos segundos"
+        else:
+            error = "Servidor ocupado, intenta de nuevo"
+        resp = jsonify({"ok": False, "error": error})
+        resp.status_code = status
+        resp.headers["Retry-After"] = str(max(1, math.ceil(espera_s)))
+        return resp
+
+    @app.before_request
+    def admision_entrada():
+        if request.endpoint in ENDPOINTS_ESCRITURA:
+            presupuesto, motivo = admision.escrituras, "escrituras"
+        elif request.endpoint in ENDPOINTS_LECTURA:
+            presupuesto, motivo = admision.lecturas, "lecturas"
+        elif request.endpoint in ENDPOINTS_STREAM:
+            presupuesto, motivo = admision.streams, "streams"
+        else:
+            return None
+        if not presupuesto.entrar():
+            return rechazo(503, motivo, admision.ADMISION_REINTENTO_S)
+        g.admision_presupuesto = presupuesto
+        return None
+
+    @app.teardown_request
+    def admision_salida(_exc):
+        presupuesto = g.pop("admision_presupuesto", None)
+        if presupuesto is not None:
+            presupuesto.salir()
+
+    @app.errorhandler(OperationalError)
+    def db_operational_error(e):
+        # statement_timeout de lecturas (DB_READ_STATEMENT_TIMEOUT_MS) u otra
+        # falla transitoria de BD: 503 para que el cliente reintente
+        app.logger.warning(f"DB error: {e.orig if hasattr(e, 'orig') else e}")
+        resp = jsonify({"ok": False, "error": "Base de datos ocupada, intenta de nuevo"})
+        resp.status_code = 503
+        resp.headers["Retry-After"] = "5"
+        return resp
 
     @app.route("/")
     def index():
@@ -94,9 +279,8 @@ def create_app():
     def qr_form():
         id_bano = (request.args.get("r") or "").strip()
         with SessionLocal() as s:
-            mapa = {b["id"]: b for b in get_banos(s, solo_activos=True)}
-        bano = mapa.get(id_bano)
-        if not bano:
+            bano = get_bano(s, id_bano)
+        if not bano or not bano["activo"]:
             return render_template("not_found.html"), 404
         return render_template("qr_form.html", bano=bano)
 
@@ -107,56 +291,211 @@ def create_app():
         id_bano = (data.get("id_bano") or "").strip()
         categoria = (data.get("categoria") or "").strip()
         comentario = (data.get("comentario") or "").strip()
+        origen = data.get("origen") if data.get("origen") in ORIGENES_CLIENTE else "qr"
+        # Reporte con foto que esperó en la cola offline (js/cola.js): conserva
+        # su hora, y la ventana de doble toque solo aplica si es reciente
+        ahora = datetime.datetime.now(datetime.timezone.utc)
+        creado_en = creado_cliente(data["creado_en"], ahora) if data.get("creado_en") else None
+        reciente = creado_en is None or (ahora - creado_en).total_seconds() < idempotencia.recientes.ttl
 
         if not id_bano or not categoria:
             return jsonify({"ok": False, "error": "Faltan campos"}), 400
-
-        # foto opcional
-        foto_url = None
+        espera = admision.por_ip.tomar(request.remote_addr or "")
+        if espera:
+            return rechazo(429, "ip", espera)
+
+        # Reintento (Idempotency-Key) o doble toque: responde con el reporte
+        # original sin escribir nada
+        clave = idempotencia.normalizar_clave(
+            request.headers.get("Idempotency-Key") or data.get("idempotency_key")
+        )
+        firma = (id_bano, categoria, request.remote_addr)
+        rep_id = None
+        if clave:
+            rep_id = idempotencia.claves.buscar(clave)
+            if rep_id is None:
+                with SessionLocal() as s:
+                    rep_id = reporte_por_uuid(s, clave)
+        if rep_id is None and reciente:
+            rep_id = idempotencia.recientes.buscar(firma)
+        if rep_id is not None:
+            return jsonify({"ok": True, "reporte_id": rep_id, "duplicado": True})
+        # Baño válido antes de gastar su cubeta o copiar la foto a disco
+        try:
+            with SessionLocal() as s:
+                validar_bano(s, id_bano)
+        except ValueError as e:
+            return jsonify({"ok": False, "error": str(e)}), 400
+        # Los duplicados no escriben: solo los reportes nuevos gastan del baño
+        espera = admision.por_bano.tomar(id_bano)
+        if espera:
+            return rechazo(429, "bano", espera)
+
+        # foto opcional: se copia a disco aquí; el WebP/miniatura se generan
+        # en segundo plano (fotos.py)
+        foto_url = foto_thumb_url = None
+        digest = None
+        foto_nueva = False
         if "foto" in request.files and request.files["foto"].filename:
             f = request.files["foto"]
             allowed = {"png", "jpg", "jpeg", "webp"}
             ext = f.filename.rsplit(".", 1)[-1].lower() if "." in f.filename else ""
             if ext not in allowed:
                 return jsonify({"ok": False, "error": "Extensión no permitida"}), 400
-            ts = datetime.datetime.now().strftime("%Y%m%d%H%M%S_")
-            fname = ts + secure_filename(f.filename)
-            fpath = os.path.join(app.config["UPLOAD_FOLDER"], fname)
-            f.save(fpath)
-            foto_url = f"/uploads/{fname}"
+            metricas.registro.observar("upload_bytes", request.content_length or 0)
+            digest, foto_nueva = fotos.guardar_subida(f, app.config["UPLOAD_FOLDER"], ext)
+            foto_url, foto_thumb_url = fotos.urls(digest)
+
+        def confirmar(rep_id):
+            if digest:
+                fotos.encolar(app.config["UPLOAD_FOLDER"], digest)
+            if clave:
+                idempotencia.claves.guardar(clave, rep_id)
+            if reciente:
+                idempotencia.recientes.guardar(firma, rep_id)
+
+        def descartar_foto():
+            # Solo si este envío la creó: con otro contenido igual, es de otro reporte
+            if digest and foto_nueva:
+                fotos.descartar_subida(app.config["UPLOAD_FOLDER"], digest, ext)
 
         try:
-            with SessionLocal() as s:
-                rep_id = create_reporte(
-                    s,
-                    id_bano=id_bano,
-                    categoria=categoria,
-                    comentario=comentario or None,
-                    foto_url=foto_url,
-                    origen="qr",
-                    creado_por_ip=request.remote_addr,
-                )
+            fila = dict(
+                id_bano=id_bano,
+                categoria=categoria,
+                comentario=comentario or None,
+                foto_url=foto_url,
+                foto_thumb_url=foto_thumb_url,
+                origen=origen,
+                creado_por_ip=request.remote_addr,
+                uuid_cliente=clave,
+            )
+            if creado_en is not None:
+                fila["creado_en"] = creado_en
+            if cola_escritura is not None:
+                # Group commit: ya se validó arriba; el hilo escritor inserta en lote
+                fut = cola_escritura.encolar(fila)
+                try:
+                    rep_id = fut.result(timeout=GROUP_COMMIT_TIMEOUT_S)
+                except FuturoTimeout:
+                    # Sigue en la cola y puede guardarse después: no es un error
+                    # definitivo. Al resolverse se registra como si hubiera
+                    # terminado a tiempo, así un reintento cae en la ventana de
+                    # duplicados en vez de crear otro reporte.
+                    fut.add_done_callback(
+                        lambda f: descartar_foto() if f.exception() else confirmar(f.result())
+                    )
+                    resp = jsonify({
+                        "ok": False, "pendiente": True,
+                        "error": "El guardado está tardando; es posible que el reporte ya se haya registrado",
+                    })
+                    resp.status_code = 503
+                    resp.headers["Retry-After"] = "5"
+                    return resp
+            else:
+                with SessionLocal() as s:
+                    rep_id = create_reporte(s, **fila)
+            confirmar(rep_id)
             return jsonify({"ok": True, "reporte_id": rep_id})
         except ValueError as e:
+            descartar_foto()
             return jsonify({"ok": False, "error": str(e)}), 400
+        except IntegrityError:
+            # Misma Idempotency-Key en paralelo (otro worker): ganó el otro
+            with SessionLocal() as s:
+                rep_id = reporte_por_uuid(s, clave) if clave else None
+            if rep_id is None:
+                descartar_foto()
+                return jsonify({"ok": False, "error": "Error al guardar"}), 500
+            return jsonify({"ok": True, "reporte_id": rep_id, "duplicado": True})
         except Exception:
+            descartar_foto()
             return jsonify({"ok": False, "error": "Error al guardar"}), 500
 
+    @app.route("/api/reportes/bulk", methods=["POST"])
+    def crear_reportes_bulk():
+        """
+        Lote de la cola offline del kiosko/QR: {"reportes": [{uuid, id_bano,
+        categoria, comentario?, creado_en?, origen?}]}. Una transacción por
+        lote; reenviar un uuid devuelve el mismo reporte_id.
+
+        Cada reporte gasta un token de la IP (el lote entero se rechaza con
+        429). Solo los reportes que de verdad se van a insertar (ni uuid ya
+        guardado ni doble toque) gastan uno de su baño; los que no alcanzan
+        vuelven con `reintentar: true` y la cola del cliente los conserva.
+        """
+        data = request.get_json(silent=True) or {}
+        items = data.get("reportes")
+        if not isinstance(items, list) or not items:
+            return jsonify({"ok": False, "error": "Faltan reportes"}), 400
+        if len(items) > BULK_MAX:
+            return jsonify({"ok": False, "error": f"Máximo {BULK_MAX} reportes por lote"}), 413
+        espera = admision.por_ip.tomar(request.remote_addr or "", len(items))
+        if espera:
+            return rechazo(429, "ip", espera)
+
+        with SessionLocal() as s:
+            resultados = insertar_lote_cliente(
+                s, items, creado_por_ip=request.remote_addr, recientes=idempotencia.recientes,
+                admitir=lambda banos: admision.por_bano.tomar_varios([(b, 1) for b in banos]),
+            )
+        esperas = [x["reintentar_en_s"] for x in resultados if x.get("reintentar")]
+        if esperas and len(esperas) == len(resultados):
+            return rechazo(429, "bano", min(esperas), len(esperas))
+        if esperas:
+            admision.contar_rechazo("bano", request.url_rule.rule, len(esperas))
+        return jsonify({"ok": True, "resultados": resultados})
+
     @app.route("/uploads/<path:fname>")
     def uploads(fname):
-        return send_from_directory(app.config["UPLOAD_FOLDER"], fname)
+        nombre, pendiente = fotos.resolver(app.config["UPLOAD_FOLDER"], fname)
+        if pendiente:
+            # El WebP sin EXIF aún no existe: marcador que el navegador no guarda
+            resp = app.response_class(fotos.PENDIENTE_SVG, mimetype="image/svg+xml")
+            resp.headers["Cache-Control"] = "no-store"
+            return resp
+        if nombre is None:
+            return jsonify({"ok": False, "error": "No encontrado"}), 404
+        # Los nombres son por contenido: el derivado nunca cambia
+        return send_from_directory(app.config["UPLOAD_FOLDER"], nombre, max_age=31536000)
 
     # ---------- API: catálogo de baños ----------
     @app.route("/api/banos")
     def api_banos():
-        with SessionLocal() as s:
-            return jsonify(get_banos(s, solo_activos=True))
+        with sesion_lectura() as s:
+            cat = catalogo_banos.obtener(s)
+        resp = jsonify(cat.activos)
+        resp.set_etag(f"banos-{cat.etag}")
+        resp.headers["Cache-Control"] = "no-cache"
+        return resp.make_conditional(request)
+
+    @app.route("/api/banos/<id_bano>/qr.png")
+    def api_bano_qr(id_bano):
+        """
+        Código QR del baño. Se dibuja una vez por huella (URL + estilo) y se
+        sirve desde caché; con ?v=<huella> (la del ETag) es inmutable.
+        """
+        with sesion_lectura() as s:
+            bano = get_bano(s, id_bano)
+        if bano is None:
+            return jsonify({"ok": False, "error": "Baño no encontrado"}), 404
+        base = codigos_qr.QR_BASE_URL or url_for("qr_form", _external=True)
+        png, huella = codigos_qr.png_cacheado(id_bano, codigos_qr.url_bano(id_bano, base))
+        resp = app.response_class(png, mimetype="image/png")
+        resp.set_etag(huella)
+        if request.args.get("v") == huella:
+            resp.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        else:
+            resp.headers["Cache-Control"] = f"public, max-age={codigos_qr.QR_MAX_AGE}"
+        return resp.make_conditional(request)
 
     # ---------- API: lista paginada de reportes ----------
     @app.route("/api/reportes_list")
     def reportes_list():
-        desde = request.args.get("desde")
-        hasta = request.args.get("hasta")
+        try:
+            desde, hasta = fechas_pedidas()
+        except ValueError as e:
+            return jsonify({"ok": False, "error": str(e)}), 400
         zona  = request.args.get("zona")
         id_b  = request.args.get("id_bano")
         search = (request.args.get("q") or "").strip()
@@ -165,95 +504,277 @@ def create_app():
 
         page = int(request.args.get("page", 1))
         per_page = max(5, min(50, int(request.args.get("per_page", 10))))
+        # Paginación por cursor (opt-in): ?cursor= (vacío = primera página)
+        cursor = request.args.get("cursor")
+        total_modo = request.args.get("total")  # exact | estimate | none
+        campos = campos_pedidos()
+
+        def calcular():
+            with sesion_lectura() as s:
+                return list_reportes(
+                    s,
+                    desde=desde,
+                    hasta=hasta,
+                    zona=zona,
+                    id_bano=id_b,
+                    search=search,
+                    page=page,
+                    per_page=per_page,
+                    cursor=cursor,
+                    total_modo=total_modo,
+                    campos=campos,
+                    tzinfo=tzinfo,
+                )
 
-        with SessionLocal() as s:
-            data = list_reportes(
+        try:
+            return respuesta_cacheada(calcular, tzinfo)
+        except ValueError as e:
+            return jsonify({"ok": False, "error": str(e)}), 400
+
+    # ---------- API: exportación (CSV / NDJSON en streaming) ----------
+    @app.route("/api/reportes/export")
+    def reportes_export():
+        """
+        Mismos filtros que /api/reportes_list, sin paginar. ?formato=csv|ndjson,
+        ?gzip=1 comprime al vuelo. Memoria constante: filas por lotes desde un
+        cursor del servidor y respuesta en chunks.
+        """
+        formato = (request.args.get("formato") or "csv").lower()
+        if formato not in ("csv", "ndjson"):
+            return jsonify({"ok": False, "error": "Formato no soportado"}), 400
+        comprimir = request.args.get("gzip") in ("1", "true", "si")
+        CHUNK = 64 * 1024
+
+        # Filtros validados y cursor abierto antes de mandar el 200: un error
+        # aquí es un 400, no un CSV cortado. La sesión se cierra con la respuesta.
+        pila = contextlib.ExitStack()
+        try:
+            desde, hasta = fechas_pedidas()
+            s = pila.enter_context(sesion_lectura(timeout_ms=0))  # la exportación puede ser larga
+            filas = iter_reportes(
                 s,
                 desde=desde,
                 hasta=hasta,
-                zona=zona,
-                id_bano=id_b,
-                search=search,
-                page=page,
-                per_page=per_page,
+                zona=request.args.get("zona"),
+                id_bano=request.args.get("id_bano"),
+                search=(request.args.get("q") or "").strip(),
+                tzinfo=get_tz_from_request(),
             )
-
-        # añade creado_local a cada item
-        items2 = []
-        for it in data["items"]:
-            try:
-                raw = it.get("creado_en")
-                if isinstance(raw, str):
-                    # ISO con Z o con offset
-                    dt = datetime.datetime.fromisoformat(raw.replace("Z", "+00:00"))
+        except ValueError as e:
+            pila.close()
+            return jsonify({"ok": False, "error": str(e)}), 400
+        except BaseException:
+            pila.close()
+            raise
+
+        def filas_texto():
+            buf = io.StringIO()
+            if formato == "csv":
+                w = csv.DictWriter(buf, fieldnames=COLUMNAS_EXPORT)
+                w.writeheader()
+            for fila in filas:
+                if formato == "csv":
+                    w.writerow(fila)
                 else:
-                    dt = raw
-                if dt.tzinfo is None:
-                    dt = dt.replace(tzinfo=datetime.timezone.utc)
-                it["creado_local"] = dt.astimezone(tzinfo).isoformat()
-            except Exception:
-                it["creado_local"] = it.get("creado_en")
-            items2.append(it)
-        data["items"] = items2
-
-        return jsonify(data)
+                    buf.write(json.dumps(fila, ensure_ascii=False))
+                    buf.write("\n")
+                if buf.tell() >= CHUNK:
+                    yield buf.getvalue().encode("utf-8")
+                    buf.seek(0)
+                    buf.truncate()
+            if buf.tell():
+                yield buf.getvalue().encode("utf-8")
+
+        def cuerpo():
+            if not comprimir:
+                yield from filas_texto()
+                return
+            z = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> formato gzip
+            for chunk in filas_texto():
+                out = z.compress(chunk)
+                if out:
+                    yield out
+            yield z.flush()
+
+        nombre = "reportes." + formato + (".gz" if comprimir else "")
+        if comprimir:
+            mimetype = "application/gzip"
+        elif formato == "csv":
+            mimetype = "text/csv"
+        else:
+            mimetype = "application/x-ndjson"
+        # stream_with_context: el cupo de streams se libera al terminar de enviar
+        resp = app.response_class(
+            stream_with_context(cuerpo()),
+            mimetype=mimetype,
+            headers={"Content-Disposition": f'attachment; filename="{nombre}"'},
+        )
+        resp.call_on_close(pila.close)
+        return resp
 
     # ---------- API: KPIs ----------
     @app.route("/api/kpis")
     def kpis():
-        desde = request.args.get("desde")
-        hasta = request.args.get("hasta")
+        try:
+            desde, hasta = fechas_pedidas()
+        except ValueError as e:
+            return jsonify({"ok": False, "error": str(e)}), 400
         zona  = request.args.get("zona")
         id_b  = request.args.get("id_bano")
         tzinfo = get_tz_from_request()
-
-        with SessionLocal() as s:
-            rows = fetch_rows_for_kpis(
-                s, desde=desde, hasta=hasta, zona=zona, id_bano=id_b
-            )
-            banos_catalogo = {b["id"]: b for b in get_banos(s, solo_activos=True)}
-
-        por_categoria, por_bano, por_dia, por_zona = {}, {}, {}, {}
-        for categoria, creado_en, id_bano_r, zona_r in rows:
-            por_categoria[categoria] = por_categoria.get(categoria, 0) + 1
-            por_bano[id_bano_r] = por_bano.get(id_bano_r, 0) + 1
-            por_zona[zona_r] = por_zona.get(zona_r, 0) + 1
-
-            try:
-                dt = creado_en
-                if isinstance(dt, str):
-                    dt = datetime.datetime.fromisoformat(dt.replace("Z", "+00:00"))
-                if dt.tzinfo is None:
-                    dt = dt.replace(tzinfo=datetime.timezone.utc)
-                dloc = dt.astimezone(tzinfo).date().isoformat()
-            except Exception:
-                dloc = str(creado_en)[:10]
-            por_dia[dloc] = por_dia.get(dloc, 0) + 1
-
-        top_banos = sorted(
-            [
-                {
-                    "id_bano": k,
-                    "nombre": banos_catalogo.get(k, {}).get("nombre", k),
-                    "total": v,
-                }
-                for k, v in por_bano.items()
-            ],
-            key=lambda x: x["total"],
-            reverse=True,
-        )[:10]
-
-        total = sum(por_categoria.values())
-        return jsonify(
-            {
+        # El catálogo completo ya lo da /api/banos: aquí solo con ?catalogo=1
+        con_catalogo = request.args.get("catalogo") in ("1", "true", "si")
+        campos = campos_pedidos()
+
+        def calcular():
+            with sesion_lectura() as s:
+                agg = kpis_resumen(
+                    s, desde=desde, hasta=hasta, zona=zona, id_bano=id_b, tzinfo=tzinfo
+                )
+                cat = catalogo_banos.obtener(s)
+
+            por_categoria = agg["por_categoria"]
+            por_bano = agg["por_bano"]
+            por_dia = agg["por_dia"]
+            por_zona = agg["por_zona"]
+
+            top_banos = sorted(
+                [
+                    {
+                        "id_bano": k,
+                        "nombre": cat.por_id.get(k, {}).get("nombre", k),
+                        "total": v,
+                    }
+                    for k, v in por_bano.items()
+                ],
+                key=lambda x: x["total"],
+                reverse=True,
+            )[:10]
+
+            total = agg["total"]
+            datos = {
                 "total_reportes": total,
                 "por_categoria": por_categoria,
                 "por_bano": por_bano,
                 "por_dia": por_dia,
                 "por_zona": por_zona,
                 "top_banos": top_banos,
-                "banos_catalogo": banos_catalogo,
             }
+            if con_catalogo:
+                datos["banos_catalogo"] = {b["id"]: b for b in cat.activos}
+            if campos:
+                datos = {k: v for k, v in datos.items() if k in campos}
+            return datos
+
+        return respuesta_cacheada(calcular, tzinfo)
+
+    @app.route("/api/kpis/heatmap")
+    def kpis_heatmap_api():
+        tzinfo = get_tz_from_request()
+        filtros = {k: request.args.get(k) or None for k in ("zona", "id_bano", "categoria")}
+        try:
+            filtros["desde"], filtros["hasta"] = fechas_pedidas()
+        except ValueError as e:
+            return jsonify({"ok": False, "error": str(e)}), 400
+
+        def calcular():
+            with sesion_lectura() as s:
+                return kpis_heatmap(s, tzinfo=tzinfo, **filtros)
+
+        return respuesta_cacheada(calcular, tzinfo)
+
+    @app.route("/api/kpis/series")
+    def kpis_series_api():
+        tzinfo = get_tz_from_request()
+        filtros = {k: request.args.get(k) or None for k in ("zona", "id_bano", "categoria")}
+        try:
+            filtros["desde"], filtros["hasta"] = fechas_pedidas()
+        except ValueError as e:
+            return jsonify({"ok": False, "error": str(e)}), 400
+        try:
+            top = max(1, min(int(request.args.get("top", 10)), 50))
+        except ValueError:
+            top = 10
+
+        def calcular():
+            with sesion_lectura() as s:
+                return kpis_series(s, top=top, tzinfo=tzinfo, **filtros)
+
+        return respuesta_cacheada(calcular, tzinfo)
+
+    # ---------- API: stream en vivo (SSE) ----------
+    @app.route("/api/stream")
+    def stream():
+        """
+        Server-Sent Events: un evento `reporte` por cada reporte nuevo con el
+        delta de KPIs (día local según tz). Reanuda con Last-Event-ID.
+        """
+        tzinfo = get_tz_from_request()
+        try:
+            enviado = int(request.headers.get("Last-Event-ID") or request.args.get("desde_id") or 0) or None
+        except ValueError:
+            enviado = None
+
+        cola = difusor.suscribir()
+        if cola is None:
+            resp = jsonify({"ok": False, "error": "Demasiadas conexiones en vivo"})
+            resp.status_code = 503
+            resp.headers["Retry-After"] = "30"
+            return resp
+
+        def sse(rep, marca):
+            creado = rep["creado_en"]
+            local = creado.astimezone(tzinfo) if isinstance(creado, datetime.datetime) else None
+            dia = local.date().isoformat() if local else str(creado)[:10]
+            data = {
+                "reporte": {
+                    **rep,
+                    "creado_en": creado.isoformat() if local else creado,
+                    "creado_local": local.isoformat() if local else creado,
+                },
+                "kpi_delta": {
+                    "total": 1,
+                    "por_categoria": {rep["categoria"]: 1},
+                    "por_bano": {rep["id_bano"]: 1},
+                    "por_zona": {rep["zona"] or "": 1},
+                    "por_dia": {dia: 1},
+                },
+            }
+            # id = mayor id enviado (no el del reporte): los huecos que el difusor
+            # rellena tarde llegan con ids menores y no deben atrasar Last-Event-ID
+            return f"id: {marca}\nevent: reporte\ndata: {json.dumps(data)}\n\n"
+
+        def gen():
+            nonlocal enviado
+            try:
+                yield "retry: 3000\n\n"
+                ya = set()
+                if enviado is not None:
+                    # Lo que llegó mientras el cliente estaba desconectado
+                    with SessionLocal() as s:
+                        for rep in reportes_desde(s, enviado, limite=500):
+                            enviado = rep["id"]
+                            ya.add(enviado)
+                            yield sse(rep, enviado)
+                fin = time.monotonic() + STREAM_MAX_S
+                while time.monotonic() < fin:
+                    try:
+                        rep = cola.get(timeout=max(0.1, min(STREAM_PING_S, fin - time.monotonic())))
+                    except queue.Empty:
+                        yield ": ping\n\n"
+                        continue
+                    if rep["id"] in ya:
+                        continue  # ya salió en la puesta al día
+                    enviado = max(enviado or 0, rep["id"])
+                    yield sse(rep, enviado)
+            finally:
+                difusor.cancelar(cola)
+
+        # stream_with_context: el cupo de streams se libera al cerrar la conexión
+        return app.response_class(
+            stream_with_context(gen()),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
         )
 
     # --- Encuesta/kiosco sin QR ---
@@ -261,16 +782,40 @@ def create_app():
     def encuesta_page():
         return render_template("encuesta.html")
 
+    # ---------- Service worker del kiosko/QR ----------
+    @app.route("/sw.js")
+    def service_worker():
+        # Se sirve desde la raíz para que su alcance cubra /encuesta y /qr;
+        # la versión cambia cuando cambia alguna URL con huella.
+        asset_url = app.jinja_env.globals["asset_url"]
+        shell = ["/encuesta", "/api/banos"] + [
+            asset_url(p) for p in (
+                "css/brand.css", "reportes/assets/css/reportes.css", "js/cola.js",
+                "js/kiosk.js", "js/qr.js", "assets/Gradient-45anglec.jpg",
+            )
+        ]
+        version = hashlib.sha1(json.dumps(shell).encode()).hexdigest()[:12]
+        resp = app.response_class(
+            render_template("sw.js", shell=shell, version=version),
+            mimetype="text/javascript",
+        )
+        resp.headers["Cache-Control"] = "no-cache"
+        return resp
+
     # ---------- Reportes (sirve el HTML estático) ----------
     @app.route("/reportes")
     def reportes_page():
-        return app.send_static_file("reportes/reportes.html")
+        return render_template("reportes.html")
+
+    @app.route("/api/metrics")
+    def api_metrics():
+        return app.response_class(metricas.exponer(), mimetype="text/plain; version=0.0.4")
 
     @app.route("/api/health")
     def health():
         try:
             with SessionLocal() as s:
-                _ = get_banos(s, solo_activos=False)
+                s.execute(text("SELECT 1"))
             return {"ok": True}
         except Exception as e:
             return {"ok": False, "err": str(e)}, 500
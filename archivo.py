@@ -0,0 +1,181 @@
+"""
+Archivo de reportes viejos: un archivo NDJSON comprimido con gzip por mes UTC.
+
+`python manage.py archivar` mueve a ARCHIVO_DIR los reportes anteriores a
+ARCHIVO_MESES meses y los borra de la BD (los rollups se conservan, así que
+los KPIs por día no cambian). Cada línea es un reporte con columnas planas
+(COLUMNAS), ordenado del más reciente al más viejo; se puede leer directo con
+pandas/DuckDB (`read_json(..., lines=True)`). Al lado va
+`reportes-AAAA-MM.conteos.json` con los conteos por baño y categoría.
+
+Este módulo solo sabe leer y escribir los archivos; qué rango cubren y cómo
+se mezclan con la BD está en models.py (corte_archivo, _meses_archivo).
+Los meses leídos quedan en memoria (ARCHIVO_CACHE_MESES, LRU por mtime).
+"""
+from __future__ import annotations
+
+import datetime
+import gzip
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+ARCHIVO_DIR = os.getenv("ARCHIVO_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "archivo")
+ARCHIVO_MESES = int(os.getenv("ARCHIVO_MESES", "12"))
+ARCHIVO_CACHE_MESES = int(os.getenv("ARCHIVO_CACHE_MESES", "6"))
+
+COLUMNAS = [
+    "id", "creado_en", "id_bano", "categoria", "comentario", "foto_url", "foto_thumb_url",
+    "origen", "creado_por_ip", "uuid_cliente", "estado",
+]
+
+_RE_ARCHIVO = re.compile(r"^reportes-(\d{4})-(\d{2})\.ndjson\.gz$")
+_UTC = datetime.timezone.utc
+
+
+def inicio_mes(dt: datetime.datetime) -> datetime.datetime:
+    """Primer instante (UTC) del mes UTC de `dt` (naive = UTC)."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=_UTC)
+    dt = dt.astimezone(_UTC)
+    return datetime.datetime(dt.year, dt.month, 1, tzinfo=_UTC)
+
+
+def sumar_meses(mes: datetime.datetime, n: int) -> datetime.datetime:
+    i = mes.year * 12 + mes.month - 1 + n
+    return datetime.datetime(i // 12, i % 12 + 1, 1, tzinfo=_UTC)
+
+
+def ruta_mes(mes: datetime.datetime) -> str:
+    return os.path.join(ARCHIVO_DIR, f"reportes-{mes:%Y-%m}.ndjson.gz")
+
+
+def ruta_conteos(mes: datetime.datetime) -> str:
+    return os.path.join(ARCHIVO_DIR, f"reportes-{mes:%Y-%m}.conteos.json")
+
+
+def meses_archivados() -> List[datetime.datetime]:
+    try:
+        nombres = os.listdir(ARCHIVO_DIR)
+    except FileNotFoundError:
+        return []
+    meses = []
+    for nombre in nombres:
+        m = _RE_ARCHIVO.match(nombre)
+        if m:
+            meses.append(datetime.datetime(int(m.group(1)), int(m.group(2)), 1, tzinfo=_UTC))
+    return sorted(meses)
+
+
+def meses_en_rango(
+    inicio: Optional[datetime.datetime], fin: Optional[datetime.datetime]
+) -> List[datetime.datetime]:
+    """Meses archivados que se cruzan con [inicio, fin) (None = sin límite), del más reciente al más viejo."""
+    return [
+        mes for mes in reversed(meses_archivados())
+        if (fin is None or mes < fin) and (inicio is None or sumar_meses(mes, 1) > inicio)
+    ]
+
+
+def _serializar(fila: Dict[str, Any]) -> str:
+    d = {c: fila.get(c) for c in COLUMNAS}
+    creado = d["creado_en"]
+    if isinstance(creado, datetime.datetime):
+        if creado.tzinfo is None:
+            creado = creado.replace(tzinfo=_UTC)
+        d["creado_en"] = creado.astimezone(_UTC).isoformat()
+    return json.dumps(d, ensure_ascii=False, separators=(",", ":"))
+
+
+def _leer_archivo(ruta: str) -> List[Dict[str, Any]]:
+    filas = []
+    with gzip.open(ruta, "rt", encoding="utf-8") as f:
+        for linea in f:
+            if linea.strip():
+                d = json.loads(linea)
+                d["creado_en"] = datetime.datetime.fromisoformat(d["creado_en"])
+                filas.append(d)
+    return filas
+
+
+def escribir_mes(mes: datetime.datetime, filas: Iterable[Dict[str, Any]]) -> int:
+    """
+    Agrega `filas` al archivo del mes (si ya existía, une por id). Escribe a un
+    temporal y lo renombra: el archivo nunca queda a medias. Devuelve el total
+    de reportes del mes.
+    """
+    ruta = ruta_mes(mes)
+    por_id: Dict[int, Dict[str, Any]] = {}
+    if os.path.exists(ruta):
+        por_id.update((d["id"], d) for d in _leer_archivo(ruta))
+    for fila in filas:
+        d = dict(fila)
+        if isinstance(d["creado_en"], datetime.datetime) and d["creado_en"].tzinfo is None:
+            d["creado_en"] = d["creado_en"].replace(tzinfo=_UTC)
+        por_id[d["id"]] = d
+    orden = sorted(por_id.values(), key=lambda d: (d["creado_en"], d["id"]), reverse=True)
+    conteos: Dict[str, Dict[str, int]] = {}
+    for d in orden:
+        por_cat = conteos.setdefault(d["id_bano"], {})
+        por_cat[d["categoria"]] = por_cat.get(d["categoria"], 0) + 1
+
+    os.makedirs(ARCHIVO_DIR, exist_ok=True)
+    tmp = f"{ruta}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as bruto:
+        with gzip.GzipFile(fileobj=bruto, mode="wb", compresslevel=9, mtime=0) as gz:
+            for d in orden:
+                gz.write(_serializar(d).encode("utf-8"))
+                gz.write(b"\n")
+        bruto.flush()
+        os.fsync(bruto.fileno())
+    os.replace(tmp, ruta)
+    # Conteos por baño y categoría: totales de meses completos sin descomprimir
+    tmp = f"{ruta_conteos(mes)}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(conteos, f, ensure_ascii=False, sort_keys=True)
+    os.replace(tmp, ruta_conteos(mes))
+    return len(orden)
+
+
+def conteos_mes(mes: datetime.datetime) -> Dict[str, Dict[str, int]]:
+    """{id_bano: {categoria: n}} del mes (se recalcula si falta el archivo de conteos)."""
+    try:
+        with open(ruta_conteos(mes), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        conteos: Dict[str, Dict[str, int]] = {}
+        for d in leer_mes(mes):
+            por_cat = conteos.setdefault(d["id_bano"], {})
+            por_cat[d["categoria"]] = por_cat.get(d["categoria"], 0) + 1
+        return conteos
+
+
+_cache: "OrderedDict[str, Tuple[int, List[Dict[str, Any]]]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def leer_mes(mes: datetime.datetime) -> List[Dict[str, Any]]:
+    """
+    Reportes del mes (creado_en como datetime UTC), del más reciente al más
+    viejo. [] si no hay archivo. No modificar las filas: vienen de la caché.
+    """
+    ruta = ruta_mes(mes)
+    try:
+        mtime = os.stat(ruta).st_mtime_ns
+    except FileNotFoundError:
+        return []
+    with _cache_lock:
+        hit = _cache.get(ruta)
+        if hit is not None and hit[0] == mtime:
+            _cache.move_to_end(ruta)
+            return hit[1]
+    filas = _leer_archivo(ruta)
+    with _cache_lock:
+        _cache[ruta] = (mtime, filas)
+        _cache.move_to_end(ruta)
+        while len(_cache) > max(1, ARCHIVO_CACHE_MESES):
+            _cache.popitem(last=False)
+    return filas
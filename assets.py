@@ -0,0 +1,289 @@
+"""
+Assets estáticos con huella de contenido.
+
+`python manage.py assets` (en el build del deploy) recorre `static/` y deja en
+ASSETS_DIR cada archivo con:
+- URL `/assets/<hash>/<ruta>` (hash del contenido ya reescrito), servida con
+  `Cache-Control: public, max-age=31536000, immutable`.
+- Variantes gzip y brotli (si está instalado el paquete `brotli`) para CSS/JS/SVG;
+  se elige según Accept-Encoding.
+- Para JPG/PNG, variantes WebP y AVIF (si Pillow las soporta); se sirve la
+  más chica de las que acepte el navegador (Accept), con la misma URL.
+
+Los workers solo leen `manifest.json` y los cuerpos ya calculados (nada de
+comprimir ni codificar imágenes al arrancar). Sin manifiesto se sirve
+/static/... sin huella y queda un aviso en el log.
+
+Las referencias entre assets se reescriben a sus URLs con huella: `url(...)`
+en CSS e `import ... from './x.js'` en JS. En plantillas se usa
+`{{ asset_url('css/brand.css') }}`.
+
+ASSETS_FINGERPRINT=0 lo desactiva (asset_url devuelve /static/...), útil al
+editar archivos con el servidor en marcha; si no, tras editar `static/` hay
+que volver a correr `manage.py assets`.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import posixpath
+import re
+from typing import Dict, Optional
+
+ASSETS_FINGERPRINT = os.getenv("ASSETS_FINGERPRINT", "1") != "0"
+ASSETS_PREFIJO = "/assets"
+ASSETS_IMG_CALIDAD = int(os.getenv("ASSETS_IMG_CALIDAD", "80"))
+ASSETS_DIR = os.getenv("ASSETS_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "build", "assets")
+MANIFIESTO = "manifest.json"
+
+COMPRIMIBLES = {".css", ".js", ".mjs", ".svg", ".json", ".txt", ".map"}
+CON_VARIANTES = {".jpg", ".jpeg", ".png"}
+OMITIR = {".html"}   # las páginas se sirven como plantillas
+
+_RE_CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+_RE_JS_IMPORT = re.compile(r"""(\bimport\s*\(\s*|\bimport\s[^'"]*?\bfrom\s*|\bimport\s*)(['"])([^'"]+)\2""")
+
+
+class Asset:
+    __slots__ = ("ruta", "hash", "mimetype", "cuerpos", "imagenes")
+
+    def __init__(self, ruta: str, cuerpo: bytes):
+        self.ruta = ruta
+        self.hash = hashlib.sha256(cuerpo).hexdigest()[:12]
+        self.mimetype = mimetypes.guess_type(ruta)[0] or "application/octet-stream"
+        # Content-Encoding -> bytes ("identity" siempre presente)
+        self.cuerpos: Dict[str, bytes] = {"identity": cuerpo}
+        # mimetype alterno -> bytes (image/avif, image/webp)
+        self.imagenes: Dict[str, bytes] = {}
+
+    @property
+    def url(self) -> str:
+        return f"{ASSETS_PREFIJO}/{self.hash}/{self.ruta}"
+
+
+def _comprimir(asset: Asset) -> None:
+    cuerpo = asset.cuerpos["identity"]
+    gz = gzip.compress(cuerpo, compresslevel=9, mtime=0)
+    if len(gz) < len(cuerpo):
+        asset.cuerpos["gzip"] = gz
+    try:
+        import brotli
+    except ImportError:
+        return
+    br = brotli.compress(cuerpo, quality=11)
+    if len(br) < len(cuerpo):
+        asset.cuerpos["br"] = br
+
+
+def _variantes_imagen(asset: Asset) -> None:
+    """WebP/AVIF de la imagen (codificar AVIF tarda: solo en el build)."""
+    try:
+        from PIL import Image, features
+    except ImportError:
+        return
+    original = asset.cuerpos["identity"]
+    img = None
+    for mimetype, formato in (("image/webp", "WEBP"), ("image/avif", "AVIF")):
+        if not features.check(formato.lower()):
+            continue
+        if img is None:
+            img = Image.open(io.BytesIO(original))
+            img.load()
+        buf = io.BytesIO()
+        img.save(buf, formato, quality=ASSETS_IMG_CALIDAD)
+        datos = buf.getvalue()
+        if len(datos) < len(original):
+            asset.imagenes[mimetype] = datos
+
+
+def _escribir(ruta: str, datos: bytes) -> None:
+    tmp = f"{ruta}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(datos)
+    os.replace(tmp, ruta)
+
+
+class Pipeline:
+    def __init__(self, static_dir: str):
+        self.static_dir = static_dir
+        self.assets: Dict[str, Asset] = {}
+
+    def construir(self) -> "Pipeline":
+        rutas = []
+        for raiz, _dirs, archivos in os.walk(self.static_dir):
+            for nombre in archivos:
+                rel = os.path.relpath(os.path.join(raiz, nombre), self.static_dir)
+                rel = rel.replace(os.sep, "/")
+                if os.path.splitext(rel)[1].lower() not in OMITIR:
+                    rutas.append(rel)
+        en_curso: set = set()
+        for rel in sorted(rutas):
+            self._procesar(rel, en_curso)
+        return self
+
+    def _procesar(self, rel: str, en_curso: set) -> Optional[Asset]:
+        """Procesa `rel` después de sus dependencias (su hash depende de ellas)."""
+        if rel in self.assets:
+            return self.assets[rel]
+        ruta = os.path.join(self.static_dir, *rel.split("/"))
+        if rel in en_curso or not os.path.isfile(ruta):
+            return None
+        en_curso.add(rel)
+        with open(ruta, "rb") as f:
+            cuerpo = f.read()
+        ext = os.path.splitext(rel)[1].lower()
+        if ext == ".css":
+            cuerpo = self._reescribir(rel, cuerpo, _RE_CSS_URL, 2, en_curso)
+        elif ext in (".js", ".mjs"):
+            cuerpo = self._reescribir(rel, cuerpo, _RE_JS_IMPORT, 3, en_curso)
+
+        asset = Asset(rel, cuerpo)
+        if ext in COMPRIMIBLES:
+            _comprimir(asset)
+        elif ext in CON_VARIANTES:
+            _variantes_imagen(asset)
+        self.assets[rel] = asset
+        en_curso.discard(rel)
+        return asset
+
+    def _reescribir(self, rel: str, cuerpo: bytes, patron, grupo: int, en_curso: set) -> bytes:
+        texto = cuerpo.decode("utf-8")
+
+        def sustituir(m):
+            ref = m.group(grupo)
+            destino = self._resolver(rel, ref)
+            dep = self._procesar(destino, en_curso) if destino else None
+            if dep is None:
+                return m.group(0)
+            ini, fin = m.span(grupo)
+            return m.group(0)[: ini - m.start()] + dep.url + m.group(0)[fin - m.start():]
+
+        return patron.sub(sustituir, texto).encode("utf-8")
+
+    @staticmethod
+    def _resolver(rel: str, ref: str) -> Optional[str]:
+        """Ruta relativa a static/ de una referencia, o None si es externa."""
+        ref = ref.split("?", 1)[0].split("#", 1)[0]
+        if not ref or re.match(r"^[a-z][a-z0-9+.-]*:|^//", ref, re.I):
+            return None
+        if ref.startswith("/static/"):
+            return posixpath.normpath(ref[len("/static/"):])
+        if ref.startswith("/"):
+            return None
+        return posixpath.normpath(posixpath.join(posixpath.dirname(rel), ref))
+
+    def url(self, rel: str) -> Optional[str]:
+        asset = self.assets.get(rel.lstrip("/"))
+        return asset.url if asset else None
+
+    def guardar(self, destino: str = ASSETS_DIR) -> str:
+        """
+        Escribe cada cuerpo como <hash>.<variante>, luego el manifiesto y borra
+        lo que ya no usa ninguno. Devuelve la ruta del manifiesto.
+        """
+        os.makedirs(destino, exist_ok=True)
+        manifiesto, usados = {}, {MANIFIESTO}
+        for rel, a in self.assets.items():
+            archivos = {}
+            # Claves: Content-Encoding (cuerpos) o mimetype (imágenes alternas)
+            for clave, datos in [*a.cuerpos.items(), *a.imagenes.items()]:
+                nombre = f"{a.hash}.{clave.replace('/', '-')}"
+                if nombre not in usados:
+                    _escribir(os.path.join(destino, nombre), datos)
+                    usados.add(nombre)
+                archivos[clave] = nombre
+            manifiesto[rel] = archivos
+        ruta = os.path.join(destino, MANIFIESTO)
+        _escribir(ruta, json.dumps(manifiesto, indent=1, sort_keys=True).encode())
+        for nombre in os.listdir(destino):
+            if nombre not in usados:
+                os.unlink(os.path.join(destino, nombre))
+        return ruta
+
+    @classmethod
+    def cargar(cls, static_dir: str, origen: str = ASSETS_DIR) -> Optional["Pipeline"]:
+        """Pipeline desde el build de `manage.py assets`; None si no hay manifiesto."""
+        try:
+            with open(os.path.join(origen, MANIFIESTO), encoding="utf-8") as f:
+                manifiesto = json.load(f)
+        except FileNotFoundError:
+            return None
+
+        def leer(nombre: str) -> bytes:
+            with open(os.path.join(origen, nombre), "rb") as f:
+                return f.read()
+
+        pipeline = cls(static_dir)
+        for rel, archivos in manifiesto.items():
+            asset = Asset(rel, leer(archivos["identity"]))
+            for clave, nombre in archivos.items():
+                if clave != "identity":
+                    destino = asset.imagenes if "/" in clave else asset.cuerpos
+                    destino[clave] = leer(nombre)
+            pipeline.assets[rel] = asset
+        return pipeline
+
+
+def construir(static_dir: str, destino: str = ASSETS_DIR) -> Pipeline:
+    """Build de `manage.py assets`: procesa `static_dir` y lo guarda en `destino`."""
+    pipeline = Pipeline(static_dir).construir()
+    pipeline.guardar(destino)
+    return pipeline
+
+
+def registrar(app) -> Optional[Pipeline]:
+    """Carga el build de assets y registra ruta + asset_url (no procesa nada)."""
+    from flask import abort, redirect, request, url_for
+
+    pipeline = Pipeline.cargar(app.static_folder) if ASSETS_FINGERPRINT else None
+    if ASSETS_FINGERPRINT and pipeline is None:
+        app.logger.warning(
+            f"Assets: no hay {MANIFIESTO} en {ASSETS_DIR}; se sirven sin huella desde /static "
+            "(ejecuta `python manage.py assets`)"
+        )
+
+    def asset_url(rel: str) -> str:
+        url = pipeline.url(rel) if pipeline else None
+        return url or url_for("static", filename=rel)
+
+    app.jinja_env.globals["asset_url"] = asset_url
+
+    @app.route(f"{ASSETS_PREFIJO}/<hash_>/<path:rel>")
+    def asset(hash_, rel):
+        a = pipeline.assets.get(rel) if pipeline else None
+        if a is None:
+            abort(404)
+        if hash_ != a.hash:
+            # HTML viejo en caché tras un deploy: manda a la versión vigente
+            return redirect(a.url, code=302)
+
+        mimetype, cuerpo, encoding = a.mimetype, a.cuerpos["identity"], None
+        vary = []
+        if a.imagenes:
+            vary.append("Accept")
+            # Solo formatos pedidos explícitamente (*/* no cuenta); el más chico
+            aceptados = {m for m, q in request.accept_mimetypes if q > 0}
+            opciones = [(len(d), m, d) for m, d in a.imagenes.items() if m in aceptados]
+            if opciones:
+                _, mimetype, cuerpo = min(opciones)
+        elif len(a.cuerpos) > 1:
+            vary.append("Accept-Encoding")
+            for enc in ("br", "gzip"):
+                if enc in a.cuerpos and request.accept_encodings[enc]:
+                    cuerpo, encoding = a.cuerpos[enc], enc
+                    break
+
+        resp = app.response_class(cuerpo, mimetype=mimetype)
+        if encoding:
+            resp.headers["Content-Encoding"] = encoding
+        if vary:
+            resp.headers["Vary"] = ", ".join(vary)
+        resp.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        resp.set_etag(f"{a.hash}-{encoding or mimetype.rsplit('/', 1)[-1]}")
+        return resp.make_conditional(request)
+
+    return pipeline
@@ -0,0 +1,11 @@
+"""
+Benchmarks y utilidades de medición (no se importan desde la app).
+
+    python -m bench.plan_fechas   # plan de consulta de los filtros de fecha
+    python -m bench.escritura     # reportes/s directo vs group commit
+    python -m bench.datos         # genera reportes sintéticos
+    python -m bench.micro         # microbenchmarks de la capa de datos
+    python -m bench.serializacion # armado y JSON de list/kpis
+    python -m bench.carga         # carga HTTP contra gunicorn
+    python -m bench.arranque      # arranque en frío de un worker
+"""
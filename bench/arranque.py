@@ -0,0 +1,73 @@
+"""
+Arranque en frío de un worker: tiempo de `import wsgi` (create_app) y de la
+primera respuesta, en procesos nuevos, contra la BD configurada o --db.
+
+    python -m bench.arranque --repeticiones 10
+    python -m bench.arranque --importtime   # además, los módulos que más tardan en importarse
+
+La BD se migra y los assets se construyen antes de medir (como en un
+deploy); los workers solo revisan la versión del esquema y leen el manifiesto.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+from bench.comun import usar_db, resumen_ms, escribir_resultado
+
+_HIJO = r"""
+import json, time
+t0 = time.perf_counter()
+import wsgi
+t1 = time.perf_counter()
+c = wsgi.application.test_client()
+r = c.get("/api/banos")
+t2 = time.perf_counter()
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "primera_ms": (t2 - t1) * 1000, "status": r.status_code}))
+"""
+
+
+def _importtime(env, top):
+    """Módulos con más tiempo acumulado de import (python -X importtime)."""
+    p = subprocess.run([sys.executable, "-X", "importtime", "-c", "import wsgi"],
+                       env=env, capture_output=True, text=True)
+    filas = []
+    for linea in p.stderr.splitlines():
+        m = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)", linea)
+        if m:
+            filas.append((int(m.group(2)), m.group(4).strip()))
+    filas.sort(reverse=True)
+    return [{"modulo": mod, "acumulado_ms": round(us / 1000, 1)} for us, mod in filas[:top]]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--db", help="URL de BD (por defecto la configurada)")
+    ap.add_argument("--repeticiones", type=int, default=5)
+    ap.add_argument("--importtime", action="store_true")
+    ap.add_argument("--top", type=int, default=15)
+    ap.add_argument("--salida", help="archivo JSON con el resultado")
+    args = ap.parse_args(argv)
+
+    usar_db(args.db)
+    env = dict(os.environ)
+    for cmd in ("migrate", "assets"):
+        subprocess.run([sys.executable, "manage.py", cmd], env=env, check=True, stdout=subprocess.DEVNULL)
+
+    imports, primeras = [], []
+    for _ in range(args.repeticiones):
+        p = subprocess.run([sys.executable, "-c", _HIJO], env=env, capture_output=True, text=True, check=True)
+        r = json.loads(p.stdout.strip().splitlines()[-1])
+        imports.append(r["import_ms"])
+        primeras.append(r["primera_ms"])
+
+    resultados = {"import_wsgi": resumen_ms(imports), "primera_respuesta": resumen_ms(primeras)}
+    if args.importtime:
+        resultados["importtime_top"] = _importtime(env, args.top)
+    escribir_resultado("arranque", resultados, args.salida, db=os.getenv("DB_URL") or os.getenv("DATABASE_URL"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Prueba de carga HTTP contra un gunicorn local: N hilos durante T segundos
+con una mezcla de lecturas (/api/kpis, /api/reportes_list, búsqueda, página
+con cursor) y escrituras (POST /api/reportes). Reporta peticiones/s,
+latencias por endpoint y cuántas rechazó el control de admisión (429/503,
+admision.py); para medir sin límites arranca con ADMISION_IP_POR_MIN=0 etc.
+
+    python -m bench.carga --url http://127.0.0.1:8000 --hilos 32 --segundos 30
+    python -m bench.carga --arrancar --workers 2 --db sqlite:////tmp/bench.db
+
+--arrancar levanta `gunicorn -k gthread wsgi:application` con la BD indicada
+y lo detiene al terminar. Sin --arrancar usa el servidor que ya esté en --url.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from bench.comun import resumen_ms, escribir_resultado
+
+# (nombre, peso); las rutas se arman en _peticion
+MEZCLA = [
+    ("kpis", 30),
+    ("reportes_list", 30),
+    ("reportes_list_cursor", 10),
+    ("reportes_list_busqueda", 10),
+    ("crear_reporte", 20),
+]
+
+
+def _peticion(base, nombre, banos, rng):
+    if nombre == "kpis":
+        return urllib.request.Request(base + "/api/kpis")
+    if nombre == "reportes_list":
+        return urllib.request.Request(base + f"/api/reportes_list?page={rng.randint(1, 20)}")
+    if nombre == "reportes_list_cursor":
+        return urllib.request.Request(base + "/api/reportes_list?cursor=")
+    if nombre == "reportes_list_busqueda":
+        return urllib.request.Request(base + "/api/reportes_list?search=papel")
+    datos = urllib.parse.urlencode({
+        "id_bano": rng.choice(banos), "categoria": rng.choice(["sucio", "falta_papel", "otro"]),
+    }).encode()
+    return urllib.request.Request(base + "/api/reportes", data=datos, method="POST")
+
+
+def _esperar(base, limite_s=30):
+    fin = time.monotonic() + limite_s
+    while time.monotonic() < fin:
+        try:
+            with urllib.request.urlopen(base + "/api/health", timeout=2) as r:
+                if r.status == 200:
+                    return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.3)
+    raise SystemExit(f"El servidor en {base} no respondió en {limite_s}s")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", default="http://127.0.0.1:8000")
+    ap.add_argument("--hilos", type=int, default=16)
+    ap.add_argument("--segundos", type=float, default=20)
+    ap.add_argument("--arrancar", action="store_true", help="levanta gunicorn local")
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--db", help="DB_URL para el gunicorn que se arranca")
+    ap.add_argument("--solo-lectura", action="store_true")
+    ap.add_argument("--semilla", type=int, default=42)
+    ap.add_argument("--salida", help="archivo JSON con el resultado")
+    args = ap.parse_args(argv)
+
+    base = args.url.rstrip("/")
+    proc = None
+    if args.arrancar:
+        env = dict(os.environ)
+        if args.db:
+            env["DB_URL"] = args.db
+        env["WEB_THREADS"] = str(args.threads)
+        bind = urllib.parse.urlparse(base).netloc
+        # Los workers ya no migran al arrancar (ver migraciones.py)
+        for cmd in (["migrate"], ["seed"]):
+            subprocess.run([sys.executable, "manage.py", *cmd], env=env, check=True,
+                           stdout=subprocess.DEVNULL)
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-w", str(args.workers), "-k", "gthread",
+             "--threads", str(args.threads), "-b", bind, "wsgi:application"],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+    try:
+        _esperar(base)
+        with urllib.request.urlopen(base + "/api/banos", timeout=10) as r:
+            banos = [b["id"] for b in json.load(r)]
+        mezcla = [(n, p) for n, p in MEZCLA if not (args.solo_lectura and n == "crear_reporte")]
+        nombres, pesos = zip(*mezcla)
+
+        lat = {n: [] for n in nombres}
+        errores = {n: 0 for n in nombres}
+        rechazadas = {n: 0 for n in nombres}
+        lock = threading.Lock()
+        fin = time.monotonic() + args.segundos
+
+        def trabajador(i):
+            rng = random.Random(args.semilla + i)
+            local = {n: [] for n in nombres}
+            fallos = {n: 0 for n in nombres}
+            frenadas = {n: 0 for n in nombres}
+            while time.monotonic() < fin:
+                nombre = rng.choices(nombres, pesos)[0]
+                req = _peticion(base, nombre, banos, rng)
+                t0 = time.perf_counter()
+                try:
+                    with urllib.request.urlopen(req, timeout=30) as r:
+                        r.read()
+                    local[nombre].append((time.perf_counter() - t0) * 1000)
+                except urllib.error.HTTPError as e:
+                    if e.code in (429, 503):
+                        frenadas[nombre] += 1
+                    else:
+                        fallos[nombre] += 1
+                except (urllib.error.URLError, OSError):
+                    fallos[nombre] += 1
+            with lock:
+                for n in nombres:
+                    lat[n].extend(local[n])
+                    errores[n] += fallos[n]
+                    rechazadas[n] += frenadas[n]
+
+        t0 = time.perf_counter()
+        hilos = [threading.Thread(target=trabajador, args=(i,)) for i in range(args.hilos)]
+        for t in hilos:
+            t.start()
+        for t in hilos:
+            t.join()
+        dur = time.perf_counter() - t0
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    total = sum(len(v) for v in lat.values())
+    escribir_resultado("carga", {
+        "hilos": args.hilos,
+        "segundos": round(dur, 2),
+        "peticiones": total,
+        "peticiones_por_s": round(total / dur, 1) if dur else None,
+        "endpoints": {
+            n: {**resumen_ms(lat[n]), "errores": errores[n], "rechazadas": rechazadas[n]} for n in nombres
+        },
+    }, args.salida, db=args.db or base)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Utilidades compartidas por los benchmarks: selección de BD y salida JSON
+con metadatos (commit, dialecto, versión de Python) para comparar corridas.
+"""
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+
+def usar_db(url):
+    """Fija DB_URL antes de importar models (se lee al importarse)."""
+    if url:
+        os.environ["DB_URL"] = url
+
+
+def cronometrar(fn, repeticiones=5, calentamiento=1):
+    """Ejecuta fn() y devuelve estadísticas en ms (min, mediana, p95, max)."""
+    for _ in range(calentamiento):
+        fn()
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    return resumen_ms(tiempos)
+
+
+def resumen_ms(tiempos):
+    if not tiempos:
+        return {"n": 0}
+    orden = sorted(tiempos)
+
+    def pct(p):
+        return orden[min(len(orden) - 1, int(round(p / 100 * (len(orden) - 1))))]
+
+    return {
+        "n": len(orden),
+        "min_ms": round(orden[0], 3),
+        "mediana_ms": round(statistics.median(orden), 3),
+        "p95_ms": round(pct(95), 3),
+        "p99_ms": round(pct(99), 3),
+        "max_ms": round(orden[-1], 3),
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def escribir_resultado(nombre, resultados, salida=None, db=None):
+    """Imprime (y opcionalmente guarda en `salida`) el JSON de la corrida."""
+    doc = {
+        "bench": nombre,
+        "fecha": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "db": db,
+        "resultados": resultados,
+    }
+    texto = json.dumps(doc, indent=2, ensure_ascii=False)
+    if salida:
+        with open(salida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    sys.stdout.write(texto + "\n")
+    return doc
@@ -0,0 +1,134 @@
+"""
+Generador de datos sintéticos: inserta N reportes con distribuciones
+realistas (categoría, baño y hora del día) en lotes, y luego reconstruye el
+rollup diario y el índice de texto.
+
+    python -m bench.datos --reportes 1000000 --dias 365
+    python -m bench.datos --db postgresql+psycopg2://user@localhost/banos --reportes 2000000
+
+Usa la BD configurada (DB_URL / DATABASE_URL) salvo que se pase --db; aplica
+las migraciones y, si no hay baños, crea los de la semilla. Es reproducible
+con --semilla.
+"""
+import argparse
+import datetime
+import random
+import time
+from zoneinfo import ZoneInfo
+
+from bench.comun import usar_db, escribir_resultado
+
+CATEGORIAS = {
+    "sucio": 30, "falta_papel": 25, "falta_jabon": 15,
+    "mal_olor": 15, "fuga_agua": 5, "otro": 10,
+}
+
+# Peso por hora local: picos en cambios de turno y comida
+PESO_HORA = [
+    1, 1, 1, 1, 1, 2, 5, 9, 7, 6, 6, 7,
+    9, 10, 9, 8, 7, 6, 5, 7, 5, 3, 2, 1,
+]
+PESO_FIN_DE_SEMANA = 0.35
+
+COMENTARIOS = [
+    "no hay papel desde la mañana", "el lavabo está tapado", "huele muy mal",
+    "gotea la llave del fondo", "falta jabón en los dos dispensadores",
+    "piso mojado, cuidado", "el secador no funciona", "sin toallas",
+]
+PROB_COMENTARIO = 0.2
+
+def generar_filas(rng, n, banos, dias, tzinfo, fin):
+    """
+    Genera n filas (dicts para insert) entre fin - dias y fin. Los baños
+    siguen una distribución tipo Zipf (unos pocos concentran reportes).
+    Ninguna queda después de `fin` (normalmente ahora).
+    """
+    pesos_bano = [1 / (i + 1) for i in range(len(banos))]
+    rng.shuffle(banos)
+    cats, pesos_cat = zip(*CATEGORIAS.items())
+    # Peso de cada día (fines de semana con menos tráfico)
+    dias_lista = [(fin - datetime.timedelta(days=d)).date() for d in range(dias)]
+    pesos_dia = [PESO_FIN_DE_SEMANA if d.weekday() >= 5 else 1 for d in dias_lista]
+
+    sel_bano = rng.choices(banos, pesos_bano, k=n)
+    sel_cat = rng.choices(cats, pesos_cat, k=n)
+    sel_dia = rng.choices(dias_lista, pesos_dia, k=n)
+    sel_hora = rng.choices(range(24), PESO_HORA, k=n)
+    for i in range(n):
+        local = datetime.datetime.combine(
+            sel_dia[i], datetime.time(sel_hora[i], rng.randrange(60), rng.randrange(60)),
+            tzinfo=tzinfo,
+        )
+        if local > fin:
+            # Hora de hoy que todavía no llega: misma hora del día anterior
+            local -= datetime.timedelta(days=1)
+        yield {
+            "id_bano": sel_bano[i],
+            "categoria": sel_cat[i],
+            "comentario": rng.choice(COMENTARIOS) if rng.random() < PROB_COMENTARIO else None,
+            "origen": "bench",
+            "creado_en": local.astimezone(datetime.timezone.utc),
+            "estado": "abierto",
+        }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--db", help="URL de BD (por defecto la configurada)")
+    ap.add_argument("--reportes", type=int, default=100_000)
+    ap.add_argument("--dias", type=int, default=365)
+    ap.add_argument("--lote", type=int, default=10_000)
+    ap.add_argument("--tz", default="America/Monterrey", help="zona de las horas simuladas")
+    ap.add_argument("--semilla", type=int, default=42)
+    ap.add_argument("--salida", help="archivo JSON con el resultado")
+    args = ap.parse_args(argv)
+
+    usar_db(args.db)
+    import models
+    import migraciones
+
+    migraciones.migrar()
+    migraciones.sembrar_banos()
+    with models.SessionLocal() as s:
+        banos = [b["id"] for b in models.get_banos(s, solo_activos=True)]
+    rng = random.Random(args.semilla)
+    fin = datetime.datetime.now(ZoneInfo(args.tz))
+    filas = generar_filas(rng, args.reportes, banos, args.dias, ZoneInfo(args.tz), fin)
+
+    # Inserción masiva por Core (executemany); rollup e índice se rehacen al final
+    t0 = time.perf_counter()
+    insertados = 0
+    with models.SessionLocal() as s:
+        ins = models.Reporte.__table__.insert()
+        while insertados < args.reportes:
+            lote = [f for _, f in zip(range(args.lote), filas)]
+            if not lote:
+                break
+            s.execute(ins, lote)
+            s.commit()
+            insertados += len(lote)
+    t_insert = time.perf_counter() - t0
+
+    with models.SessionLocal() as s:
+        t1 = time.perf_counter()
+        grupos = models.reconstruir_rollups(s)
+        t_rollup = time.perf_counter() - t1
+        t2 = time.perf_counter()
+        docs = models.reconstruir_busqueda(s) if models._busqueda_existe(s) else 0
+        t_busqueda = time.perf_counter() - t2
+
+    escribir_resultado("datos", {
+        "reportes": insertados,
+        "dias": args.dias,
+        "banos": len(banos),
+        "insert_s": round(t_insert, 2),
+        "insert_por_s": round(insertados / t_insert, 1) if t_insert else None,
+        "rollup_grupos": grupos,
+        "rollup_s": round(t_rollup, 2),
+        "busqueda_docs": docs,
+        "busqueda_s": round(t_busqueda, 2),
+    }, args.salida, db=models.engine.url.render_as_string(hide_password=True))
+
+
+if __name__ == "__main__":
+    main()
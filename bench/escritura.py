@@ -0,0 +1,83 @@
+"""
+Carga de escritura: reportes/segundo con create_reporte directo vs. group
+commit (escritura.ColaEscritura), con N hilos concurrentes.
+
+    python -m bench.escritura --hilos 16 --por-hilo 100 --ventana-ms 5 --salida escritura.json
+    python -m bench.escritura --db postgresql+psycopg2://user@localhost/banos
+
+Por defecto usa una BD SQLite temporal (no toca la configurada).
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from bench.comun import usar_db, escribir_resultado
+
+
+def _medir(nombre, hilos, por_hilo, enviar):
+    errores = []
+
+    def trabajador(n):
+        for i in range(por_hilo):
+            try:
+                enviar(dict(id_bano=f"BENCH-{(n + i) % 4}", categoria="sucio", origen="bench"))
+            except Exception as e:  # se reporta, no aborta la medición
+                errores.append(repr(e))
+
+    ts = [threading.Thread(target=trabajador, args=(n,)) for n in range(hilos)]
+    t0 = time.perf_counter()
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    dur = time.perf_counter() - t0
+    total = hilos * por_hilo
+    return {
+        "modo": nombre,
+        "reportes": total,
+        "segundos": round(dur, 3),
+        "reportes_por_s": round(total / dur, 1),
+        "errores": len(errores),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--db", help="URL de BD (por defecto SQLite temporal)")
+    ap.add_argument("--hilos", type=int, default=16)
+    ap.add_argument("--por-hilo", type=int, default=100)
+    ap.add_argument("--ventana-ms", type=float, default=5.0)
+    ap.add_argument("--salida", help="archivo JSON con el resultado")
+    args = ap.parse_args(argv)
+
+    usar_db(args.db or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db"))
+    import models
+    import migraciones
+    from escritura import ColaEscritura
+
+    migraciones.migrar()
+    with models.SessionLocal() as s:
+        for i in range(4):
+            if s.get(models.Bano, f"BENCH-{i}") is None:
+                s.add(models.Bano(id=f"BENCH-{i}", nombre=f"Bench {i}", zona="Bench", activo=True))
+        models.invalidar_banos(s)
+        s.commit()
+
+    def directo(fila):
+        with models.SessionLocal() as s:
+            return models.create_reporte(s, **fila)
+
+    cola = ColaEscritura(ventana_ms=args.ventana_ms)
+
+    resultados = [
+        _medir("directo", args.hilos, args.por_hilo, directo),
+        _medir(f"group_commit_{args.ventana_ms:g}ms", args.hilos, args.por_hilo, cola.enviar),
+    ]
+    escribir_resultado("escritura", resultados, args.salida,
+                       db=models.engine.url.render_as_string(hide_password=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Microbenchmarks de la capa de datos sobre la BD ya poblada (bench.datos):
+fetch_rows_for_kpis, kpis_agregados/kpis_resumen, kpis_columnar (si hay
+numpy), list_reportes (primera página, página profunda con OFFSET y con
+cursor, con búsqueda) y create_reporte.
+
+    python -m bench.datos --reportes 1000000 && python -m bench.micro --salida micro.json
+    python -m bench.micro --db postgresql+psycopg2://user@localhost/banos --repeticiones 10
+
+create_reporte inserta filas reales (origen='bench'); usa --sin-escritura
+para omitirlo.
+"""
+import argparse
+import datetime
+from zoneinfo import ZoneInfo
+
+from bench.comun import usar_db, cronometrar, escribir_resultado
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--db", help="URL de BD (por defecto la configurada)")
+    ap.add_argument("--repeticiones", type=int, default=5)
+    ap.add_argument("--dias", type=int, default=30, help="rango de fechas de los KPIs")
+    ap.add_argument("--pagina-profunda", type=int, default=500)
+    ap.add_argument("--buscar", default="papel")
+    ap.add_argument("--tz", default="America/Monterrey")
+    ap.add_argument("--sin-escritura", action="store_true")
+    ap.add_argument("--salida", help="archivo JSON con el resultado")
+    args = ap.parse_args(argv)
+
+    usar_db(args.db)
+    import models
+
+    tz = ZoneInfo(args.tz)
+    hoy = datetime.datetime.now(tz).date()
+    rango = dict(desde=(hoy - datetime.timedelta(days=args.dias)).isoformat(), hasta=hoy.isoformat())
+    rep = args.repeticiones
+
+    resultados = {}
+    with models.SessionLocal() as s:
+        resultados["total_reportes"] = s.query(models.Reporte).count()
+
+        casos = {
+            "fetch_rows_for_kpis": lambda: models.fetch_rows_for_kpis(s, tzinfo=tz, **rango),
+            "kpis_agregados": lambda: models.kpis_agregados(s, tzinfo=tz, **rango),
+            "kpis_resumen": lambda: models.kpis_resumen(s, tzinfo=tz, **rango),
+            "list_reportes_p1": lambda: models.list_reportes(s, tzinfo=tz),
+            "list_reportes_offset_profundo": lambda: models.list_reportes(
+                s, page=args.pagina_profunda, tzinfo=tz),
+            "list_reportes_busqueda": lambda: models.list_reportes(s, search=args.buscar, tzinfo=tz),
+            "list_reportes_cursor_p1": lambda: models.list_reportes(s, cursor="", tzinfo=tz),
+        }
+
+        try:
+            import numpy
+            casos["kpis_columnar"] = lambda: models.kpis_columnar(s, numpy, tzinfo=tz, **rango)
+        except ImportError:
+            pass
+
+        # Cursor a la misma profundidad que la página OFFSET (se recorre una vez)
+        cur = ""
+        for _ in range(args.pagina_profunda - 1):
+            cur = models.list_reportes(s, cursor=cur, total_modo="none", tzinfo=tz)["next_cursor"]
+            if not cur:
+                break
+        if cur:
+            casos["list_reportes_cursor_profundo"] = lambda: models.list_reportes(
+                s, cursor=cur, total_modo="none", tzinfo=tz)
+
+        for nombre, fn in casos.items():
+            resultados[nombre] = cronometrar(fn, rep)
+            s.rollback()  # no arrastra transacción abierta entre casos
+
+    if not args.sin_escritura:
+        with models.SessionLocal() as s:
+            banos = models.get_banos(s, solo_activos=True)
+        if banos:
+            id_bano = banos[0]["id"]
+
+            def crear():
+                with models.SessionLocal() as s2:
+                    models.create_reporte(s2, id_bano=id_bano, categoria="otro", origen="bench")
+
+            resultados["create_reporte"] = cronometrar(crear, max(rep, 20))
+
+    escribir_resultado("micro", resultados, args.salida,
+                       db=models.engine.url.render_as_string(hide_password=True))
+
+
+if __name__ == "__main__":
+    main()
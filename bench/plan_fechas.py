@@ -0,0 +1,59 @@
+"""
+Muestra el plan de consulta del filtro de fechas antes y después del cambio
+a rangos semiabiertos sobre creado_en, contra la BD configurada (DB_URL /
+DATABASE_URL):
+
+    python -m bench.plan_fechas --desde 2024-03-01 --hasta 2024-03-31 --tz America/Monterrey
+
+- Antes: func.date(creado_en) >= desde  -> SCAN / Seq Scan
+- Después: creado_en >= inicio_utc AND creado_en < fin_utc -> búsqueda por índice
+"""
+import argparse
+import time
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import select, func, text
+
+from models import SessionLocal, Reporte, Bano, filtrar_reportes, IS_SQLITE
+
+
+def _plan(s, q):
+    compiled = q.compile(bind=s.get_bind(), compile_kwargs={"literal_binds": True})
+    prefix = "EXPLAIN QUERY PLAN " if IS_SQLITE else "EXPLAIN "
+    rows = s.execute(text(prefix + str(compiled))).all()
+    # SQLite: (id, parent, notused, detail); Postgres: (QUERY PLAN,)
+    return [r[-1] for r in rows]
+
+
+def _cronometra(s, q, repeticiones=5):
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        s.execute(q).all()
+        mejor = min(mejor, time.perf_counter() - t0)
+    return mejor * 1000
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--desde", default="2024-03-01")
+    ap.add_argument("--hasta", default="2024-03-31")
+    ap.add_argument("--tz", default="America/Monterrey")
+    args = ap.parse_args(argv)
+
+    base = select(Reporte.id, Reporte.creado_en).join(Bano).order_by(Reporte.creado_en.desc())
+    antes = base.where(
+        func.date(Reporte.creado_en) >= args.desde,
+        func.date(Reporte.creado_en) <= args.hasta,
+    )
+    despues = filtrar_reportes(base, desde=args.desde, hasta=args.hasta, tzinfo=ZoneInfo(args.tz))
+
+    with SessionLocal() as s:
+        for nombre, q in (("antes  (func.date)", antes), ("después (rango UTC)", despues)):
+            print(f"== {nombre}: {_cronometra(s, q):.2f} ms")
+            for linea in _plan(s, q):
+                print("   ", linea)
+
+
+if __name__ == "__main__":
+    main()
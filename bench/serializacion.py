@@ -0,0 +1,115 @@
+"""
+Costo de armar y serializar las respuestas de /api/reportes_list y /api/kpis.
+
+- Filas: objetos ORM + to_dict_joined + re-parseo de creado_en (como lo hacía
+  app.py) contra list_reportes (filas Core con join explícito y creado_local
+  calculado una vez). Cuenta también las consultas por página.
+- JSON: json de la biblioteca estándar (como Flask) contra orjson, si está
+  instalado; tiempo y bytes por respuesta.
+- Payload: todos los campos contra fields=..., y /api/kpis con y sin
+  banos_catalogo.
+
+    python -m bench.serializacion --per-page 50 --salida ser.json
+"""
+import argparse
+import datetime
+import json
+from zoneinfo import ZoneInfo
+
+from bench.comun import usar_db, cronometrar, escribir_resultado
+
+CAMPOS_MINIMOS = "id,creado_local,categoria,nombre_bano,zona,comentario,foto_thumb_url"
+
+
+def _lista_orm(models, s, tz, per_page, page):
+    """Camino anterior: select(Reporte) + to_dict_joined + creado_local en app.py."""
+    from sqlalchemy import func, select
+
+    q = select(models.Reporte).join(models.Bano).where(models.Bano.id == models.Reporte.id_bano)
+    total = s.scalar(select(func.count()).select_from(q.subquery()))
+    q = q.order_by(
+        models.Reporte.creado_en.desc(), models.Reporte.id.desc()
+    ).offset((page - 1) * per_page).limit(per_page)
+    items = []
+    for r in s.scalars(q).all():
+        it = r.to_dict_joined()
+        dt = datetime.datetime.fromisoformat(it["creado_en"].replace("Z", "+00:00"))
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=datetime.timezone.utc)
+        it["creado_local"] = dt.astimezone(tz).isoformat()
+        items.append(it)
+    return {"total": total, "items": items}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--db", help="URL de BD (por defecto la configurada)")
+    ap.add_argument("--repeticiones", type=int, default=20)
+    ap.add_argument("--per-page", type=int, default=50)
+    ap.add_argument("--pagina", type=int, default=3)
+    ap.add_argument("--campos", default=CAMPOS_MINIMOS, help="fields= del caso recortado")
+    ap.add_argument("--tz", default="America/Monterrey")
+    ap.add_argument("--salida", help="archivo JSON con el resultado")
+    args = ap.parse_args(argv)
+
+    usar_db(args.db)
+    from sqlalchemy import event
+    import models
+
+    tz = ZoneInfo(args.tz)
+    rep = args.repeticiones
+    consultas = [0]
+
+    @event.listens_for(models.engine, "before_cursor_execute")
+    def _contar(*_a, **_k):
+        consultas[0] += 1
+
+    def por_pagina(fn):
+        """Ejecuta fn con una sesión nueva (sin identity map caliente) y cuenta consultas."""
+        with models.SessionLocal() as s:
+            consultas[0] = 0
+            datos = fn(s)
+            return datos, consultas[0]
+
+    filas = {
+        "orm": lambda s: _lista_orm(models, s, tz, args.per_page, args.pagina),
+        "core": lambda s: models.list_reportes(s, page=args.pagina, per_page=args.per_page, tzinfo=tz),
+        "core_campos": lambda s: models.list_reportes(
+            s, page=args.pagina, per_page=args.per_page, tzinfo=tz, campos=args.campos.split(",")),
+    }
+    resultados = {"per_page": args.per_page, "pagina": args.pagina}
+    payloads = {}
+    for nombre, fn in filas.items():
+        datos, n = por_pagina(fn)
+        payloads[f"lista_{nombre}"] = datos
+        resultados[f"filas_{nombre}"] = cronometrar(lambda: por_pagina(fn), rep)
+        resultados[f"filas_{nombre}"]["consultas"] = n
+
+    with models.SessionLocal() as s:
+        kpis = models.kpis_resumen(s, tzinfo=tz)
+        cat = models.catalogo_banos.obtener(s)
+    payloads["kpis"] = dict(kpis)
+    payloads["kpis_con_catalogo"] = dict(kpis, banos_catalogo={b["id"]: b for b in cat.activos})
+
+    # Mismas opciones que el proveedor por defecto de Flask
+    codificadores = {"json": lambda d: json.dumps(d, ensure_ascii=True, sort_keys=True).encode()}
+    try:
+        import orjson
+
+        opciones = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        codificadores["orjson"] = lambda d: orjson.dumps(d, option=opciones)
+    except ImportError:
+        pass
+
+    for nombre_p, datos in payloads.items():
+        for nombre_c, cod in codificadores.items():
+            clave = f"json_{nombre_p}_{nombre_c}"
+            resultados[clave] = cronometrar(lambda: cod(datos), rep)
+            resultados[clave]["bytes"] = len(cod(datos))
+
+    escribir_resultado("serializacion", resultados, args.salida,
+                       db=models.engine.url.render_as_string(hide_password=True))
+
+
+if __name__ == "__main__":
+    main()
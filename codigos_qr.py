@@ -0,0 +1,234 @@
+"""
+Códigos QR de los baños: render PNG/SVG, caché por huella y pliegos PDF.
+
+Cada código se identifica por su huella = sha256(URL, id del baño, estilo,
+VERSION_RENDER). make_qr.py la guarda en `<salida>/indice.json` y solo vuelve
+a dibujar los baños cuya huella cambió (p. ej. al cambiar QR_BASE_URL);
+/api/banos/<id>/qr.png la usa como ETag y nombre en QR_CACHE_DIR, así que
+cada imagen se dibuja una vez por servidor.
+
+`qrcode` y Pillow se importan solo al dibujar.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Sequence, Tuple
+from urllib.parse import quote
+
+QR_BASE_URL = os.getenv("QR_BASE_URL", "")
+QR_CACHE_DIR = os.getenv("QR_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "banos-qr")
+QR_MAX_AGE = int(os.getenv("QR_MAX_AGE", "86400"))
+
+ESTILO: Dict[str, Any] = {
+    "box": int(os.getenv("QR_BOX_PX", "10")),
+    "borde": int(os.getenv("QR_BORDE", "4")),
+    "correccion": os.getenv("QR_CORRECCION", "M").upper(),
+    "color": os.getenv("QR_COLOR", "#000000"),
+    "fondo": os.getenv("QR_FONDO", "#ffffff"),
+}
+# Súbelo si cambia el código de dibujo: invalida todas las huellas
+VERSION_RENDER = 1
+
+_RE_NO_SEGURO = re.compile(r"[^A-Za-z0-9._-]")
+
+
+def url_bano(id_bano: str, base: str) -> str:
+    return f"{base}?r={quote(id_bano, safe='')}"
+
+
+def huella(url: str, id_bano: str, estilo: Dict[str, Any] = ESTILO) -> str:
+    datos = json.dumps([VERSION_RENDER, url, id_bano, estilo], sort_keys=True)
+    return hashlib.sha256(datos.encode("utf-8")).hexdigest()[:16]
+
+
+def nombre_archivo(id_bano: str) -> str:
+    """Nombre de archivo seguro para el id (los ids vienen del catálogo)."""
+    return _RE_NO_SEGURO.sub("_", id_bano)
+
+
+def _qr(url: str, estilo: Dict[str, Any]):
+    import qrcode
+    from qrcode import constants
+
+    qr = qrcode.QRCode(
+        error_correction=getattr(constants, f"ERROR_CORRECT_{estilo['correccion']}"),
+        box_size=estilo["box"],
+        border=estilo["borde"],
+    )
+    qr.add_data(url)
+    qr.make(fit=True)
+    return qr
+
+
+def render_png(url: str, estilo: Dict[str, Any] = ESTILO) -> bytes:
+    img = _qr(url, estilo).make_image(fill_color=estilo["color"], back_color=estilo["fondo"])
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+
+def render_svg(url: str, estilo: Dict[str, Any] = ESTILO) -> bytes:
+    """SVG vectorial (un solo <path>), para imprenta; siempre negro sobre transparente."""
+    from qrcode.image.svg import SvgPathImage
+
+    img = _qr(url, estilo).make_image(image_factory=SvgPathImage)
+    buf = io.BytesIO()
+    img.save(buf)
+    return buf.getvalue()
+
+
+def _escribir(ruta: str, datos: bytes) -> None:
+    tmp = f"{ruta}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(datos)
+    os.replace(tmp, ruta)
+
+
+def generar(id_bano: str, url: str, estilo: Dict[str, Any], carpeta: str, formatos: Sequence[str]) -> Tuple[str, str]:
+    """
+    Dibuja y guarda `<carpeta>/<id>.<formato>`. Corre en un proceso del pool
+    de make_qr.py: no toca indice.json (lo escribe el proceso padre).
+    Devuelve (id_bano, huella).
+    """
+    base = os.path.join(carpeta, nombre_archivo(id_bano))
+    for fmt in formatos:
+        datos = render_png(url, estilo) if fmt == "png" else render_svg(url, estilo)
+        _escribir(f"{base}.{fmt}", datos)
+    return id_bano, huella(url, id_bano, estilo)
+
+
+# ---------- Caché del endpoint /api/banos/<id>/qr.png ----------
+
+_memoria: "OrderedDict[str, bytes]" = OrderedDict()
+_memoria_lock = threading.Lock()
+_MEMORIA_MAX = 256
+
+
+def png_cacheado(id_bano: str, url: str) -> Tuple[bytes, str]:
+    """
+    PNG del código y su huella: memoria del proceso -> QR_CACHE_DIR (compartido
+    entre workers y reinicios) -> render.
+    """
+    h = huella(url, id_bano)
+    with _memoria_lock:
+        png = _memoria.get(h)
+        if png is not None:
+            _memoria.move_to_end(h)
+            return png, h
+    ruta = os.path.join(QR_CACHE_DIR, f"{h}.png")
+    try:
+        with open(ruta, "rb") as f:
+            png = f.read()
+    except FileNotFoundError:
+        png = render_png(url)
+        try:
+            os.makedirs(QR_CACHE_DIR, exist_ok=True)
+            _escribir(ruta, png)
+        except OSError:
+            pass  # sin caché en disco: queda solo en memoria
+    with _memoria_lock:
+        _memoria[h] = png
+        while len(_memoria) > _MEMORIA_MAX:
+            _memoria.popitem(last=False)
+    return png, h
+
+
+# ---------- Pliegos PDF para imprimir ----------
+
+def _fuente(tamano: int):
+    from PIL import ImageFont
+
+    for nombre in ("DejaVuSans.ttf", "Arial.ttf", "arial.ttf"):
+        try:
+            return ImageFont.truetype(nombre, tamano)
+        except OSError:
+            pass
+    try:
+        return ImageFont.load_default(size=tamano)
+    except TypeError:  # Pillow < 10.1
+        return ImageFont.load_default()
+
+
+def _ajustar(draw, texto: str, fuente, ancho: int) -> List[str]:
+    """Parte `texto` en renglones que quepan en `ancho` px (máx. 2, con '…')."""
+    renglones: List[str] = []
+    actual = ""
+    for palabra in texto.split():
+        prueba = f"{actual} {palabra}".strip()
+        if actual and draw.textlength(prueba, font=fuente) > ancho:
+            renglones.append(actual)
+            actual = palabra
+        else:
+            actual = prueba
+    if actual:
+        renglones.append(actual)
+    if len(renglones) > 2:
+        renglones = [renglones[0], renglones[1] + "…"]
+    return renglones
+
+
+def pliegos_pdf(
+    items: Sequence[Tuple[str, str, str]],
+    salida: str,
+    *,
+    columnas: int = 3,
+    filas: int = 4,
+    dpi: int = 150,
+) -> int:
+    """
+    Arma un PDF tamaño carta con `columnas × filas` códigos por hoja, cada
+    uno con el nombre del baño y su id debajo. items = [(id, nombre, ruta_png)].
+    Devuelve el número de hojas.
+    """
+    from PIL import Image, ImageDraw
+
+    ancho, alto = int(8.5 * dpi), int(11 * dpi)
+    margen = dpi // 2
+    celda_w = (ancho - 2 * margen) // columnas
+    celda_h = (alto - 2 * margen) // filas
+    f_nombre, f_id = _fuente(dpi // 8), _fuente(dpi // 11)
+    alto_texto = dpi // 8 * 2 + dpi // 11 + dpi // 10
+    lado = min(celda_w, celda_h - alto_texto) - dpi // 10
+
+    hojas = []
+    por_hoja = columnas * filas
+    for i in range(0, len(items), por_hoja):
+        hoja = Image.new("RGB", (ancho, alto), "white")
+        draw = ImageDraw.Draw(hoja)
+        for j, (id_bano, nombre, ruta_png) in enumerate(items[i:i + por_hoja]):
+            x = margen + (j % columnas) * celda_w
+            y = margen + (j // columnas) * celda_h
+            with Image.open(ruta_png) as qr:
+                qr = qr.convert("RGB").resize((lado, lado), Image.NEAREST)
+            hoja.paste(qr, (x + (celda_w - lado) // 2, y))
+            ty = y + lado + dpi // 20
+            for renglon in _ajustar(draw, nombre, f_nombre, celda_w - dpi // 10):
+                draw.text((x + celda_w // 2, ty), renglon, fill="black", font=f_nombre, anchor="ma")
+                ty += dpi // 8
+            draw.text((x + celda_w // 2, ty), id_bano, fill="#555555", font=f_id, anchor="ma")
+            # Guía de corte
+            draw.rectangle((x, y - dpi // 20, x + celda_w, y + celda_h - dpi // 20), outline="#dddddd")
+        hojas.append(hoja)
+    if hojas:
+        hojas[0].save(salida, "PDF", save_all=True, append_images=hojas[1:], resolution=dpi)
+    return len(hojas)
+
+
+def leer_indice(carpeta: str) -> Dict[str, str]:
+    try:
+        with open(os.path.join(carpeta, "indice.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def guardar_indice(carpeta: str, indice: Dict[str, str]) -> None:
+    datos = json.dumps(indice, ensure_ascii=False, indent=1, sort_keys=True).encode("utf-8")
+    _escribir(os.path.join(carpeta, "indice.json"), datos)
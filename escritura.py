@@ -0,0 +1,95 @@
+"""
+Group commit opcional para POST /api/reportes.
+
+Con GROUP_COMMIT_MS > 0, las peticiones encolan el reporte (ya validado) y
+un hilo escritor junta lo que llegue en esa ventana (hasta
+GROUP_COMMIT_MAX filas) en UNA transacción: un INSERT ... RETURNING por
+lote y un solo commit/fsync. Cada petición espera su id de ticket.
+
+Si el lote falla, se reintenta fila por fila para aislar el error.
+Con GROUP_COMMIT_MS = 0 (por defecto) la app usa create_reporte directo.
+"""
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+from models import SessionLocal, insertar_reportes
+
+GROUP_COMMIT_MS = float(os.getenv("GROUP_COMMIT_MS", "0"))
+GROUP_COMMIT_MAX = int(os.getenv("GROUP_COMMIT_MAX", "200"))
+GROUP_COMMIT_TIMEOUT_S = float(os.getenv("GROUP_COMMIT_TIMEOUT_S", "10"))
+
+
+class ColaEscritura:
+    def __init__(self, ventana_ms: float = GROUP_COMMIT_MS, max_lote: int = GROUP_COMMIT_MAX):
+        self.ventana = ventana_ms / 1000.0
+        self.max_lote = max_lote
+        self._cola: "queue.Queue[Tuple[Dict[str, Any], Future]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._hilo: Optional[threading.Thread] = None
+
+    def encolar(self, fila: Dict[str, Any]) -> Future:
+        """Encola una fila validada; el Future se resuelve con su id."""
+        fut: Future = Future()
+        self._cola.put((fila, fut))
+        self._asegurar_hilo()
+        return fut
+
+    def enviar(self, fila: Dict[str, Any], timeout: float = GROUP_COMMIT_TIMEOUT_S) -> int:
+        """
+        Encola una fila validada y bloquea hasta tener su id. Un TimeoutError
+        no significa que falló: el hilo escritor puede guardarla después.
+        """
+        return self.encolar(fila).result(timeout=timeout)
+
+    def _asegurar_hilo(self) -> None:
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._loop, name="group-commit", daemon=True)
+                self._hilo.start()
+
+    def _tomar_lote(self) -> List[Tuple[Dict[str, Any], Future]]:
+        lote = [self._cola.get()]
+        limite = time.monotonic() + self.ventana
+        while len(lote) < self.max_lote:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self._cola.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _loop(self) -> None:
+        while True:
+            lote = self._tomar_lote()
+            try:
+                with SessionLocal() as s:
+                    ids = insertar_reportes(s, [f for f, _ in lote])
+                    s.commit()
+                for (_, fut), id_ in zip(lote, ids):
+                    fut.set_result(id_)
+            except Exception:
+                self._uno_por_uno(lote)
+
+    @staticmethod
+    def _uno_por_uno(lote) -> None:
+        for fila, fut in lote:
+            try:
+                with SessionLocal() as s:
+                    [id_] = insertar_reportes(s, [fila])
+                    s.commit()
+                fut.set_result(id_)
+            except Exception as e:
+                fut.set_exception(e)
+
+
+cola_escritura: Optional[ColaEscritura] = ColaEscritura() if GROUP_COMMIT_MS > 0 else None
@@ -0,0 +1,109 @@
+"""
+Fan-out de reportes nuevos para el stream SSE (/api/stream).
+
+Un hilo por proceso consulta `reportes` con id > último visto cada
+STREAM_POLL_S segundos y reparte cada fila a las colas de los clientes
+conectados. Funciona igual con SQLite y Postgres, y entre workers de
+gunicorn: cada proceso hace su propia consulta (1 por intervalo, sin
+importar cuántos dashboards estén abiertos).
+
+Los ids no llegan en orden de commit: con transacciones concurrentes en
+Postgres, o el group commit junto a inserciones directas, un id menor puede
+confirmarse después de uno mayor. Los ids que el último visto se salta
+quedan como huecos y se vuelven a consultar durante STREAM_HUECO_S segundos
+(como mucho STREAM_HUECOS_MAX); pasado eso se dan por perdidos (rollback,
+saltos de la secuencia).
+"""
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, Optional, Set
+
+import admision
+from models import SessionLocal, reportes_desde, ultimo_reporte_id
+
+STREAM_POLL_S = float(os.getenv("STREAM_POLL_S", "1.0"))
+STREAM_HUECO_S = float(os.getenv("STREAM_HUECO_S", "30"))
+STREAM_HUECOS_MAX = int(os.getenv("STREAM_HUECOS_MAX", "500"))
+# Cada cliente SSE ocupa un hilo de gthread hasta STREAM_MAX_S: el tope es el
+# presupuesto de streams (admision.ADMISION_STREAMS); STREAM_MAX_CLIENTES solo
+# lo baja (p. ej. para dejar lugar a las exportaciones)
+STREAM_MAX_CLIENTES = min(
+    int(os.getenv("STREAM_MAX_CLIENTES") or admision.ADMISION_STREAMS), admision.ADMISION_STREAMS
+)
+
+
+class Difusor:
+    def __init__(self, intervalo: float = STREAM_POLL_S, max_clientes: int = STREAM_MAX_CLIENTES):
+        self.intervalo = intervalo
+        self.max_clientes = max_clientes
+        self._lock = threading.Lock()
+        self._subs: Set["queue.Queue[Dict[str, Any]]"] = set()
+        self._hilo: Optional[threading.Thread] = None
+        self._ultimo_id: Optional[int] = None
+        self._huecos: Dict[int, float] = {}   # id saltado -> monotonic en que se vio el hueco
+
+    def suscribir(self) -> Optional["queue.Queue[Dict[str, Any]]"]:
+        """Cola con los reportes nuevos, o None si se alcanzó el máximo de clientes."""
+        with self._lock:
+            if len(self._subs) >= self.max_clientes:
+                return None
+            cola: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=1000)
+            self._subs.add(cola)
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._loop, name="difusor-reportes", daemon=True)
+                self._hilo.start()
+            return cola
+
+    def cancelar(self, cola) -> None:
+        with self._lock:
+            self._subs.discard(cola)
+
+    def _loop(self) -> None:
+        while True:
+            with self._lock:
+                if not self._subs:
+                    # Sin clientes: el hilo termina; la próxima suscripción lo relanza
+                    self._hilo = None
+                    self._ultimo_id = None
+                    self._huecos.clear()
+                    return
+                subs = list(self._subs)
+            try:
+                with SessionLocal() as s:
+                    if self._ultimo_id is None:
+                        self._ultimo_id = ultimo_reporte_id(s)
+                        nuevos = []
+                    else:
+                        nuevos = reportes_desde(s, self._ultimo_id, huecos=self._huecos)
+                ahora = time.monotonic()
+                for rep in nuevos:
+                    if self._huecos.pop(rep["id"], None) is None:
+                        # Vienen en orden de id: lo que hay entre la marca y este no existe (aún)
+                        desde = max(self._ultimo_id + 1, rep["id"] - STREAM_HUECOS_MAX)
+                        self._huecos.update(dict.fromkeys(range(desde, rep["id"]), ahora))
+                        self._ultimo_id = rep["id"]
+                    for cola in subs:
+                        try:
+                            cola.put_nowait(rep)
+                        except queue.Full:
+                            pass  # cliente lento: se resincroniza al reconectar
+                self._olvidar_huecos(ahora)
+            except Exception as e:
+                print(f"[stream] error consultando reportes: {e}")
+            time.sleep(self.intervalo)
+
+    def _olvidar_huecos(self, ahora: float) -> None:
+        """Descarta huecos vencidos y, si sobran, los más viejos (ids menores)."""
+        vencidos = [i for i, t in self._huecos.items() if ahora - t >= STREAM_HUECO_S]
+        for i in vencidos:
+            del self._huecos[i]
+        if len(self._huecos) > STREAM_HUECOS_MAX:
+            for i in sorted(self._huecos)[: len(self._huecos) - STREAM_HUECOS_MAX]:
+                del self._huecos[i]
+
+
+difusor = Difusor()
@@ -0,0 +1,168 @@
+"""
+Pipeline de fotos de reportes.
+
+En la petición solo se copia la subida a disco por bloques (calculando su
+sha256). Un pool de hilos en segundo plano hace lo pesado con Pillow: quita
+EXIF, corrige orientación y genera dos WebP con nombre por contenido:
+
+    <hash>.webp     imagen completa (lado mayor <= FOTO_MAX_PX)
+    <hash>_t.webp   miniatura para el dashboard (lado mayor <= FOTO_THUMB_PX)
+
+El original `<hash>.orig.<ext>` conserva el EXIF (GPS incluido): nunca se
+sirve y se borra en cuanto existen los derivados. Mientras el worker no
+termina (o si Pillow no está instalado), /uploads responde a los WebP con un
+marcador sin caché.
+"""
+from __future__ import annotations
+
+import glob
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+FOTOS_WORKERS = int(os.getenv("FOTOS_WORKERS", "2"))
+FOTO_MAX_PX = int(os.getenv("FOTO_MAX_PX", "1600"))
+FOTO_THUMB_PX = int(os.getenv("FOTO_THUMB_PX", "320"))
+FOTO_CALIDAD = int(os.getenv("FOTO_CALIDAD", "78"))
+
+# Lo que /uploads devuelve por un WebP que todavía se está generando
+PENDIENTE_SVG = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="160" height="120" viewBox="0 0 160 120">'
+    '<rect width="160" height="120" fill="#e5e7eb"/>'
+    '<text x="80" y="64" font-family="sans-serif" font-size="13" fill="#6b7280" '
+    'text-anchor="middle">Procesando foto</text></svg>'
+)
+
+_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=FOTOS_WORKERS, thread_name_prefix="fotos")
+    return _pool
+
+
+def guardar_subida(fs, carpeta: str, ext: str) -> Tuple[str, bool]:
+    """
+    Copia el FileStorage `fs` a `carpeta` por bloques y devuelve (hash de
+    contenido (24 hex), nuevo). El original queda como <hash>.orig.<ext>;
+    nuevo=False si ya existía o ya está procesado (misma foto en otro
+    reporte): en ese caso no queda nada nuevo en disco.
+    """
+    h = hashlib.sha256()
+    fd, tmp = tempfile.mkstemp(dir=carpeta, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                bloque = fs.stream.read(64 * 1024)
+                if not bloque:
+                    break
+                h.update(bloque)
+                out.write(bloque)
+        digest = h.hexdigest()[:24]
+        if _procesada(carpeta, digest):
+            os.unlink(tmp)
+            return digest, False
+        destino = os.path.join(carpeta, f"{digest}.orig.{ext}")
+        nuevo = not os.path.exists(destino)
+        os.replace(tmp, destino)
+        return digest, nuevo
+    except Exception:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def descartar_subida(carpeta: str, digest: str, ext: str) -> None:
+    """Borra el original de una subida cuyo reporte no se guardó."""
+    try:
+        os.unlink(os.path.join(carpeta, f"{digest}.orig.{ext}"))
+    except FileNotFoundError:
+        pass
+
+
+def urls(digest: str) -> Tuple[str, str]:
+    """(foto_url, foto_thumb_url) que se guardan en el reporte."""
+    return f"/uploads/{digest}.webp", f"/uploads/{digest}_t.webp"
+
+
+def _guardar_webp(img, destino: str, lado: int, calidad: int) -> None:
+    im = img.copy()
+    im.thumbnail((lado, lado))
+    tmp = destino + ".part"
+    # Sin exif=...: Pillow no copia los metadatos al WebP
+    im.save(tmp, "WEBP", quality=calidad, method=4)
+    os.replace(tmp, destino)
+
+
+def procesar(carpeta: str, digest: str) -> None:
+    """
+    Genera <hash>.webp y <hash>_t.webp desde el original (en el pool) y
+    después borra el original.
+    """
+    from PIL import Image, ImageOps  # import perezoso: solo en el worker
+
+    origen = _original(carpeta, digest)
+    if origen is None:
+        return
+    with Image.open(origen) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGB")
+        _guardar_webp(img, os.path.join(carpeta, f"{digest}.webp"), FOTO_MAX_PX, FOTO_CALIDAD)
+        _guardar_webp(img, os.path.join(carpeta, f"{digest}_t.webp"), FOTO_THUMB_PX, FOTO_CALIDAD - 10)
+    os.unlink(origen)
+
+
+def _procesar_seguro(carpeta: str, digest: str) -> None:
+    try:
+        procesar(carpeta, digest)
+    except FileNotFoundError:
+        pass  # otra subida de la misma foto la procesó a la vez
+    except ImportError:
+        # Se conserva el original (sin servirlo) para procesarlo con Pillow
+        print("[fotos] Pillow no disponible; la foto queda sin publicar")
+    except Exception as e:
+        # Imagen corrupta o no soportada: nunca tendrá derivados
+        print(f"[fotos] error procesando {digest}: {e}; se descarta el original")
+        origen = _original(carpeta, digest)
+        if origen:
+            os.unlink(origen)
+
+
+def encolar(carpeta: str, digest: str) -> None:
+    """Procesa en segundo plano (no bloquea la petición)."""
+    if _procesada(carpeta, digest):
+        return  # misma foto ya procesada
+    _executor().submit(_procesar_seguro, carpeta, digest)
+
+
+def _procesada(carpeta: str, digest: str) -> bool:
+    # La miniatura se escribe al final: si existe, los dos derivados están
+    return os.path.exists(os.path.join(carpeta, f"{digest}_t.webp"))
+
+
+def _original(carpeta: str, digest: str) -> Optional[str]:
+    encontrados = glob.glob(os.path.join(glob.escape(carpeta), f"{glob.escape(digest)}.orig.*"))
+    return encontrados[0] if encontrados else None
+
+
+def resolver(carpeta: str, fname: str) -> Tuple[Optional[str], bool]:
+    """
+    Archivo a servir para /uploads/<fname>. Devuelve (nombre, pendiente):
+    nombre=None si no hay nada publicable (los originales con EXIF y las
+    copias a medias nunca lo son); pendiente=True si el WebP pedido todavía
+    se está generando.
+    """
+    base = os.path.basename(fname)
+    if ".orig." in base or base.endswith(".part"):
+        return None, False
+    if os.path.exists(os.path.join(carpeta, fname)):
+        return fname, False
+    if base.endswith(".webp"):
+        digest = base[: -len(".webp")].removesuffix("_t")
+        return None, _original(carpeta, digest) is not None
+    return None, False
@@ -0,0 +1,76 @@
+"""
+Reintentos y doble toque en POST /api/reportes (y por item en /bulk).
+
+- Idempotency-Key (cabecera o campo `idempotency_key`): se guarda en
+  reportes.uuid_cliente (índice único, el mismo que usa la cola offline).
+  Repetir la clave devuelve el reporte_id original; la búsqueda pasa primero
+  por una caché en memoria y luego por el índice, nunca por el INSERT.
+- Ventana de casi-duplicados: mismo (id_bano, categoria, IP) dentro de
+  DUP_WINDOW_S segundos devuelve el reporte anterior. Vive en memoria (por
+  worker), sin consultas. DUP_WINDOW_S=0 la desactiva. En /bulk la aplica
+  insertar_lote_cliente con el creado_en de cada item.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+DUP_WINDOW_S = float(os.getenv("DUP_WINDOW_S", "10"))
+IDEMPOTENCIA_CACHE_S = float(os.getenv("IDEMPOTENCIA_CACHE_S", "3600"))
+IDEMPOTENCIA_MAX = int(os.getenv("IDEMPOTENCIA_MAX", "10000"))   # entradas por estructura
+
+
+class VentanaTTL:
+    """Mapa clave -> reporte_id que olvida entradas tras `ttl` segundos (LRU acotado)."""
+
+    def __init__(self, ttl: float, max_items: int = IDEMPOTENCIA_MAX):
+        self.ttl = ttl
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._datos: "OrderedDict[Hashable, tuple]" = OrderedDict()   # clave -> (expira, id)
+
+    def buscar(self, clave: Hashable) -> Optional[int]:
+        if self.ttl <= 0:
+            return None
+        ahora = time.monotonic()
+        with self._lock:
+            e = self._datos.get(clave)
+            if e is None:
+                return None
+            if e[0] <= ahora:
+                del self._datos[clave]
+                return None
+            return e[1]
+
+    def guardar(self, clave: Hashable, reporte_id: int) -> None:
+        if self.ttl <= 0:
+            return
+        ahora = time.monotonic()
+        with self._lock:
+            self._datos[clave] = (ahora + self.ttl, reporte_id)
+            self._datos.move_to_end(clave)
+            # Purga lo vencido al frente (orden de inserción ~ orden de vencimiento)
+            while self._datos:
+                k, (expira, _) = next(iter(self._datos.items()))
+                if expira > ahora and len(self._datos) <= self.max_items:
+                    break
+                del self._datos[k]
+
+
+claves = VentanaTTL(IDEMPOTENCIA_CACHE_S)
+recientes = VentanaTTL(DUP_WINDOW_S)
+
+
+def normalizar_clave(valor: Optional[str]) -> Optional[str]:
+    """Recorta la clave; si es un UUID lo deja en forma canónica (como la cola offline)."""
+    valor = (valor or "").strip()[:200]
+    if not valor:
+        return None
+    try:
+        return str(uuid.UUID(valor))
+    except ValueError:
+        return valor
@@ -1,14 +1,83 @@
-import qrcode, os
+"""
+Genera los códigos QR de los baños del catálogo (tabla `banos`).
 
-BASE = os.environ.get("QR_BASE_URL", "http://localhost:8000/qr")
-os.makedirs("qr_out", exist_ok=True)
+    python make_qr.py                                  # PNG de los baños activos en ./qr_out
+    python make_qr.py --formatos png,svg --pdf qr.pdf  # + SVG y pliegos para imprimir
+    python make_qr.py --zona "Planta 1" --todos        # una zona, incluye inactivos
 
-def make_one(id_bano: str):
-    url = f"{BASE}?r={id_bano}"
-    img = qrcode.make(url)
-    img.save(f"qr_out/{id_bano}.png")
+La URL de cada código es QR_BASE_URL (o --base) + `?r=<id>`. Solo se dibujan
+los baños cuya huella (URL, id, estilo) cambió desde la última corrida
+(`<salida>/indice.json`); --forzar los dibuja todos. El dibujo corre en un
+pool de procesos (--procesos, por defecto uno por CPU).
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
 
-for idb in ["B-A1-H1","B-A1-M1","B-A2-H2"]:
-    make_one(idb)
+import codigos_qr
+from models import SessionLocal, get_banos
 
-print("QRs generados en ./qr_out")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Códigos QR de los baños del catálogo")
+    parser.add_argument("--base", default=codigos_qr.QR_BASE_URL or "http://localhost:8000/qr",
+                        help="URL del formulario QR (default QR_BASE_URL)")
+    parser.add_argument("--salida", default="qr_out", help="carpeta de salida")
+    parser.add_argument("--formatos", default="png", help="png, svg o png,svg")
+    parser.add_argument("--zona", help="solo los baños de esta zona")
+    parser.add_argument("--todos", action="store_true", help="incluye baños inactivos")
+    parser.add_argument("--pdf", help="además arma pliegos imprimibles en este PDF")
+    parser.add_argument("--columnas", type=int, default=3)
+    parser.add_argument("--filas", type=int, default=4)
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--forzar", action="store_true", help="dibuja aunque la huella no haya cambiado")
+    args = parser.parse_args(argv)
+
+    formatos = [f.strip().lower() for f in args.formatos.split(",") if f.strip()]
+    if args.pdf and "png" not in formatos:
+        formatos.append("png")  # los pliegos se arman con los PNG
+    if not formatos or set(formatos) - {"png", "svg"}:
+        parser.error("--formatos admite png y svg")
+
+    with SessionLocal() as s:
+        banos = get_banos(s, solo_activos=not args.todos)
+    if args.zona:
+        banos = [b for b in banos if b["zona"] == args.zona]
+    if not banos:
+        print("[qr] No hay baños que coincidan.")
+        return
+
+    os.makedirs(args.salida, exist_ok=True)
+    indice = codigos_qr.leer_indice(args.salida)
+    pendientes = []
+    for b in banos:
+        url = codigos_qr.url_bano(b["id"], args.base)
+        base = os.path.join(args.salida, codigos_qr.nombre_archivo(b["id"]))
+        al_dia = (
+            indice.get(b["id"]) == codigos_qr.huella(url, b["id"])
+            and all(os.path.exists(f"{base}.{fmt}") for fmt in formatos)
+        )
+        if args.forzar or not al_dia:
+            pendientes.append((b["id"], url, codigos_qr.ESTILO, args.salida, formatos))
+
+    if len(pendientes) > 1 and args.procesos > 1:
+        with ProcessPoolExecutor(max_workers=min(args.procesos, len(pendientes))) as pool:
+            hechos = list(pool.map(codigos_qr.generar, *zip(*pendientes)))
+    else:
+        hechos = [codigos_qr.generar(*p) for p in pendientes]
+    if hechos:
+        indice.update(hechos)
+        codigos_qr.guardar_indice(args.salida, indice)
+    print(f"[qr] {len(hechos)} generados, {len(banos) - len(hechos)} sin cambios en ./{args.salida}")
+
+    if args.pdf:
+        items = [
+            (b["id"], b["nombre"], os.path.join(args.salida, codigos_qr.nombre_archivo(b["id"]) + ".png"))
+            for b in banos
+        ]
+        hojas = codigos_qr.pliegos_pdf(items, args.pdf, columnas=args.columnas, filas=args.filas)
+        print(f"[qr] {args.pdf}: {hojas} hojas ({args.columnas}×{args.filas} por hoja)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Comandos de mantenimiento.
+
+    python manage.py migrate     # aplica migraciones pendientes (una vez por deploy)
+    python manage.py assets      # huellas, gzip/brotli y WebP/AVIF de static/ (en el build)
+    python manage.py seed        # baños de ejemplo si la tabla está vacía (--todos: agrega los que falten)
+    python manage.py rollups     # reconstruye reportes_diarios/horarios desde reportes
+    python manage.py busqueda    # reconstruye el índice de texto del buscador
+    python manage.py archivar    # mueve a ARCHIVO_DIR los reportes de hace más de ARCHIVO_MESES meses
+    python manage.py particiones # Postgres: particiona `reportes` por mes y crea las siguientes
+"""
+import argparse
+import os
+
+from archivo import ARCHIVO_MESES
+from models import (
+    SessionLocal, reconstruir_rollups, reconstruir_busqueda, ROLLUP_TZ,
+    archivar_reportes, corte_archivo, particionar_reportes, asegurar_particiones, reportes_particionado,
+)
+
+
+def cmd_migrate(args):
+    from migraciones import migrar, version_esquema
+
+    aplicadas = migrar()
+    if aplicadas:
+        print(f"[migrate] aplicadas: {', '.join(map(str, aplicadas))}; versión {version_esquema()}")
+    else:
+        print(f"[migrate] sin cambios; versión {version_esquema()}")
+
+
+def cmd_assets(args):
+    import assets
+
+    static = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+    destino = args.destino or assets.ASSETS_DIR
+    pipeline = assets.construir(static, destino)
+    print(f"[assets] {len(pipeline.assets)} assets en {destino}")
+
+
+def _exigir_esquema(cmd):
+    from migraciones import SCHEMA_VERSION, version_esquema
+
+    version = version_esquema()
+    if version < SCHEMA_VERSION:
+        raise SystemExit(f"[{cmd}] esquema en versión {version} (se espera {SCHEMA_VERSION}): "
+                         "ejecuta `python manage.py migrate`")
+
+
+def cmd_seed(args):
+    from migraciones import sembrar_banos
+
+    n = sembrar_banos(solo_si_vacia=not args.todos)
+    print(f"[seed] {n} baños insertados" if n else "[seed] Ya existen baños; no se inserta.")
+
+
+def cmd_rollups(args):
+    _exigir_esquema("rollups")
+    with SessionLocal() as s:
+        n = reconstruir_rollups(s)
+    print(f"[rollups] reportes_diarios y reportes_horarios reconstruidos ({n} grupos diarios, tz={ROLLUP_TZ})")
+
+
+def cmd_busqueda(args):
+    _exigir_esquema("busqueda")
+    with SessionLocal() as s:
+        n = reconstruir_busqueda(s)
+    print(f"[busqueda] índice de texto reconstruido ({n} reportes)")
+
+
+def cmd_archivar(args):
+    from archivo import ARCHIVO_DIR
+
+    with SessionLocal() as s:
+        hechos = archivar_reportes(s, meses=args.meses)
+        corte = corte_archivo(s)
+    for mes, n in hechos.items():
+        print(f"[archivar] {mes}: {n} reportes")
+    print(f"[archivar] {sum(hechos.values())} reportes archivados en {ARCHIVO_DIR}; corte {corte.isoformat() if corte else '-'}")
+
+
+def cmd_particiones(args):
+    with SessionLocal() as s:
+        if particionar_reportes(s):
+            print("[particiones] reportes convertida a tabla particionada por mes")
+        creadas = asegurar_particiones(s)
+        if not reportes_particionado(s):
+            print("[particiones] solo aplica a Postgres")
+            return
+    print(f"[particiones] creadas: {', '.join(creadas) if creadas else 'ninguna'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mantenimiento del sistema de reportes de baños")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("migrate", help="Aplica las migraciones pendientes del esquema")
+    p.set_defaults(func=cmd_migrate)
+
+    p = sub.add_parser("assets", help="Precalcula los assets estáticos con huella (build)")
+    p.add_argument("--destino", default=None, help="directorio del build (default ASSETS_DIR)")
+    p.set_defaults(func=cmd_assets)
+
+    p = sub.add_parser("seed", help="Inserta los baños de ejemplo")
+    p.add_argument("--todos", action="store_true", help="agrega los que falten aunque ya haya baños")
+    p.set_defaults(func=cmd_seed)
+
+    p = sub.add_parser("rollups", help="Reconstruye los rollups diario y por hora")
+    p.set_defaults(func=cmd_rollups)
+
+    p = sub.add_parser("busqueda", help="Reconstruye el índice de texto (FTS5 / pg_trgm)")
+    p.set_defaults(func=cmd_busqueda)
+
+    p = sub.add_parser("archivar", help="Mueve los reportes viejos a archivos mensuales (NDJSON gzip)")
+    p.add_argument("--meses", type=int, default=ARCHIVO_MESES,
+                   help=f"conserva en la BD los últimos N meses (default {ARCHIVO_MESES})")
+    p.set_defaults(func=cmd_archivar)
+
+    p = sub.add_parser("particiones", help="Particiona `reportes` por mes (Postgres) y crea las siguientes")
+    p.set_defaults(func=cmd_particiones)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Métricas de la app en formato de texto de Prometheus (/api/metrics).
+
+- Latencia por endpoint (histograma), consultas SQL por petición y su
+  duración (eventos before/after_cursor_execute), espera al pedir conexión
+  al pool, tamaño de subidas y contadores genéricos.
+- Multiproceso: con METRICS_DIR cada worker vuelca su snapshot a
+  <METRICS_DIR>/<pid>.json (como mucho cada METRICS_FLUSH_S) y /api/metrics
+  suma los de todos los workers. Sin METRICS_DIR solo se ve el proceso actual.
+- Server-Timing: cada respuesta lleva db;dur=..., app;dur=... y los tramos
+  que marque el código (p. ej. ser = serialización JSON).
+"""
+from __future__ import annotations
+
+import glob
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+METRICS_DIR = os.getenv("METRICS_DIR", "").strip()
+METRICS_FLUSH_S = float(os.getenv("METRICS_FLUSH_S", "1"))
+
+BUCKETS_S = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_QUERIES = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+BUCKETS_BYTES = (16e3, 64e3, 256e3, 512e3, 1e6, 2e6, 3e6)
+
+# nombre -> (tipo, ayuda, buckets)
+FAMILIAS: Dict[str, Tuple[str, str, Tuple[float, ...]]] = {
+    "http_request_duration_seconds": ("histogram", "Latencia por endpoint", BUCKETS_S),
+    "db_queries_per_request": ("histogram", "Consultas SQL por petición", BUCKETS_QUERIES),
+    "db_query_duration_seconds": ("histogram", "Duración de cada consulta SQL", BUCKETS_S),
+    "db_pool_checkout_seconds": ("histogram", "Espera al obtener conexión del pool", BUCKETS_S),
+    "upload_bytes": ("histogram", "Tamaño de las subidas (POST /api/reportes)", BUCKETS_BYTES),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Registro:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (nombre, labels) -> [conteos por bucket..., suma, total]
+        self.hist: Dict[Tuple[str, Labels], List[float]] = {}
+        self.cont: Dict[Tuple[str, Labels], float] = {}
+
+    def observar(self, nombre: str, valor: float, **labels: str) -> None:
+        buckets = FAMILIAS[nombre][2]
+        key = (nombre, tuple(sorted(labels.items())))
+        with self._lock:
+            h = self.hist.get(key)
+            if h is None:
+                h = self.hist[key] = [0.0] * (len(buckets) + 2)
+            for i, b in enumerate(buckets):
+                if valor <= b:
+                    h[i] += 1
+            h[-2] += valor
+            h[-1] += 1
+
+    def incrementar(self, nombre: str, n: float = 1, **labels: str) -> None:
+        key = (nombre, tuple(sorted(labels.items())))
+        with self._lock:
+            self.cont[key] = self.cont.get(key, 0) + n
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "hist": [[n, list(l), v[:]] for (n, l), v in self.hist.items()],
+                "cont": [[n, list(l), v] for (n, l), v in self.cont.items()],
+            }
+
+
+registro = Registro()
+
+# Contadores conocidos: nombre -> ayuda (los demás salen sin HELP)
+AYUDA_CONTADORES: Dict[str, str] = {}
+
+
+def registrar_contador(nombre: str, ayuda: str) -> None:
+    AYUDA_CONTADORES[nombre] = ayuda
+
+
+# ---------------- Estado por petición ----------------
+
+_req = threading.local()
+
+
+def iniciar_peticion() -> None:
+    _req.t0 = time.perf_counter()
+    _req.db_s = 0.0
+    _req.queries = 0
+    _req.tramos = {}
+
+
+def tramo(nombre: str, segundos: float) -> None:
+    """Suma un tramo de tiempo a la petición actual (sale en Server-Timing)."""
+    tramos = getattr(_req, "tramos", None)
+    if tramos is not None:
+        tramos[nombre] = tramos.get(nombre, 0.0) + segundos
+
+
+def terminar_peticion(endpoint: str, metodo: str, status: int) -> Optional[str]:
+    """Registra la petición y devuelve el valor de Server-Timing."""
+    t0 = getattr(_req, "t0", None)
+    if t0 is None:
+        return None
+    total = time.perf_counter() - t0
+    registro.observar("http_request_duration_seconds", total,
+                      endpoint=endpoint, method=metodo, status=str(status))
+    registro.observar("db_queries_per_request", _req.queries, endpoint=endpoint)
+    partes = [f"db;dur={_req.db_s * 1000:.1f};desc=\"{_req.queries} queries\""]
+    partes += [f"{n};dur={s * 1000:.1f}" for n, s in _req.tramos.items()]
+    partes.append(f"app;dur={max(0.0, total - _req.db_s) * 1000:.1f}")
+    _req.t0 = None
+    volcar()
+    return ", ".join(partes)
+
+
+# ---------------- SQLAlchemy ----------------
+
+def instrumentar_engine(engine) -> None:
+    """Cuenta/cronometra consultas y la espera del pool de `engine`."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_metricas_t0", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _despues(conn, cursor, statement, parameters, context, executemany):
+        pila = conn.info.get("_metricas_t0")
+        if not pila:
+            return
+        dur = time.perf_counter() - pila.pop()
+        registro.observar("db_query_duration_seconds", dur)
+        if getattr(_req, "t0", None) is not None:
+            _req.db_s += dur
+            _req.queries += 1
+
+    # Espera del checkout: envuelve Pool.connect (incluye abrir conexión nueva)
+    pool = engine.pool
+    connect_original = pool.connect
+
+    def connect_medido():
+        t0 = time.perf_counter()
+        try:
+            return connect_original()
+        finally:
+            registro.observar("db_pool_checkout_seconds", time.perf_counter() - t0)
+
+    pool.connect = connect_medido
+
+
+# ---------------- Multiproceso + exposición ----------------
+
+_ultimo_volcado = 0.0
+
+
+def volcar(forzar: bool = False) -> None:
+    """Escribe el snapshot del proceso en METRICS_DIR (limitado en frecuencia)."""
+    global _ultimo_volcado
+    if not METRICS_DIR:
+        return
+    ahora = time.monotonic()
+    if not forzar and ahora - _ultimo_volcado < METRICS_FLUSH_S:
+        return
+    _ultimo_volcado = ahora
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    destino = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+    tmp = destino + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(registro.snapshot(), f)
+    os.replace(tmp, destino)
+
+
+def _snapshots() -> Iterable[dict]:
+    yield registro.snapshot()
+    if not METRICS_DIR:
+        return
+    propio = f"{os.getpid()}.json"
+    for ruta in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+        if os.path.basename(ruta) == propio:
+            continue
+        try:
+            with open(ruta, encoding="utf-8") as f:
+                yield json.load(f)
+        except (OSError, ValueError):
+            continue
+
+
+def _fmt_labels(labels: Iterable[Tuple[str, str]], extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+def exponer() -> str:
+    """Texto Prometheus con la suma de todos los workers."""
+    hist: Dict[Tuple[str, Labels], List[float]] = {}
+    cont: Dict[Tuple[str, Labels], float] = {}
+    for snap in _snapshots():
+        for n, l, v in snap["hist"]:
+            key = (n, tuple(tuple(x) for x in l))
+            acc = hist.setdefault(key, [0.0] * len(v))
+            for i, x in enumerate(v):
+                acc[i] += x
+        for n, l, v in snap["cont"]:
+            key = (n, tuple(tuple(x) for x in l))
+            cont[key] = cont.get(key, 0) + v
+
+    lineas: List[str] = []
+    for nombre, (tipo, ayuda, buckets) in FAMILIAS.items():
+        lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}"]
+        for (n, labels), v in sorted(hist.items()):
+            if n != nombre:
+                continue
+            for b, c in zip(buckets, v):
+                lineas.append(f"{n}_bucket{_fmt_labels(labels, ('le', repr(float(b))))} {c:g}")
+            lineas.append(f"{n}_bucket{_fmt_labels(labels, ('le', '+Inf'))} {v[-1]:g}")
+            lineas.append(f"{n}_sum{_fmt_labels(labels)} {v[-2]:.6f}")
+            lineas.append(f"{n}_count{_fmt_labels(labels)} {v[-1]:g}")
+    vistos = set()
+    for (n, labels), v in sorted(cont.items()):
+        if n not in vistos:
+            vistos.add(n)
+            if n in AYUDA_CONTADORES:
+                lineas.append(f"# HELP {n} {AYUDA_CONTADORES[n]}")
+            lineas.append(f"# TYPE {n} counter")
+        lineas.append(f"{n}{_fmt_labels(labels)} {v:g}")
+    return "\n".join(lineas) + "\n"
@@ -0,0 +1,248 @@
+"""
+Migraciones versionadas del esquema + semilla de baños.
+
+Se ejecutan UNA vez por deploy (`python manage.py migrate` / `seed`, ver
+render.yaml), no en cada worker: al arrancar, la app solo compara
+max(schema_version.version) con SCHEMA_VERSION (una consulta).
+
+Cada versión es una foto fija: describe el DDL tal como era en ese momento
+y nunca lee los modelos actuales (create_all sobre models.py haría que todo
+cambio futuro cayera, sin registro, en la v1). Para cambiar el esquema:
+cambia models.py Y agrega al final de MIGRACIONES una función nueva con el
+DDL del cambio (ALTER/CREATE explícitos); no edites las anteriores. Cada
+migración debe ser idempotente (las BDs viejas pueden venir de schema.sql o
+de versiones previas de la app).
+"""
+from __future__ import annotations
+
+import datetime
+import os
+from typing import Callable, List, Tuple
+
+from sqlalchemy import (
+    Boolean, Column, Date, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, Text,
+    func, inspect, select, text,
+)
+from sqlalchemy.exc import DBAPIError
+
+import models
+from models import SessionLocal, SchemaVersion, Bano
+
+# Si la BD está atrasada al arrancar la app, migra ahí mismo (solo para
+# desarrollo local; en producción corre `manage.py migrate` antes de gunicorn)
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "0") == "1"
+
+# Llave de pg_advisory_lock para que dos `migrate` simultáneos no choquen
+_LOCK_MIGRACIONES = 481516
+
+
+# ---- v1: esquema base (congelado; no editar) ----
+_V1 = MetaData()
+
+Table(
+    "banos", _V1,
+    Column("id", String, primary_key=True),
+    Column("nombre", String, nullable=False),
+    Column("zona", String),
+    Column("piso", String),
+    Column("sexo", String),
+    Column("activo", Boolean, nullable=False, server_default="1"),
+)
+_v1_reportes = Table(
+    "reportes", _V1,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("id_bano", String, ForeignKey("banos.id", ondelete="CASCADE"), nullable=False, index=True),
+    Column("categoria", String, nullable=False),
+    Column("comentario", Text),
+    Column("foto_url", String),
+    Column("foto_thumb_url", String),
+    Column("origen", String, nullable=False, server_default="qr"),
+    Column("creado_en", DateTime(timezone=True), nullable=False, server_default=func.now(), index=True),
+    Column("creado_por_ip", String),
+    Column("uuid_cliente", String),
+    Column("estado", String, server_default="abierto"),
+)
+Index("idx_reportes_bano_fecha", _v1_reportes.c.id_bano, _v1_reportes.c.creado_en.desc())
+Index("idx_reportes_fecha_id", _v1_reportes.c.creado_en.desc(), _v1_reportes.c.id.desc())
+Index("idx_reportes_categoria", _v1_reportes.c.categoria)
+Index("idx_reportes_estado", _v1_reportes.c.estado)
+Index("idx_reportes_uuid_cliente", _v1_reportes.c.uuid_cliente, unique=True)
+Table(
+    "reportes_diarios", _V1,
+    Column("dia", Date, primary_key=True),
+    Column("id_bano", String, primary_key=True),
+    Column("categoria", String, primary_key=True),
+    Column("total", Integer, nullable=False, server_default="0"),
+)
+Table(
+    "reportes_horarios", _V1,
+    Column("dia", Date, primary_key=True),
+    Column("hora", Integer, primary_key=True),
+    Column("id_bano", String, primary_key=True),
+    Column("categoria", String, primary_key=True),
+    Column("total", Integer, nullable=False, server_default="0"),
+)
+Table(
+    "meta", _V1,
+    Column("clave", String, primary_key=True),
+    Column("valor", String),
+)
+Table(
+    "schema_version", _V1,
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("descripcion", String),
+    Column("aplicado_en", DateTime(timezone=True)),
+)
+
+
+def _m001_base() -> None:
+    _V1.create_all(bind=models.engine)
+    # BDs de schema.sql o de versiones sin estas columnas: create_all no
+    # altera tablas existentes ni crea sus índices nuevos
+    existentes = {c["name"] for c in inspect(models.engine).get_columns("reportes")}
+    with models.engine.begin() as conn:
+        for col in ("foto_thumb_url", "uuid_cliente"):
+            if col not in existentes:
+                tipo = _v1_reportes.c[col].type.compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE reportes ADD COLUMN {col} {tipo}"))
+        for idx in _v1_reportes.indexes:
+            idx.create(conn, checkfirst=True)
+    # Índice de texto del buscador; sin pg_trgm/FTS5 se busca con ILIKE
+    try:
+        with models.engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                conn.execute(text(
+                    "CREATE TABLE IF NOT EXISTS reportes_busqueda ("
+                    " reporte_id INTEGER PRIMARY KEY REFERENCES reportes(id) ON DELETE CASCADE,"
+                    " doc TEXT NOT NULL)"
+                ))
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS idx_reportes_busqueda_trgm"
+                    " ON reportes_busqueda USING gin (doc gin_trgm_ops)"
+                ))
+            else:
+                conn.execute(text(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS reportes_fts"
+                    " USING fts5(doc, tokenize='trigram')"
+                ))
+    except DBAPIError as e:
+        print(f"[migrate] índice de texto no disponible: {e}")
+
+
+def _m002_reportes_uuid() -> None:
+    # Con `reportes` ya particionada (Postgres) el índice único de uuid_cliente
+    # incluye creado_en; la unicidad del uuid pasa a una tabla sin particionar.
+    # Las BDs que se particionen después la reciben en particionar_reportes.
+    with models.engine.begin() as conn:
+        if conn.dialect.name != "postgresql":
+            return
+        particionada = conn.execute(text(
+            "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('reportes')"
+        )).scalar()
+        if not particionada:
+            return
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS reportes_uuid ("
+            " uuid_cliente VARCHAR PRIMARY KEY, reporte_id BIGINT NOT NULL)"
+        ))
+        conn.execute(text(
+            "INSERT INTO reportes_uuid (uuid_cliente, reporte_id)"
+            " SELECT uuid_cliente, min(id) FROM reportes WHERE uuid_cliente IS NOT NULL"
+            " GROUP BY uuid_cliente ON CONFLICT DO NOTHING"
+        ))
+
+
+MIGRACIONES: List[Tuple[int, str, Callable[[], None]]] = [
+    (1, "Esquema base: tablas, columnas e índices + índice de texto", _m001_base),
+    (2, "reportes_uuid: unicidad de uuid_cliente con reportes particionada", _m002_reportes_uuid),
+]
+SCHEMA_VERSION = MIGRACIONES[-1][0]
+
+
+BANOS_SEMILLA = [
+    # RH
+    ("RH-PB-H", "Baños RH – Planta Baja Hombres", "RH", "PB", "Hombres", True),
+    ("RH-PB-M", "Baños RH – Planta Baja Mujeres", "RH", "PB", "Mujeres", True),
+    ("RH-PA-H", "Baños RH – Planta Alta Hombres", "RH", "PA", "Hombres", True),
+    ("RH-PA-M", "Baños RH – Planta Alta Mujeres", "RH", "PA", "Mujeres", True),
+    # Planta 1
+    ("P1-ADM-H",  "Baños Planta 1 – Administrativos Hombres", "Planta 1", "1", "Hombres", True),
+    ("P1-ADM-M",  "Baños Planta 1 – Administrativos Mujeres", "Planta 1", "1", "Mujeres", True),
+    ("P1-PROD-H", "Baños Planta 1 – Producción Hombres",     "Planta 1", "1", "Hombres", True),
+    ("P1-PROD-M", "Baños Planta 1 – Producción Mujeres",     "Planta 1", "1", "Mujeres", True),
+    # Planta 2
+    ("P2-H", "Baños Planta 2 Hombres", "Planta 2", "2", "Hombres", True),
+    ("P2-M", "Baños Planta 2 Mujeres", "Planta 2", "2", "Mujeres", True),
+    # Planta 3
+    ("P3-H", "Baños Planta 3 Hombres", "Planta 3", "3", "Hombres", True),
+    ("P3-M", "Baños Planta 3 Mujeres", "Planta 3", "3", "Mujeres", True),
+]
+
+
+def version_esquema() -> int:
+    """Versión aplicada (0 si la tabla schema_version aún no existe). Una consulta."""
+    try:
+        with models.engine.connect() as conn:
+            return conn.execute(select(func.max(SchemaVersion.version))).scalar() or 0
+    except DBAPIError:
+        return 0
+
+
+def migrar() -> List[int]:
+    """
+    Aplica las migraciones pendientes en orden y deja listos rollups e
+    índice de texto. Devuelve las versiones aplicadas.
+    """
+    aplicadas = []
+    with models.engine.connect() as lock_conn:
+        es_pg = lock_conn.dialect.name == "postgresql"
+        if es_pg:
+            lock_conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": _LOCK_MIGRACIONES})
+        try:
+            actual = version_esquema()
+            for version, descripcion, fn in MIGRACIONES:
+                if version <= actual:
+                    continue
+                fn()
+                with SessionLocal() as s:
+                    s.add(SchemaVersion(
+                        version=version,
+                        descripcion=descripcion,
+                        aplicado_en=datetime.datetime.now(datetime.timezone.utc),
+                    ))
+                    s.commit()
+                aplicadas.append(version)
+            with SessionLocal() as s:
+                # Backfill del rollup (o si cambió ROLLUP_TZ) e índice de texto
+                models.asegurar_rollups(s)
+                models.asegurar_busqueda(s)
+                # Particiones mensuales (Postgres, opt-in) y las de los próximos meses
+                if models.REPORTES_PARTICIONADO:
+                    models.particionar_reportes(s)
+                models.asegurar_particiones(s)
+        finally:
+            if es_pg:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": _LOCK_MIGRACIONES})
+    return aplicadas
+
+
+def sembrar_banos(solo_si_vacia: bool = True) -> int:
+    """
+    Inserta los baños de BANOS_SEMILLA que falten (no toca los existentes).
+    Con solo_si_vacia (lo que corre en cada deploy) no hace nada si ya hay
+    baños, para no revivir los que se borraron a propósito.
+    """
+    with SessionLocal() as s:
+        existentes = set(s.scalars(select(Bano.id)))
+        if existentes and solo_si_vacia:
+            return 0
+        nuevos = 0
+        for id_, nombre, zona, piso, sexo, activo in BANOS_SEMILLA:
+            if id_ not in existentes:
+                s.add(Bano(id=id_, nombre=nombre, zona=zona, piso=piso, sexo=sexo, activo=bool(activo)))
+                nuevos += 1
+        if nuevos:
+            models.invalidar_banos(s)
+            s.commit()
+    return nuevos
@@ -5,16 +5,17 @@ Modelos y acceso a datos para el Sistema de Reportes de Baños.
 - Normaliza 'postgres://' a 'postgresql+psycopg2://'.
 - Expone helpers para uso sencillo desde los endpoints Flask.
 
+El esquema no se crea desde aquí: lo crean y actualizan las migraciones
+versionadas de migraciones.py con `python manage.py migrate` (una vez por
+deploy, antes de gunicorn). Al arrancar, la app solo compara la versión.
+
 Uso típico en app.py:
 
     from models import (
-        SessionLocal, init_db, Bano, Reporte,
-        get_banos, create_reporte, list_reportes, fetch_rows_for_kpis
+        SessionLocal, Bano, Reporte,
+        get_banos, create_reporte, list_reportes, kpis_resumen,
     )
 
-    # Crear tablas al arrancar si no existen
-    init_db()
-
     # Dentro de una vista:
     with SessionLocal() as s:
         banos = get_banos(s)  # lista de dicts
@@ -24,18 +25,34 @@ Uso típico en app.py:
 from __future__ import annotations
 import os
 import math
+import json
+import base64
+import hashlib
+import threading
+import time
 import datetime
-from typing import Dict, Any, List, Optional, Tuple
+import itertools
+import sqlite3
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional, Tuple
+from zoneinfo import ZoneInfo
 
 from sqlalchemy import (
-    create_engine, String, Integer, Boolean, DateTime, Text, ForeignKey,
-    func, select, Index
+    create_engine, String, Integer, BigInteger, Boolean, Date, DateTime, Text, ForeignKey,
+    Interval, func, select, case, literal, delete, text, type_coerce, or_, and_, event, Index,
+    table, column,
 )
 from sqlalchemy.engine import URL
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import (
     declarative_base, relationship, Mapped, mapped_column, sessionmaker, Session
 )
 
+import archivo
+from metricas import instrumentar_engine
+
 # ============== Normalización de URL de BD ===================
 
 def normalize_database_url(raw: Optional[str]) -> str:
@@ -60,15 +77,83 @@ DATABASE_URL = normalize_database_url(os.getenv("DATABASE_URL"))
 # Permite override local para desarrollo
 DATABASE_URL = normalize_database_url(os.getenv("DB_URL", DATABASE_URL))
 
+IS_SQLITE = DATABASE_URL.startswith("sqlite:")
+# Réplica de solo lectura opcional para endpoints de consulta
+DATABASE_READ_URL = normalize_database_url(os.getenv("DATABASE_READ_URL")) if os.getenv("DATABASE_READ_URL") else None
+
 # Engine y Session configurados para ambos motores
-engine_kwargs: Dict[str, Any] = dict(pool_pre_ping=True, future=True)
+# DB_PRE_PING=0 evita el ping por checkout; en ese caso conviene DB_POOL_RECYCLE
+# (segundos) menor al idle timeout del servidor/proxy para no usar conexiones muertas.
+engine_kwargs: Dict[str, Any] = dict(
+    pool_pre_ping=os.getenv("DB_PRE_PING", "1") not in ("0", "false", "no"),
+    future=True,
+)
 
 # SQLite necesita connect_args especiales
-if DATABASE_URL.startswith("sqlite:"):
+if IS_SQLITE:
     engine_kwargs["connect_args"] = {"check_same_thread": False}
+else:
+    engine_kwargs.update(
+        pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "-1")),
+    )
 
 engine = create_engine(DATABASE_URL, **engine_kwargs)
+engine_lectura = create_engine(DATABASE_READ_URL, **engine_kwargs) if DATABASE_READ_URL else engine
+
+# statement_timeout (ms) para sesiones de lectura en Postgres; 0 = sin límite
+DB_READ_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_READ_STATEMENT_TIMEOUT_MS", "0"))
+
+# ---- SQLite en producción (SQLITE_MODO=produccion) ----
+# WAL deja leer mientras otro escribe; busy_timeout espera el lock en vez de
+# fallar con "database is locked"; synchronous=NORMAL es seguro con WAL.
+SQLITE_MODO = os.getenv("SQLITE_MODO", "").strip().lower()
+SQLITE_PRAGMAS: Dict[str, str] = {
+    "journal_mode": "WAL",
+    "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": str(int(os.getenv("SQLITE_MMAP_MB", "128")) * 1024 * 1024),
+    "cache_size": str(-int(os.getenv("SQLITE_CACHE_MB", "32")) * 1024),  # negativo = KiB
+    "temp_store": "MEMORY",
+}
+SQLITE_MANTENIMIENTO_S = float(os.getenv("SQLITE_MANTENIMIENTO_S", "300"))
+
+if IS_SQLITE and SQLITE_MODO in ("produccion", "prod"):
+    @event.listens_for(engine, "connect")
+    def _pragmas_sqlite(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        try:
+            for nombre, valor in SQLITE_PRAGMAS.items():
+                cur.execute(f"PRAGMA {nombre} = {valor}")
+        finally:
+            cur.close()
+
+# Conteo/duración de consultas y espera del pool para /api/metrics
+instrumentar_engine(engine)
+if engine_lectura is not engine:
+    instrumentar_engine(engine_lectura)
+
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False, future=True)
+SessionLectura = sessionmaker(bind=engine_lectura, autoflush=False, autocommit=False, expire_on_commit=False, future=True)
+
+
+@contextmanager
+def sesion_lectura(timeout_ms: Optional[int] = None) -> Iterator[Session]:
+    """
+    Sesión para endpoints de solo lectura: usa la réplica si hay
+    DATABASE_READ_URL y, en Postgres, fija statement_timeout para la
+    transacción (set_config(..., true) equivale a SET LOCAL).
+    """
+    timeout_ms = DB_READ_STATEMENT_TIMEOUT_MS if timeout_ms is None else timeout_ms
+    with SessionLectura() as s:
+        if timeout_ms > 0 and s.get_bind().dialect.name == "postgresql":
+            s.execute(
+                text("SELECT set_config('statement_timeout', :v, true)"),
+                {"v": f"{int(timeout_ms)}ms"},
+            )
+        yield s
 
 Base = declarative_base()
 
@@ -105,12 +190,15 @@ class Reporte(Base):
     categoria: Mapped[str] = mapped_column(String, nullable=False)
     comentario: Mapped[Optional[str]] = mapped_column(Text)
     foto_url: Mapped[Optional[str]] = mapped_column(String)
+    foto_thumb_url: Mapped[Optional[str]] = mapped_column(String)
     origen: Mapped[str] = mapped_column(String, default="qr", server_default="qr")
     # Importante: usa timezone-aware en Postgres; en SQLite se guarda naive
     creado_en: Mapped[datetime.datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), index=True
     )
     creado_por_ip: Mapped[Optional[str]] = mapped_column(String)
+    # UUID generado por el kiosko/QR (cola offline): hace idempotente el reenvío
+    uuid_cliente: Mapped[Optional[str]] = mapped_column(String)
     # La columna 'estado' existe en el schema, pero no la usamos para KPIs
     estado: Mapped[Optional[str]] = mapped_column(String, default="abierto", server_default="abierto")
 
@@ -124,6 +212,7 @@ class Reporte(Base):
             "categoria": self.categoria,
             "comentario": self.comentario,
             "foto_url": self.foto_url,
+            "foto_thumb_url": self.foto_thumb_url,
             "origen": self.origen,
             "creado_en": self.creado_en.isoformat() if isinstance(self.creado_en, datetime.datetime) else self.creado_en,
             "creado_por_ip": self.creado_por_ip,
@@ -139,27 +228,349 @@ class Reporte(Base):
         return d
 
 
+class ReporteDiario(Base):
+    """
+    Rollup de reportes por día local (zona ROLLUP_TZ), baño y categoría.
+    Se mantiene en create_reporte (misma transacción) y se reconstruye con
+    `python manage.py rollups`.
+    """
+    __tablename__ = "reportes_diarios"
+
+    dia: Mapped[datetime.date] = mapped_column(Date, primary_key=True)
+    id_bano: Mapped[str] = mapped_column(String, primary_key=True)
+    categoria: Mapped[str] = mapped_column(String, primary_key=True)
+    total: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+
+
+class ReporteHorario(Base):
+    """
+    Rollup por día y hora local (ROLLUP_TZ), baño y categoría: base del
+    heatmap hora × día de la semana. Se mantiene junto con reportes_diarios.
+    """
+    __tablename__ = "reportes_horarios"
+
+    dia: Mapped[datetime.date] = mapped_column(Date, primary_key=True)
+    hora: Mapped[int] = mapped_column(Integer, primary_key=True)
+    id_bano: Mapped[str] = mapped_column(String, primary_key=True)
+    categoria: Mapped[str] = mapped_column(String, primary_key=True)
+    total: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+
+
+class Meta(Base):
+    """Pares clave/valor internos (estado de rollups, versiones, etc.)."""
+    __tablename__ = "meta"
+
+    clave: Mapped[str] = mapped_column(String, primary_key=True)
+    valor: Mapped[Optional[str]] = mapped_column(String)
+
+
+class SchemaVersion(Base):
+    """Migraciones aplicadas (migraciones.py); una fila por versión."""
+    __tablename__ = "schema_version"
+
+    version: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    descripcion: Mapped[Optional[str]] = mapped_column(String)
+    aplicado_en: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime(timezone=True))
+
+
 # Índices adicionales (equivalentes a schema.sql)
 Index("idx_reportes_bano_fecha", Reporte.id_bano, Reporte.creado_en.desc())
+Index("idx_reportes_fecha_id", Reporte.creado_en.desc(), Reporte.id.desc())
 Index("idx_reportes_categoria", Reporte.categoria)
 Index("idx_reportes_estado", Reporte.estado)
+Index("idx_reportes_uuid_cliente", Reporte.uuid_cliente, unique=True)
 
 # =================== Utilidades =============================
 
-def init_db() -> None:
-    """Crea tablas si no existen (útil para el primer deploy en Render)."""
-    Base.metadata.create_all(bind=engine)
+def mantenimiento_sqlite() -> None:
+    """Checkpoint pasivo del WAL + PRAGMA optimize (no bloquea lectores)."""
+    if not IS_SQLITE:
+        return
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(PASSIVE)")
+        conn.exec_driver_sql("PRAGMA optimize")
+
+
+_hilo_mantenimiento: Optional[threading.Thread] = None
+
+
+def iniciar_mantenimiento_sqlite() -> None:
+    """Lanza (una vez por proceso) el hilo de mantenimiento en modo producción."""
+    global _hilo_mantenimiento
+    if not IS_SQLITE or SQLITE_MODO not in ("produccion", "prod") or SQLITE_MANTENIMIENTO_S <= 0:
+        return
+    if _hilo_mantenimiento is not None:
+        return
+
+    def loop():
+        while True:
+            time.sleep(SQLITE_MANTENIMIENTO_S)
+            try:
+                mantenimiento_sqlite()
+            except Exception as e:
+                print(f"[sqlite] mantenimiento falló: {e}")
+
+    _hilo_mantenimiento = threading.Thread(target=loop, name="sqlite-mantenimiento", daemon=True)
+    _hilo_mantenimiento.start()
+
+
+def get_meta(s: Session, clave: str) -> Optional[str]:
+    return s.scalar(select(Meta.valor).where(Meta.clave == clave))
+
+
+def set_meta(s: Session, clave: str, valor: Optional[str]) -> None:
+    """Upsert de una clave en `meta` (no hace commit)."""
+    m = s.get(Meta, clave)
+    if m is None:
+        s.add(Meta(clave=clave, valor=valor))
+    else:
+        m.valor = valor
+    s.flush()
 
 
 # =================== Helpers de consulta ====================
 
+def rango_utc(
+    desde: Optional[str],
+    hasta: Optional[str],
+    tzinfo: datetime.tzinfo = datetime.timezone.utc,
+) -> Tuple[Optional[datetime.datetime], Optional[datetime.datetime]]:
+    """
+    Convierte días locales 'YYYY-MM-DD' (inclusive) en el rango semiabierto
+    [inicio_utc, fin_utc): medianoche local de `desde` y del día siguiente a `hasta`.
+    """
+    utc = datetime.timezone.utc
+    inicio = fin = None
+    if desde:
+        d = datetime.date.fromisoformat(desde)
+        inicio = datetime.datetime.combine(d, datetime.time(), tzinfo).astimezone(utc)
+    if hasta:
+        d = datetime.date.fromisoformat(hasta) + datetime.timedelta(days=1)
+        fin = datetime.datetime.combine(d, datetime.time(), tzinfo).astimezone(utc)
+    return inicio, fin
+
+
+def filtrar_reportes(
+    q,
+    *,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    zona: Optional[str] = None,
+    id_bano: Optional[str] = None,
+    tzinfo: datetime.tzinfo = datetime.timezone.utc,
+):
+    """
+    Filtros comunes de reportes (q debe incluir el join con Bano si hay `zona`).
+    Las fechas se comparan contra creado_en directo (creado_en >= inicio AND
+    creado_en < fin) para que la BD pueda usar los índices por fecha.
+    """
+    inicio, fin = rango_utc(desde, hasta, tzinfo)
+    if inicio is not None:
+        q = q.where(Reporte.creado_en >= _bind_ts(inicio))
+    if fin is not None:
+        q = q.where(Reporte.creado_en < _bind_ts(fin))
+    if zona:
+        q = q.where(Bano.zona == zona)
+    if id_bano:
+        q = q.where(Reporte.id_bano == id_bano)
+    return q
+
+
+# Catálogo de baños en memoria. Es pequeño y casi no cambia: se recarga
+# solo si cambia meta.banos_version (se revisa como máximo cada TTL
+# segundos) o si se invalida explícitamente en este proceso.
+BANOS_CACHE_TTL = float(os.getenv("BANOS_CACHE_TTL", "30"))
+
+
+class CatalogoBanos:
+    def __init__(self, ttl: float = BANOS_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._revisado: Optional[float] = None   # monotonic de la última revisión
+        self.version: Optional[str] = None       # meta.banos_version cargada
+        self.todos: List[Dict[str, Any]] = []
+        self.activos: List[Dict[str, Any]] = []
+        self.por_id: Dict[str, Dict[str, Any]] = {}
+        self.etag = ""
+
+    def _cargar(self, s: Session, version: Optional[str]) -> None:
+        q = select(Bano).order_by(Bano.zona.nulls_last(), Bano.piso.nulls_last(), Bano.nombre)
+        todos = [b.to_dict() for b in s.scalars(q).all()]
+        self.todos = todos
+        self.activos = [b for b in todos if b["activo"]]
+        self.por_id = {b["id"]: b for b in todos}
+        self.etag = hashlib.sha1(json.dumps(todos, sort_keys=True).encode()).hexdigest()[:16]
+        self.version = version
+
+    def obtener(self, s: Session) -> "CatalogoBanos":
+        """Devuelve el catálogo vigente; a lo sumo 1 consulta por TTL (2 si cambió)."""
+        ahora = time.monotonic()
+        if self._revisado is not None and ahora - self._revisado < self.ttl:
+            return self
+        with self._lock:
+            if self._revisado is None or ahora - self._revisado >= self.ttl:
+                version = get_meta(s, "banos_version") or "0"
+                if self._revisado is None or version != self.version:
+                    self._cargar(s, version)
+                self._revisado = ahora
+        return self
+
+    def invalidar(self) -> None:
+        """Fuerza recarga en la siguiente lectura (solo este proceso)."""
+        with self._lock:
+            self._revisado = None
+
+
+catalogo_banos = CatalogoBanos()
+
+
+def invalidar_banos(s: Session) -> None:
+    """
+    Llamar tras modificar `banos`: incrementa meta.banos_version (los demás
+    workers recargan al vencer su TTL) e invalida la caché local. No hace commit.
+    """
+    actual = int(get_meta(s, "banos_version") or 0)
+    set_meta(s, "banos_version", str(actual + 1))
+    catalogo_banos.invalidar()
+
+
 def get_banos(s: Session, solo_activos: bool = True) -> List[Dict[str, Any]]:
-    q = select(Bano)
-    if solo_activos:
-        q = q.where(Bano.activo.is_(True))
-    # Orden sugerido: zona, piso, nombre
-    q = q.order_by(Bano.zona.nulls_last(), Bano.piso.nulls_last(), Bano.nombre)
-    return [b.to_dict() for b in s.scalars(q).all()]
+    """Catálogo ordenado por zona, piso, nombre (desde caché; no mutar los dicts)."""
+    cat = catalogo_banos.obtener(s)
+    return cat.activos if solo_activos else cat.todos
+
+
+def get_bano(s: Session, id_bano: str) -> Optional[Dict[str, Any]]:
+    return catalogo_banos.obtener(s).por_id.get(id_bano)
+
+
+def marca_agua(s: Session) -> Tuple[str, Optional[datetime.datetime]]:
+    """
+    Marca barata de "¿cambió algo?" para cachés de respuestas: último id,
+    número de reportes y último creado_en (por índice) + etag del catálogo.
+    El conteo cubre lo que el máximo no ve: un commit tardío con id menor
+    (transacciones concurrentes, group commit) y los borrados del archivo.
+    Devuelve (marca, ultimo_creado_en_utc).
+    """
+    # Subconsultas escalares por separado: juntos en un SELECT, SQLite no usa
+    # el atajo de max() por índice y recorre la tabla
+    max_id, total, ultimo = s.execute(select(
+        select(func.max(Reporte.id)).scalar_subquery(),
+        select(func.count()).select_from(Reporte).scalar_subquery(),
+        select(func.max(Reporte.creado_en)).scalar_subquery(),
+    )).one()
+    if isinstance(ultimo, datetime.datetime) and ultimo.tzinfo is None:
+        ultimo = ultimo.replace(tzinfo=datetime.timezone.utc)
+    cat = catalogo_banos.obtener(s)
+    return f"{max_id or 0}:{total}:{cat.etag}", ultimo
+
+
+def reportes_desde(
+    s: Session, id_desde: int, limite: int = 200, huecos: Iterable[int] = ()
+) -> List[Dict[str, Any]]:
+    """
+    Reportes con id > id_desde, más los ids de `huecos` (menores que id_desde
+    y aún no vistos), en orden de id (para el stream en vivo).
+    Solo columnas ligeras + zona del catálogo en caché.
+    """
+    huecos = list(huecos)
+    cond = Reporte.id > id_desde
+    if huecos:
+        cond = or_(cond, Reporte.id.in_(huecos))
+    q = (
+        select(Reporte.id, Reporte.id_bano, Reporte.categoria, Reporte.creado_en)
+        .where(cond)
+        .order_by(Reporte.id)
+        .limit(limite)
+    )
+    cat = catalogo_banos.obtener(s)
+    out = []
+    for id_, id_b, categoria, creado_en in s.execute(q):
+        if isinstance(creado_en, datetime.datetime) and creado_en.tzinfo is None:
+            creado_en = creado_en.replace(tzinfo=datetime.timezone.utc)
+        b = cat.por_id.get(id_b, {})
+        out.append({
+            "id": id_,
+            "id_bano": id_b,
+            "nombre_bano": b.get("nombre", id_b),
+            "zona": b.get("zona"),
+            "categoria": categoria,
+            "creado_en": creado_en,
+        })
+    return out
+
+
+def ultimo_reporte_id(s: Session) -> int:
+    return int(s.scalar(select(func.max(Reporte.id))) or 0)
+
+
+def validar_bano(s: Session, id_bano: str) -> Dict[str, Any]:
+    """Baño activo del catálogo en caché (sin consulta) o ValueError."""
+    b = get_bano(s, id_bano)
+    if not b or not b["activo"]:
+        raise ValueError("Baño inválido o inactivo")
+    return b
+
+
+def insertar_reportes(s: Session, filas: List[Dict[str, Any]]) -> List[int]:
+    """
+    Inserta reportes ya validados con INSERT ... RETURNING id (sin SELECT de
+    refresh) y actualiza rollup e índice de texto. No hace commit: permite
+    agrupar varias filas en una transacción (ver escritura.py).
+    Cada fila: id_bano, categoria y opcionales comentario, foto_url,
+    foto_thumb_url, origen, creado_por_ip.
+    """
+    if not filas:
+        return []
+    ahora = datetime.datetime.now(datetime.timezone.utc)
+    valores = [
+        {
+            "comentario": None,
+            "foto_url": None,
+            "foto_thumb_url": None,
+            "origen": "qr",
+            "creado_por_ip": None,
+            "uuid_cliente": None,
+            # Se fija en Python (UTC) para poder acumular el rollup por día local
+            "creado_en": ahora,
+            "estado": "abierto",
+            **f,
+        }
+        for f in filas
+    ]
+    stmt = Reporte.__table__.insert().returning(Reporte.id, sort_by_parameter_order=True)
+    ids = list(s.scalars(stmt, valores))
+    if _usa_reportes_uuid(s):
+        # Con `reportes` particionada la unicidad del uuid vive aquí: un uuid
+        # repetido falla con IntegrityError igual que con el índice único
+        con_uuid = [{"u": v["uuid_cliente"], "i": i} for i, v in zip(ids, valores) if v["uuid_cliente"]]
+        if con_uuid:
+            s.execute(text("INSERT INTO reportes_uuid (uuid_cliente, reporte_id) VALUES (:u, :i)"), con_uuid)
+
+    acumular_rollups(s, [(v["id_bano"], v["categoria"], v["creado_en"]) for v in valores])
+    cat = catalogo_banos.obtener(s)
+    indexar_busqueda(s, [
+        (i, _doc_busqueda(v["categoria"], v["comentario"], cat.por_id.get(v["id_bano"], {})))
+        for i, v in zip(ids, valores)
+    ])
+    return ids
+
+
+def ids_por_uuid(s: Session, uuids: List[str]) -> Dict[str, int]:
+    """uuid_cliente -> id de los reportes que ya existen (por índice único o reportes_uuid)."""
+    if not uuids:
+        return {}
+    if _usa_reportes_uuid(s):
+        t = table("reportes_uuid", column("uuid_cliente"), column("reporte_id"))
+        q = select(t.c.uuid_cliente, t.c.reporte_id).where(t.c.uuid_cliente.in_(uuids))
+    else:
+        q = select(Reporte.uuid_cliente, Reporte.id).where(Reporte.uuid_cliente.in_(uuids))
+    return dict(s.execute(q).all())
+
+
+def reporte_por_uuid(s: Session, uuid_cliente: str) -> Optional[int]:
+    """Id del reporte con ese uuid_cliente / Idempotency-Key."""
+    return ids_por_uuid(s, [uuid_cliente]).get(uuid_cliente)
 
 
 def create_reporte(
@@ -169,26 +580,248 @@ def create_reporte(
     categoria: str,
     comentario: Optional[str] = None,
     foto_url: Optional[str] = None,
+    foto_thumb_url: Optional[str] = None,
     origen: str = "qr",
     creado_por_ip: Optional[str] = None,
+    uuid_cliente: Optional[str] = None,
+    creado_en: Optional[datetime.datetime] = None,
 ) -> int:
-    # Validación básica de baño activo
-    b = s.get(Bano, id_bano)
-    if not b or not b.activo:
-        raise ValueError("Baño inválido o inactivo")
+    # Validación básica de baño activo (catálogo en caché, sin consulta)
+    validar_bano(s, id_bano)
 
-    rep = Reporte(
+    fila = dict(
         id_bano=id_bano,
         categoria=categoria,
         comentario=comentario,
         foto_url=foto_url,
+        foto_thumb_url=foto_thumb_url,
         origen=origen,
         creado_por_ip=creado_por_ip,
+        uuid_cliente=uuid_cliente,
     )
-    s.add(rep)
+    if creado_en is not None:
+        fila["creado_en"] = creado_en   # si no, la hora de inserción
+    [rep_id] = insertar_reportes(s, [fila])
     s.commit()
-    s.refresh(rep)
-    return rep.id
+    return rep_id
+
+
+# Reportes que llegan tarde desde la cola offline conservan su hora si no
+# son más viejos que esto (si no, se usa la hora de llegada)
+BULK_MAX_DIAS = int(os.getenv("BULK_MAX_DIAS", "7"))
+ORIGENES_CLIENTE = ("qr", "kiosko")
+
+
+def creado_cliente(valor: Any, ahora: datetime.datetime) -> datetime.datetime:
+    """Hora de creación que manda el dispositivo (UTC), o `ahora` si falta o no es creíble."""
+    try:
+        dt = datetime.datetime.fromisoformat(str(valor).replace("Z", "+00:00"))
+    except (TypeError, ValueError):
+        return ahora
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    dt = dt.astimezone(datetime.timezone.utc)
+    if dt > ahora + datetime.timedelta(minutes=5) or dt < ahora - datetime.timedelta(days=BULK_MAX_DIAS):
+        return ahora
+    return dt
+
+
+def insertar_lote_cliente(
+    s: Session,
+    items: List[Dict[str, Any]],
+    *,
+    creado_por_ip: Optional[str] = None,
+    recientes: Any = None,
+    admitir: Optional[Callable[[List[str]], List[float]]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Inserta en una transacción reportes generados en el dispositivo, cada uno
+    con su `uuid`. Un uuid ya guardado devuelve el id original (reenviar es
+    seguro). Los items inválidos se reportan sin abortar el lote.
+
+    `recientes` (idempotencia.recientes) aplica la ventana de doble toque por
+    (id_bano, categoria, IP), como en POST /api/reportes: dentro del lote se
+    comparan los creado_en del dispositivo (un lote offline no se colapsa
+    por llegar junto) y contra envíos anteriores solo los items recientes.
+
+    `admitir` (control de admisión) recibe los id_bano de los reportes que sí
+    se van a insertar, ya sin uuids guardados ni dobles toques, y devuelve
+    por cada uno 0 o los segundos de espera; los frenados no se insertan y
+    vuelven con {uuid, ok: False, reintentar: True, reintentar_en_s, error}.
+    Devuelve, en el orden recibido: {uuid, ok, reporte_id, duplicado} o
+    {uuid, ok: False, error}. Hace commit.
+    """
+    ahora = datetime.datetime.now(datetime.timezone.utc)
+    ventana = (
+        datetime.timedelta(seconds=recientes.ttl)
+        if recientes is not None and recientes.ttl > 0 else None
+    )
+    resultados: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    filas: Dict[str, Dict[str, Any]] = {}
+    posiciones: Dict[str, List[int]] = {}
+    for i, it in enumerate(items):
+        crudo = (it or {}).get("uuid") if isinstance(it, dict) else None
+        try:
+            u = str(uuid.UUID(str(crudo)))
+        except ValueError:
+            resultados[i] = {"uuid": crudo, "ok": False, "error": "uuid inválido"}
+            continue
+        if u in filas:
+            posiciones[u].append(i)
+            continue
+        id_bano = str(it.get("id_bano") or "").strip()
+        categoria = str(it.get("categoria") or "").strip()
+        if not id_bano or not categoria:
+            resultados[i] = {"uuid": u, "ok": False, "error": "Faltan campos"}
+            continue
+        try:
+            validar_bano(s, id_bano)
+        except ValueError as e:
+            resultados[i] = {"uuid": u, "ok": False, "error": str(e)}
+            continue
+        origen = it.get("origen") if it.get("origen") in ORIGENES_CLIENTE else "qr"
+        filas[u] = dict(
+            id_bano=id_bano,
+            categoria=categoria,
+            comentario=(str(it.get("comentario") or "").strip() or None),
+            origen=origen,
+            creado_por_ip=creado_por_ip,
+            creado_en=creado_cliente(it.get("creado_en"), ahora),
+            uuid_cliente=u,
+        )
+        posiciones[u] = [i]
+
+    def existentes() -> Dict[str, int]:
+        return ids_por_uuid(s, list(filas))
+
+    def firma(f: Dict[str, Any]) -> Tuple[str, str, Optional[str]]:
+        return (f["id_bano"], f["categoria"], creado_por_ip)
+
+    def casi_duplicados(previos: Dict[str, int]) -> Dict[str, Any]:
+        """uuid nuevo -> uuid del lote o reporte_id anterior del que es doble toque."""
+        if ventana is None:
+            return {}
+        alias: Dict[str, Any] = {}
+        ultimo: Dict[Tuple, Tuple[datetime.datetime, str]] = {}   # firma -> el que cuenta
+        for u, f in filas.items():
+            previo = ultimo.get(firma(f))
+            if u not in previos:
+                if previo and abs(f["creado_en"] - previo[0]) <= ventana:
+                    alias[u] = previo[1]
+                    continue
+                if f["creado_en"] >= ahora - ventana:
+                    rep_id = recientes.buscar(firma(f))
+                    if rep_id is not None:
+                        alias[u] = rep_id
+                        continue
+            ultimo[firma(f)] = (f["creado_en"], u)
+        return alias
+
+    frenados: Dict[str, float] = {}
+    cobrado = False
+    for intento in range(2):
+        previos = existentes()
+        alias = casi_duplicados(previos)
+        nuevos = [u for u in filas if u not in previos and u not in alias]
+        if admitir is not None and not cobrado:
+            # Una sola vez: el reintento por IntegrityError no vuelve a cobrar
+            esperas = admitir([filas[u]["id_bano"] for u in nuevos]) if nuevos else []
+            frenados = {u: e for u, e in zip(nuevos, esperas) if e}
+            cobrado = True
+        # Doble toque de uno frenado: también espera (no hay id al cual apuntar)
+        for u, a in list(alias.items()):
+            if a in frenados:
+                frenados[u] = frenados[a]
+                del alias[u]
+        nuevos = [u for u in nuevos if u not in frenados]
+        try:
+            ids = insertar_reportes(s, [filas[u] for u in nuevos])
+            s.commit()
+            break
+        except IntegrityError:
+            # Otro envío del mismo uuid ganó la carrera: se vuelve a consultar
+            s.rollback()
+            if intento:
+                raise
+
+    id_de = {**previos, **dict(zip(nuevos, ids))}
+    for u, rep_id in id_de.items():
+        for n, i in enumerate(posiciones[u]):
+            resultados[i] = {"uuid": u, "ok": True, "reporte_id": rep_id, "duplicado": n > 0 or u in previos}
+    for u, a in alias.items():
+        for i in posiciones[u]:
+            resultados[i] = {"uuid": u, "ok": True, "reporte_id": id_de.get(a, a), "duplicado": True}
+    for u, espera in frenados.items():
+        for i in posiciones[u]:
+            resultados[i] = {
+                "uuid": u, "ok": False, "reintentar": True, "reintentar_en_s": round(espera, 1),
+                "error": "Demasiados reportes para este baño, se reintentará",
+            }
+    if ventana is not None:
+        for u, rep_id in zip(nuevos, ids):
+            if filas[u]["creado_en"] >= ahora - ventana:
+                recientes.guardar(firma(filas[u]), rep_id)
+    return resultados
+
+
+# Columnas de cada item de list_reportes (fields= elige un subconjunto).
+# Se leen como filas Core con el join explícito: sin objetos ORM ni carga
+# perezosa de Reporte.bano por fila.
+COLUMNAS_LISTA = {
+    "id": Reporte.id,
+    "id_bano": Reporte.id_bano,
+    "categoria": Reporte.categoria,
+    "comentario": Reporte.comentario,
+    "foto_url": Reporte.foto_url,
+    "foto_thumb_url": Reporte.foto_thumb_url,
+    "origen": Reporte.origen,
+    "creado_en": Reporte.creado_en,
+    "creado_por_ip": Reporte.creado_por_ip,
+    "estado": Reporte.estado,
+    "nombre_bano": Bano.nombre,
+    "zona": Bano.zona,
+    "piso": Bano.piso,
+    "sexo": Bano.sexo,
+}
+CAMPOS_LISTA = list(COLUMNAS_LISTA) + ["creado_local"]
+
+
+def _campos_lista(campos: Optional[Iterable[str]]) -> List[str]:
+    """Campos pedidos (en su orden, sin repetir) o todos; ValueError si hay desconocidos."""
+    if not campos:
+        return CAMPOS_LISTA
+    campos = list(dict.fromkeys(campos))
+    desconocidos = [c for c in campos if c not in CAMPOS_LISTA]
+    if desconocidos:
+        raise ValueError(f"Campos desconocidos: {', '.join(desconocidos)}")
+    return campos
+
+
+def _select_lista(campos: List[str]):
+    # id y creado_en siempre: los usan el orden y el cursor
+    nombres = dict.fromkeys(["id", "creado_en", *(c for c in campos if c in COLUMNAS_LISTA)])
+    return select(*(COLUMNAS_LISTA[c].label(c) for c in nombres)).select_from(Reporte).join(
+        Bano, Bano.id == Reporte.id_bano
+    )
+
+
+def _fila_lista(m, campos: List[str], tzinfo: datetime.tzinfo) -> Dict[str, Any]:
+    """
+    Item de list_reportes desde una fila (mapping). creado_en queda como lo
+    da la BD en ISO (naive = UTC en SQLite) y creado_local en `tzinfo`.
+    """
+    d = {c: m[c] for c in campos if c != "creado_local"}
+    creado = m["creado_en"]
+    if isinstance(creado, datetime.datetime):
+        if "creado_en" in d:
+            d["creado_en"] = creado.isoformat()
+        if "creado_local" in campos:
+            if creado.tzinfo is None:
+                creado = creado.replace(tzinfo=datetime.timezone.utc)
+            d["creado_local"] = creado.astimezone(tzinfo).isoformat()
+    elif "creado_local" in campos:
+        d["creado_local"] = creado
+    return d
 
 
 def list_reportes(
@@ -201,26 +834,79 @@ def list_reportes(
     search: Optional[str] = None,
     page: int = 1,
     per_page: int = 10,
+    cursor: Optional[str] = None,
+    total_modo: Optional[str] = None,  # 'exact' | 'estimate' | 'none'
+    campos: Optional[Iterable[str]] = None,  # subconjunto de CAMPOS_LISTA
+    tzinfo: datetime.tzinfo = datetime.timezone.utc,
 ) -> Dict[str, Any]:
     """
     Devuelve un dict con paginación: {page, per_page, total, pages, items}
-    items incluye datos del baño (join).
+    items incluye datos del baño (join) y creado_local en `tzinfo`; con
+    `campos`, solo esas llaves.
+
+    Modo cursor (opt-in, `cursor` no es None; "" = primera página): busca por
+    (creado_en, id) < cursor en vez de OFFSET, así la página N cuesta lo mismo
+    que la 1. Devuelve {per_page, total, total_exacto, next_cursor, items}; el
+    total por defecto es estimado desde el rollup ('exact' fuerza el COUNT).
+
+    Si el rango llega a los reportes archivados (ver archivar_reportes), van
+    después de los de la BD: todos son anteriores a archivo_corte.
     """
+    campos = _campos_lista(campos)
     # Base
-    q = select(Reporte).join(Bano).where(Bano.id == Reporte.id_bano)
+    q = _select_lista(campos)
     # Filtros
-    if desde:
-        # cast a date usando la parte de fecha del timestamp
-        q = q.where(func.date(Reporte.creado_en) >= desde)
-    if hasta:
-        q = q.where(func.date(Reporte.creado_en) <= hasta)
-    if zona:
-        q = q.where(Bano.zona == zona)
-    if id_bano:
-        q = q.where(Reporte.id_bano == id_bano)
+    q = filtrar_reportes(q, desde=desde, hasta=hasta, zona=zona, id_bano=id_bano, tzinfo=tzinfo)
+    q = _filtrar_busqueda(s, q, search)
+    archivados = _meses_archivo(
+        s, desde=desde, hasta=hasta, zona=zona, id_bano=id_bano, search=search, tzinfo=tzinfo
+    )
+
+    if cursor is not None:
+        return _list_reportes_cursor(
+            s, q, cursor=cursor, per_page=per_page, total_modo=total_modo or "estimate",
+            desde=desde, hasta=hasta, zona=zona, id_bano=id_bano, search=search,
+            archivados=archivados, campos=campos, tzinfo=tzinfo,
+        )
+
+    # Total
+    total_bd = int(s.scalar(select(func.count()).select_from(q.subquery())) or 0)
+    total = total_bd + sum(m.total() for m in archivados)
+    pages = max(1, math.ceil(total / per_page)) if total else 1
+    page = max(1, min(page, pages))
+    offset = (page - 1) * per_page
+
+    # Página de resultados (más recientes primero)
+    items = []
+    if offset < total_bd:
+        q_page = (
+            q.order_by(Reporte.creado_en.desc(), Reporte.id.desc())
+             .offset(offset)
+             .limit(per_page)
+        )
+        items = [_fila_lista(m, campos, tzinfo) for m in s.execute(q_page).mappings()]
+    if archivados and len(items) < per_page:
+        items.extend(
+            _fila_lista(_fila_archivada(f, b), campos, tzinfo)
+            for f, b in _pagina_archivo(archivados, max(0, offset - total_bd), per_page - len(items))
+        )
+
+    return {
+        "page": page,
+        "per_page": per_page,
+        "total": int(total or 0),
+        "pages": pages,
+        "items": items,
+    }
+
+
+def _filtrar_busqueda(s: Session, q, search: Optional[str]):
+    """Filtro del buscador "q": índice de texto si está listo, si no ILIKE."""
+    if search and busqueda_disponible(s) and len(search) >= 3:
+        return q.where(Reporte.id.in_(_q_busqueda(s, search)))
     if search:
         like = f"%{search}%"
-        q = q.where(
+        return q.where(
             (Reporte.categoria.ilike(like)) |
             (Reporte.comentario.ilike(like)) |
             (Bano.nombre.ilike(like)) |
@@ -228,33 +914,225 @@ def list_reportes(
             (Bano.zona.ilike(like)) |
             (Bano.piso.ilike(like))
         )
+    return q
 
-    # Total
-    total = s.scalar(select(func.count()).select_from(q.subquery()))
-    pages = max(1, math.ceil(total / per_page)) if total else 1
-    page = max(1, min(page, pages))
-    offset = (page - 1) * per_page
 
-    # Página de resultados (más recientes primero)
-    q_page = (
-        q.order_by(Reporte.creado_en.desc())
-         .offset(offset)
-         .limit(per_page)
+# Columnas de la exportación (orden de CSV)
+COLUMNAS_EXPORT = [
+    "id", "creado_en", "creado_local", "id_bano", "nombre_bano", "zona", "piso", "sexo",
+    "categoria", "comentario", "foto_url", "origen", "estado", "creado_por_ip",
+]
+
+
+def iter_reportes(
+    s: Session,
+    *,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    zona: Optional[str] = None,
+    id_bano: Optional[str] = None,
+    search: Optional[str] = None,
+    tzinfo: datetime.tzinfo = datetime.timezone.utc,
+    lote: int = 1000,
+) -> Iterable[Dict[str, Any]]:
+    """
+    Recorre TODOS los reportes que cumplen los filtros de list_reportes (más
+    recientes primero) sin cargarlos en memoria: columnas explícitas (sin
+    objetos ORM) y cursor del servidor con yield_per/stream_results.
+    Devuelve un iterador de dicts con COLUMNAS_EXPORT. Los filtros se validan
+    y el cursor se abre al llamarla, no al iterar: un ValueError sale antes
+    de que el endpoint mande las cabeceras.
+    """
+    q = select(
+        Reporte.id, Reporte.creado_en, Reporte.id_bano, Bano.nombre, Bano.zona, Bano.piso,
+        Bano.sexo, Reporte.categoria, Reporte.comentario, Reporte.foto_url, Reporte.origen,
+        Reporte.estado, Reporte.creado_por_ip,
+    ).join(Bano)
+    q = filtrar_reportes(q, desde=desde, hasta=hasta, zona=zona, id_bano=id_bano, tzinfo=tzinfo)
+    q = _filtrar_busqueda(s, q, search)
+    q = q.order_by(Reporte.creado_en.desc(), Reporte.id.desc())
+
+    # Antes de abrir el cursor: durante el streaming no se hacen otras consultas
+    archivados = _meses_archivo(
+        s, desde=desde, hasta=hasta, zona=zona, id_bano=id_bano, search=search, tzinfo=tzinfo
     )
-    rows = s.scalars(q_page).all()
-    # Asegura que relationship bano esté cargado para to_dict_joined
-    # (la join ya lo hace, pero por si acaso)
-    items = [r.to_dict_joined() for r in rows]
+    res = s.execute(q.execution_options(yield_per=lote, stream_results=True))
+    return _filas_export(res, archivados, tzinfo)
+
+
+def _filas_export(res, archivados: List["_MesArchivo"], tzinfo: datetime.tzinfo) -> Iterator[Dict[str, Any]]:
+    utc = datetime.timezone.utc
+    for (id_, creado, id_b, nombre, zona_r, piso, sexo, categoria, comentario,
+         foto_url, origen, estado, ip) in res:
+        if isinstance(creado, datetime.datetime):
+            if creado.tzinfo is None:
+                creado = creado.replace(tzinfo=utc)
+            creado_en, creado_local = creado.isoformat(), creado.astimezone(tzinfo).isoformat()
+        else:
+            creado_en = creado_local = creado
+        yield {
+            "id": id_, "creado_en": creado_en, "creado_local": creado_local,
+            "id_bano": id_b, "nombre_bano": nombre, "zona": zona_r, "piso": piso,
+            "sexo": sexo, "categoria": categoria, "comentario": comentario,
+            "foto_url": foto_url, "origen": origen, "estado": estado, "creado_por_ip": ip,
+        }
+    # Reportes archivados (todos anteriores a los de la BD), mes por mes
+    for m in archivados:
+        for f, b in m.filas():
+            yield {
+                "id": f["id"], "creado_en": f["creado_en"].isoformat(),
+                "creado_local": f["creado_en"].astimezone(tzinfo).isoformat(),
+                "id_bano": f["id_bano"], "nombre_bano": b["nombre"], "zona": b["zona"],
+                "piso": b["piso"], "sexo": b["sexo"], "categoria": f["categoria"],
+                "comentario": f.get("comentario"), "foto_url": f.get("foto_url"),
+                "origen": f.get("origen"), "estado": f.get("estado"),
+                "creado_por_ip": f.get("creado_por_ip"),
+            }
+
+
+def _encode_cursor(creado_raw: str, id_: int, archivado: bool = False) -> str:
+    pos = [creado_raw, id_, 1] if archivado else [creado_raw, id_]
+    raw = json.dumps(pos, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(token: str) -> Optional[Tuple[str, int, bool]]:
+    """
+    Devuelve (creado_en tal cual está en la BD, id, archivado) o None si está
+    vacío. En un cursor archivado, creado_en es ISO UTC del archivo.
+    """
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        creado_raw, id_, *resto = json.loads(raw)
+        return str(creado_raw), int(id_), bool(resto and resto[0])
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+
+def _list_reportes_cursor(
+    s: Session,
+    q,
+    *,
+    cursor: str,
+    per_page: int,
+    total_modo: str,
+    desde: Optional[str],
+    hasta: Optional[str],
+    zona: Optional[str],
+    id_bano: Optional[str],
+    search: Optional[str],
+    archivados: List[_MesArchivo],
+    campos: List[str],
+    tzinfo: datetime.tzinfo,
+) -> Dict[str, Any]:
+    # En SQLite creado_en es texto: se compara la representación guardada
+    # (sin CAST, sigue usando el índice) para que el seek sea exacto.
+    if IS_SQLITE:
+        col = type_coerce(Reporte.creado_en, String)
+    else:
+        col = Reporte.creado_en
+
+    total: Optional[int] = None
+    exacto = False
+    if total_modo == "exact":
+        total = int(s.scalar(select(func.count()).select_from(q.subquery())) or 0)
+        total += sum(m.total() for m in archivados)
+        exacto = True
+    elif total_modo == "estimate" and not search:
+        # El rollup conserva los días archivados
+        total = _total_estimado(s, desde=desde, hasta=hasta, zona=zona, id_bano=id_bano)
+
+    pos = _decode_cursor(cursor)
+    rows = []
+    if pos is None or not pos[2]:
+        if pos is not None:
+            creado_raw, id_, _ = pos
+            val = creado_raw if IS_SQLITE else datetime.datetime.fromisoformat(creado_raw)
+            q = q.where(or_(col < val, and_(col == val, Reporte.id < id_)))
+
+        q = q.add_columns(col.label("creado_raw"))
+        q = q.order_by(Reporte.creado_en.desc(), Reporte.id.desc()).limit(per_page + 1)
+        rows = s.execute(q).mappings().all()
+
+    def cursor_bd():
+        raw = rows[-1]["creado_raw"]
+        return _encode_cursor(raw if IS_SQLITE else raw.isoformat(), rows[-1]["id"])
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = cursor_bd()
+    items = [_fila_lista(m, campos, tzinfo) for m in rows]
+
+    if next_cursor is None and archivados:
+        # Se acabaron los de la BD: sigue con el archivo
+        faltan = per_page - len(items)
+        if not faltan:
+            next_cursor = cursor_bd()
+        else:
+            tramo = _seguir_archivo(archivados, pos if pos is not None and pos[2] else None, faltan + 1)
+            if len(tramo) > faltan:
+                tramo = tramo[:faltan]
+                f = tramo[-1][0]
+                next_cursor = _encode_cursor(f["creado_en"].isoformat(), f["id"], archivado=True)
+            items.extend(_fila_lista(_fila_archivada(f, b), campos, tzinfo) for f, b in tramo)
 
     return {
-        "page": page,
         "per_page": per_page,
-        "total": int(total or 0),
-        "pages": pages,
+        "total": total,
+        "total_exacto": exacto,
+        "next_cursor": next_cursor,
         "items": items,
     }
 
 
+def _seguir_archivo(meses: List[_MesArchivo], pos: Optional[Tuple[str, int, bool]], limite: int):
+    """Hasta `limite` reportes archivados posteriores (más viejos) a la posición del cursor."""
+    res: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+    clave = None
+    if pos is not None:
+        clave = (datetime.datetime.fromisoformat(pos[0]), pos[1])
+    for m in meses:
+        if len(res) >= limite:
+            break
+        if clave is not None and m.mes > clave[0]:
+            continue
+        for f, b in m.filas():
+            if clave is None or (f["creado_en"], f["id"]) < clave:
+                res.append((f, b))
+                if len(res) >= limite:
+                    break
+    return res
+
+
+def _total_estimado(
+    s: Session,
+    *,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    zona: Optional[str] = None,
+    id_bano: Optional[str] = None,
+) -> Optional[int]:
+    """
+    Total aproximado desde `reportes_diarios` (O(días × baños)). Los días del
+    rollup son locales (ROLLUP_TZ), por eso es estimado. None si no hay rollup.
+    """
+    if get_meta(s, "rollup_diario_tz") != ROLLUP_TZ:
+        return None
+    q = select(func.coalesce(func.sum(ReporteDiario.total), 0))
+    if zona:
+        q = q.join(Bano, Bano.id == ReporteDiario.id_bano).where(Bano.zona == zona)
+    if desde:
+        q = q.where(ReporteDiario.dia >= datetime.date.fromisoformat(desde))
+    if hasta:
+        q = q.where(ReporteDiario.dia <= datetime.date.fromisoformat(hasta))
+    if id_bano:
+        q = q.where(ReporteDiario.id_bano == id_bano)
+    return int(s.scalar(q) or 0)
+
+
 def fetch_rows_for_kpis(
     s: Session,
     *,
@@ -262,6 +1140,7 @@ def fetch_rows_for_kpis(
     hasta: Optional[str] = None,
     zona: Optional[str] = None,
     id_bano: Optional[str] = None,
+    tzinfo: datetime.tzinfo = datetime.timezone.utc,
 ) -> List[Tuple[str, datetime.datetime, str, Optional[str]]]:
     """
     Devuelve filas simples para armar KPIs en Python (como ya lo haces en app.py):
@@ -275,15 +1154,1096 @@ def fetch_rows_for_kpis(
         Bano.zona,
     ).join(Bano)
 
+    q = filtrar_reportes(q, desde=desde, hasta=hasta, zona=zona, id_bano=id_bano, tzinfo=tzinfo)
+    q = q.order_by(Reporte.creado_en.desc())
+
+    return [(c, ce, ib, z) for c, ce, ib, z in s.execute(q).all()]
+
+
+# =================== KPIs agregados en SQL ==================
+
+def _segmentos_offset(
+    tzinfo: datetime.tzinfo,
+    inicio: datetime.datetime,
+    fin: datetime.datetime,
+) -> List[Tuple[datetime.datetime, int]]:
+    """
+    Parte [inicio, fin] (UTC naive) en tramos con offset constante de `tzinfo`.
+    Devuelve [(inicio_tramo_utc, offset_segundos)]. Recorre día por día y,
+    si el offset cambia, ubica la transición hora por hora (cambios de horario).
+    """
+    def off(dt: datetime.datetime) -> int:
+        return int(dt.replace(tzinfo=datetime.timezone.utc).astimezone(tzinfo).utcoffset().total_seconds())
+
+    dia = datetime.timedelta(days=1)
+    hora = datetime.timedelta(hours=1)
+    cur = inicio.replace(minute=0, second=0, microsecond=0)
+    segmentos = [(cur, off(cur))]
+    while cur < fin:
+        sig = min(cur + dia, fin)
+        if off(sig) != segmentos[-1][1]:
+            h = cur
+            while h < sig:
+                h += hora
+                o = off(h)
+                if o != segmentos[-1][1]:
+                    segmentos.append((h, o))
+        cur = sig
+    return segmentos
+
+
+def _expr_dia_local(s: Session, tzinfo: datetime.tzinfo, inicio=None, fin=None):
+    """
+    Expresión SQL con la fecha local (YYYY-MM-DD) de Reporte.creado_en en `tzinfo`.
+    - Postgres: date(creado_en AT TIME ZONE '<tz>').
+    - SQLite: date(creado_en, '<offset> seconds'), con un CASE por tramo si el
+      rango [inicio, fin] cruza cambios de horario.
+    """
+    return _expr_local(s, tzinfo, "dia", inicio, fin)
+
+
+def _expr_hora_local(s: Session, tzinfo: datetime.tzinfo, inicio=None, fin=None):
+    """Como _expr_dia_local, pero con la hora local (0-23) como entero."""
+    return _expr_local(s, tzinfo, "hora", inicio, fin)
+
+
+def _expr_local(s: Session, tzinfo: datetime.tzinfo, parte: str, inicio=None, fin=None):
+    col = Reporte.creado_en
+    tz_key = getattr(tzinfo, "key", None)
+    if s.get_bind().dialect.name == "postgresql":
+        if tz_key:
+            local = func.timezone(tz_key, col)
+        else:
+            delta = datetime.datetime.now(tzinfo).utcoffset()
+            local = func.timezone(literal(delta, Interval()), col)
+        if parte == "hora":
+            return func.extract("hour", local).cast(Integer)
+        return func.date(local)
+
+    if inicio is None or fin is None:
+        inicio_db, fin_db = s.execute(select(func.min(col), func.max(col))).one()
+        inicio = inicio or inicio_db
+        fin = fin or fin_db
+    if inicio is None or fin is None:
+        ahora = datetime.datetime.utcnow()
+        inicio = fin = ahora
+    segmentos = _segmentos_offset(tzinfo, inicio, fin)
+
+    def local(offset: int):
+        modif = f"{offset:+d} seconds"
+        if parte == "hora":
+            return func.strftime("%H", col, modif).cast(Integer)
+        return func.date(col, modif)
+
+    if len(segmentos) == 1:
+        return local(segmentos[0][1])
+    whens = [
+        (col < segmentos[i + 1][0], local(segmentos[i][1]))
+        for i in range(len(segmentos) - 1)
+    ]
+    return case(*whens, else_=local(segmentos[-1][1]))
+
+
+def kpis_agregados(
+    s: Session,
+    *,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    zona: Optional[str] = None,
+    id_bano: Optional[str] = None,
+    tzinfo: datetime.tzinfo = datetime.timezone.utc,
+) -> Dict[str, Any]:
+    """
+    Conteos por categoría, baño, zona y día local calculados en la BD.
+    Un solo GROUP BY (categoria, id_bano, zona, dia); el costo en Python
+    depende del número de grupos (días × baños × categorías), no de filas.
+    Devuelve {total, por_categoria, por_bano, por_zona, por_dia}.
+    Con KPI_ENGINE=numpy cuenta en memoria (kpis_columnar). Suma los
+    reportes archivados si el rango llega a ellos.
+    """
+    filtros = dict(desde=desde, hasta=hasta, zona=zona, id_bano=id_bano, tzinfo=tzinfo)
+    np = _numpy()
+    if np is not None:
+        res = kpis_columnar(s, np, **filtros)
+    else:
+        res = _plegar_conteos(s.execute(_q_kpis(s, **filtros)))
+    archivados = _agrupar_archivo(s, ("categoria", "id_bano", "zona", "dia"), **filtros)
+    if archivados:
+        _sumar_kpis(res, _plegar_conteos(archivados))
+    return res
+
+
+def _q_kpis(
+    s: Session,
+    *,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    zona: Optional[str] = None,
+    id_bano: Optional[str] = None,
+    tzinfo: datetime.tzinfo = datetime.timezone.utc,
+):
+    """SELECT categoria, id_bano, zona, dia, n ... GROUP BY (ver kpis_agregados)."""
+    inicio, fin = rango_utc(desde, hasta, tzinfo)
+    dia = _expr_dia_local(
+        s,
+        tzinfo,
+        inicio.replace(tzinfo=None) if inicio else None,
+        fin.replace(tzinfo=None) if fin else None,
+    ).label("dia")
+
+    q = select(
+        Reporte.categoria,
+        Reporte.id_bano,
+        Bano.zona,
+        dia,
+        func.count().label("n"),
+    ).join(Bano)
+
+    q = filtrar_reportes(q, desde=desde, hasta=hasta, zona=zona, id_bano=id_bano, tzinfo=tzinfo)
+    return q.group_by(Reporte.categoria, Reporte.id_bano, Bano.zona, dia)
+
+
+def _plegar_conteos(rows: Iterable[Tuple[str, str, Optional[str], Any, int]]) -> Dict[str, Any]:
+    """Acumula filas (categoria, id_bano, zona, dia, n) en los dicts de KPIs."""
+    por_categoria: Dict[str, int] = {}
+    por_bano: Dict[str, int] = {}
+    por_zona: Dict[Optional[str], int] = {}
+    por_dia: Dict[str, int] = {}
+    total = 0
+    for categoria, id_b, zona_r, dia_r, n in rows:
+        n = int(n)
+        total += n
+        por_categoria[categoria] = por_categoria.get(categoria, 0) + n
+        por_bano[id_b] = por_bano.get(id_b, 0) + n
+        por_zona[zona_r] = por_zona.get(zona_r, 0) + n
+        dia_r = dia_r.isoformat() if isinstance(dia_r, datetime.date) else str(dia_r)[:10]
+        por_dia[dia_r] = por_dia.get(dia_r, 0) + n
+
+    return {
+        "total": total,
+        "por_categoria": por_categoria,
+        "por_bano": por_bano,
+        "por_zona": por_zona,
+        "por_dia": por_dia,
+    }
+
+
+# =================== KPIs columnar (NumPy, opcional) =========
+#
+# KPI_ENGINE=numpy: en vez de GROUP BY con la expresión de día local (que en
+# SQLite es un CASE por tramo de horario), trae por fila solo enteros
+# (epoch UTC, código de baño, código de categoría) y cuenta con bincount.
+# Las fronteras de día local (medianoche en epoch) se calculan una vez por
+# tz y rango, así que el cambio de horario sale correcto sin tocar cada fila.
+# Si numpy no está instalado se usa el GROUP BY de siempre.
+
+KPI_ENGINE = os.getenv("KPI_ENGINE", "sql").strip().lower()
+
+# Categorías del formulario; las que no estén aquí se cuentan por SQL aparte
+CATEGORIAS_KPI = ("sucio", "falta_papel", "falta_jabon", "fuga_agua", "mal_olor", "otro")
+
+
+def _numpy():
+    if KPI_ENGINE != "numpy":
+        return None
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+_fronteras_cache: "OrderedDict[tuple, Any]" = OrderedDict()
+
+
+def _fronteras_dia(np, tzinfo: datetime.tzinfo, d0: datetime.date, d1: datetime.date):
+    """Epoch UTC de cada medianoche local de d0..d1+1 (int64, creciente)."""
+    key = (getattr(tzinfo, "key", str(tzinfo)), d0, d1)
+    arr = _fronteras_cache.get(key)
+    if arr is None:
+        n = (d1 - d0).days + 2
+        arr = np.array([
+            int(datetime.datetime.combine(d0 + datetime.timedelta(days=i), datetime.time(),
+                                          tzinfo=tzinfo).timestamp())
+            for i in range(n)
+        ], dtype=np.int64)
+        _fronteras_cache[key] = arr
+        while len(_fronteras_cache) > 32:
+            _fronteras_cache.popitem(last=False)
+    return arr
+
+
+def _expr_epoch(s: Session):
+    col = Reporte.creado_en
+    if s.get_bind().dialect.name == "postgresql":
+        return func.floor(func.extract("epoch", col)).cast(BigInteger)
+    if sqlite3.sqlite_version_info >= (3, 38):
+        return func.unixepoch(col)
+    return func.strftime("%s", col).cast(Integer)
+
+
+def kpis_columnar(
+    s: Session,
+    np,
+    *,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    zona: Optional[str] = None,
+    id_bano: Optional[str] = None,
+    tzinfo: datetime.tzinfo = datetime.timezone.utc,
+) -> Dict[str, Any]:
+    """Mismo resultado que kpis_agregados, contado con NumPy (ver arriba)."""
+    cat = catalogo_banos.obtener(s)
+    banos = [b["id"] for b in cat.todos]
+    cod_bano = {b: i for i, b in enumerate(banos)}
+    cats = list(CATEGORIAS_KPI)
+
+    q = select(
+        _expr_epoch(s),
+        case(cod_bano, value=Reporte.id_bano, else_=-1),
+        case({c: i for i, c in enumerate(cats)}, value=Reporte.categoria, else_=-1),
+    )
+    # Sin join: la zona se resuelve con el catálogo en memoria
+    q = filtrar_reportes(q, desde=desde, hasta=hasta, id_bano=id_bano, tzinfo=tzinfo)
+    if zona:
+        q = q.where(Reporte.id_bano.in_([b["id"] for b in cat.todos if b["zona"] == zona]))
+
+    # Solo enteros: se leen del cursor DBAPI sin construir Row por fila
+    filas = s.connection().execute(q).cursor.fetchall()
+    datos = np.fromiter(
+        itertools.chain.from_iterable(filas), dtype=np.int64, count=3 * len(filas)
+    ).reshape(-1, 3)
+    del filas
+    ts, b_cod, c_cod = datos[:, 0], datos[:, 1], datos[:, 2]
+
+    conocidas = (b_cod >= 0) & (c_cod >= 0)
+    otras = int(len(datos) - conocidas.sum())
+    ts, b_cod, c_cod = ts[conocidas], b_cod[conocidas], c_cod[conocidas]
+
+    por_categoria: Dict[str, int] = {}
+    por_bano: Dict[str, int] = {}
+    por_zona: Dict[Optional[str], int] = {}
+    por_dia: Dict[str, int] = {}
+    if len(ts):
+        d0 = datetime.datetime.fromtimestamp(int(ts.min()), tzinfo).date()
+        d1 = datetime.datetime.fromtimestamp(int(ts.max()), tzinfo).date()
+        fronteras = _fronteras_dia(np, tzinfo, d0, d1)
+        dia = np.searchsorted(fronteras, ts, side="right") - 1
+        nd, nb, nc = len(fronteras) - 1, len(banos), len(cats)
+        cubo = np.bincount((b_cod * nc + c_cod) * nd + dia, minlength=nb * nc * nd).reshape(nb, nc, nd)
+
+        for i, n in enumerate(cubo.sum(axis=(0, 2)).tolist()):
+            if n:
+                por_categoria[cats[i]] = n
+        for i, n in enumerate(cubo.sum(axis=(1, 2)).tolist()):
+            if n:
+                por_bano[banos[i]] = n
+                z = cat.por_id[banos[i]]["zona"]
+                por_zona[z] = por_zona.get(z, 0) + n
+        for i, n in enumerate(cubo.sum(axis=(0, 1)).tolist()):
+            if n:
+                por_dia[(d0 + datetime.timedelta(days=i)).isoformat()] = n
+
+    res = {
+        "total": int(len(ts)),
+        "por_categoria": por_categoria,
+        "por_bano": por_bano,
+        "por_zona": por_zona,
+        "por_dia": por_dia,
+    }
+    if otras:
+        # Categorías fuera de CATEGORIAS_KPI (o baño fuera del catálogo): GROUP BY
+        q = _q_kpis(s, desde=desde, hasta=hasta, zona=zona, id_bano=id_bano, tzinfo=tzinfo)
+        q = q.where(or_(Reporte.categoria.not_in(cats), Reporte.id_bano.not_in(banos)))
+        _sumar_kpis(res, _plegar_conteos(s.execute(q)))
+    return res
+
+
+# =================== Rollup diario ==========================
+
+# Zona horaria con la que se define el "día" del rollup
+ROLLUP_TZ = os.getenv("ROLLUP_TZ") or os.getenv("DEFAULT_TZ", "America/Monterrey")
+
+
+def _rollup_tzinfo() -> datetime.tzinfo:
+    try:
+        return ZoneInfo(ROLLUP_TZ)
+    except Exception:
+        return datetime.timezone.utc
+
+
+def _bind_ts(dt: datetime.datetime) -> datetime.datetime:
+    """Instante UTC listo para comparar con creado_en (naive en SQLite)."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    dt = dt.astimezone(datetime.timezone.utc)
+    return dt.replace(tzinfo=None) if IS_SQLITE else dt
+
+
+def _insert(s: Session):
+    """`insert` del dialecto actual (soporta on_conflict_*)."""
+    # Import diferido: el dialecto de Postgres pesa ~40 ms al arrancar con SQLite
+    if s.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects import postgresql
+        return postgresql.insert
+    from sqlalchemy.dialects import sqlite
+    return sqlite.insert
+
+
+def _upsert_contadores(s: Session, modelo, claves: Tuple[str, ...], conteos: Dict[tuple, int]) -> None:
+    """INSERT ... ON CONFLICT (claves) DO UPDATE SET total = total + excluded.total"""
+    filas = [dict(zip(claves, k), total=n) for k, n in conteos.items()]
+    # Por tramos: un VALUES enorme (backfill del archivo) rebasa el límite de parámetros
+    for i in range(0, len(filas), 1000):
+        stmt = _insert(s)(modelo).values(filas[i:i + 1000])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(claves),
+            set_={"total": modelo.total + stmt.excluded.total},
+        )
+        s.execute(stmt)
+
+
+def acumular_rollups(
+    s: Session, filas: Iterable[Tuple[str, str, datetime.datetime]]
+) -> None:
+    """
+    Suma al rollup las filas (id_bano, categoria, creado_en) recién insertadas.
+    No hace commit: se llama dentro de la transacción del INSERT.
+    """
+    tz = _rollup_tzinfo()
+    diarios: Dict[tuple, int] = {}
+    horarios: Dict[tuple, int] = {}
+    for id_b, categoria, creado_en in filas:
+        if creado_en.tzinfo is None:
+            creado_en = creado_en.replace(tzinfo=datetime.timezone.utc)
+        local = creado_en.astimezone(tz)
+        k = (local.date(), id_b, categoria)
+        diarios[k] = diarios.get(k, 0) + 1
+        kh = (local.date(), local.hour, id_b, categoria)
+        horarios[kh] = horarios.get(kh, 0) + 1
+    _upsert_contadores(s, ReporteDiario, ("dia", "id_bano", "categoria"), diarios)
+    _upsert_contadores(s, ReporteHorario, ("dia", "hora", "id_bano", "categoria"), horarios)
+
+
+def reconstruir_rollups(s: Session) -> int:
+    """
+    Recalcula `reportes_diarios` y `reportes_horarios` desde `reportes` y el
+    archivo (backfill) y los marca como listos para ROLLUP_TZ. Hace commit.
+    Devuelve el número de grupos diarios.
+    """
+    if s.get_bind().dialect.name == "postgresql":
+        # Evita que entren reportes mientras se reconstruye
+        s.execute(text("LOCK TABLE reportes IN SHARE MODE"))
+    s.execute(delete(ReporteDiario))
+    s.execute(delete(ReporteHorario))
+    tz = _rollup_tzinfo()
+    inicio, fin = s.execute(select(func.min(Reporte.creado_en), func.max(Reporte.creado_en))).one()
+    dia = _expr_dia_local(s, tz, inicio, fin)
+    hora = _expr_hora_local(s, tz, inicio, fin)
+    src = select(
+        dia, Reporte.id_bano, Reporte.categoria, func.count()
+    ).group_by(dia, Reporte.id_bano, Reporte.categoria)
+    s.execute(
+        ReporteDiario.__table__.insert().from_select(
+            ["dia", "id_bano", "categoria", "total"], src
+        )
+    )
+    src = select(
+        dia, hora, Reporte.id_bano, Reporte.categoria, func.count()
+    ).group_by(dia, hora, Reporte.id_bano, Reporte.categoria)
+    s.execute(
+        ReporteHorario.__table__.insert().from_select(
+            ["dia", "hora", "id_bano", "categoria", "total"], src
+        )
+    )
+    # Reportes archivados: ya no están en `reportes` pero siguen contando
+    horarios = {
+        (dia, h, id_b, c): n
+        for dia, h, id_b, c, n in _agrupar_archivo(s, ("dia", "hora", "id_bano", "categoria"), tzinfo=tz)
+    }
+    diarios: Dict[tuple, int] = {}
+    for (dia, _h, id_b, c), n in horarios.items():
+        diarios[(dia, id_b, c)] = diarios.get((dia, id_b, c), 0) + n
+    _upsert_contadores(s, ReporteDiario, ("dia", "id_bano", "categoria"), diarios)
+    _upsert_contadores(s, ReporteHorario, ("dia", "hora", "id_bano", "categoria"), horarios)
+    n = s.scalar(select(func.count()).select_from(ReporteDiario)) or 0
+    set_meta(s, "rollup_diario_tz", ROLLUP_TZ)
+    set_meta(s, "rollup_horario_tz", ROLLUP_TZ)
+    s.commit()
+    return int(n)
+
+
+def asegurar_rollups(s: Session) -> None:
+    """Reconstruye los rollups si nunca se hicieron o si cambió ROLLUP_TZ."""
+    if (get_meta(s, "rollup_diario_tz") != ROLLUP_TZ
+            or get_meta(s, "rollup_horario_tz") != ROLLUP_TZ):
+        reconstruir_rollups(s)
+
+
+def kpis_resumen(
+    s: Session,
+    *,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    zona: Optional[str] = None,
+    id_bano: Optional[str] = None,
+    tzinfo: datetime.tzinfo = datetime.timezone.utc,
+) -> Dict[str, Any]:
+    """
+    KPIs para /api/kpis. Si la tz pedida es la del rollup, los días completos
+    salen de `reportes_diarios` y solo el día en curso toca filas crudas;
+    si no, cae a kpis_agregados.
+    """
+    if getattr(tzinfo, "key", None) != ROLLUP_TZ or get_meta(s, "rollup_diario_tz") != ROLLUP_TZ:
+        return kpis_agregados(s, desde=desde, hasta=hasta, zona=zona, id_bano=id_bano, tzinfo=tzinfo)
+
+    ahora = datetime.datetime.now(tzinfo)
+    hoy = ahora.date()
+    d_desde = datetime.date.fromisoformat(desde) if desde else None
+    d_hasta = datetime.date.fromisoformat(hasta) if hasta else None
+
+    # Días completos: [desde, min(hasta, ayer)]
+    fin_rollup = min(d_hasta, hoy - datetime.timedelta(days=1)) if d_hasta else hoy - datetime.timedelta(days=1)
+    filas: List[Tuple[str, str, Optional[str], Any, int]] = []
+    if d_desde is None or d_desde <= fin_rollup:
+        q = select(
+            ReporteDiario.categoria,
+            ReporteDiario.id_bano,
+            Bano.zona,
+            ReporteDiario.dia,
+            ReporteDiario.total,
+        ).join(Bano, Bano.id == ReporteDiario.id_bano)
+        if d_desde:
+            q = q.where(ReporteDiario.dia >= d_desde)
+        q = q.where(ReporteDiario.dia <= fin_rollup)
+        if zona:
+            q = q.where(Bano.zona == zona)
+        if id_bano:
+            q = q.where(ReporteDiario.id_bano == id_bano)
+        filas.extend(s.execute(q).all())
+
+    # Día en curso: filas crudas desde la medianoche local
+    if (d_desde is None or d_desde <= hoy) and (d_hasta is None or d_hasta >= hoy):
+        q = _q_kpis(s, desde=hoy.isoformat(), zona=zona, id_bano=id_bano, tzinfo=tzinfo)
+        filas.extend(s.execute(q).all())
+
+    return _plegar_conteos(filas)
+
+
+# =================== Heatmap y series por baño ==============
+#
+# Salen de los rollups (filas acotadas: días × 24 para el heatmap, días ×
+# baños para las series) cuando la tz pedida es ROLLUP_TZ; si no, agrupan
+# `reportes` con las expresiones de día/hora local.
+
+def _rollup_listo(s: Session, tzinfo: datetime.tzinfo, clave: str) -> bool:
+    return getattr(tzinfo, "key", None) == ROLLUP_TZ and get_meta(s, clave) == ROLLUP_TZ
+
+
+def _filtrar_rollup(q, modelo, *, desde, hasta, zona, id_bano, categoria):
     if desde:
-        q = q.where(func.date(Reporte.creado_en) >= desde)
+        q = q.where(modelo.dia >= datetime.date.fromisoformat(desde))
     if hasta:
-        q = q.where(func.date(Reporte.creado_en) <= hasta)
+        q = q.where(modelo.dia <= datetime.date.fromisoformat(hasta))
     if zona:
-        q = q.where(Bano.zona == zona)
+        q = q.join(Bano, Bano.id == modelo.id_bano).where(Bano.zona == zona)
     if id_bano:
-        q = q.where(Reporte.id_bano == id_bano)
+        q = q.where(modelo.id_bano == id_bano)
+    if categoria:
+        q = q.where(modelo.categoria == categoria)
+    return q
 
-    q = q.order_by(Reporte.creado_en.desc())
 
-    return [(c, ce, ib, z) for c, ce, ib, z in s.execute(q).all()]
+def _q_crudo_local(s: Session, partes, *, desde, hasta, zona, id_bano, categoria, tzinfo):
+    """SELECT <partes locales>, count(*) FROM reportes ... GROUP BY <partes>."""
+    inicio, fin = rango_utc(desde, hasta, tzinfo)
+    inicio = inicio.replace(tzinfo=None) if inicio else None
+    fin = fin.replace(tzinfo=None) if fin else None
+    cols = []
+    for p in partes:
+        if p == "dia":
+            cols.append(_expr_dia_local(s, tzinfo, inicio, fin).label("dia"))
+        elif p == "hora":
+            cols.append(_expr_hora_local(s, tzinfo, inicio, fin).label("hora"))
+        else:
+            cols.append(getattr(Reporte, p))
+    q = select(*cols, func.count())
+    if zona:
+        q = q.join(Bano)
+    q = filtrar_reportes(q, desde=desde, hasta=hasta, zona=zona, id_bano=id_bano, tzinfo=tzinfo)
+    if categoria:
+        q = q.where(Reporte.categoria == categoria)
+    return q.group_by(*cols)
+
+
+def _fecha(v: Any) -> datetime.date:
+    return v if isinstance(v, datetime.date) else datetime.date.fromisoformat(str(v)[:10])
+
+
+def kpis_heatmap(
+    s: Session,
+    *,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    zona: Optional[str] = None,
+    id_bano: Optional[str] = None,
+    categoria: Optional[str] = None,
+    tzinfo: datetime.tzinfo = datetime.timezone.utc,
+) -> Dict[str, Any]:
+    """
+    Reportes por día de la semana (0 = lunes) × hora local.
+    Devuelve {total, matriz[7][24], por_hora[24], por_dia_semana[7], fuente}.
+    """
+    filtros = dict(desde=desde, hasta=hasta, zona=zona, id_bano=id_bano, categoria=categoria)
+    if _rollup_listo(s, tzinfo, "rollup_horario_tz"):
+        q = select(ReporteHorario.dia, ReporteHorario.hora, func.sum(ReporteHorario.total))
+        q = _filtrar_rollup(q, ReporteHorario, **filtros)
+        q = q.group_by(ReporteHorario.dia, ReporteHorario.hora)
+        fuente = "rollup"
+    else:
+        q = _q_crudo_local(s, ("dia", "hora"), tzinfo=tzinfo, **filtros)
+        fuente = "reportes"
+    filas = s.execute(q).all()
+    if fuente == "reportes":
+        filas += _agrupar_archivo(s, ("dia", "hora"), tzinfo=tzinfo, **filtros)
+
+    matriz = [[0] * 24 for _ in range(7)]
+    for dia, hora, n in filas:
+        matriz[_fecha(dia).weekday()][int(hora)] += int(n)
+    return {
+        "total": sum(map(sum, matriz)),
+        "matriz": matriz,
+        "por_hora": [sum(fila[h] for fila in matriz) for h in range(24)],
+        "por_dia_semana": [sum(fila) for fila in matriz],
+        "fuente": fuente,
+    }
+
+
+def kpis_series(
+    s: Session,
+    *,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    zona: Optional[str] = None,
+    id_bano: Optional[str] = None,
+    categoria: Optional[str] = None,
+    top: int = 10,
+    tzinfo: datetime.tzinfo = datetime.timezone.utc,
+) -> Dict[str, Any]:
+    """
+    Serie diaria por baño (los `top` con más reportes). Los días van
+    continuos de desde (o el primer día con datos) a hasta (o el último).
+    Devuelve {dias, series: [{id_bano, nombre, zona, total, valores}], fuente}.
+    """
+    filtros = dict(desde=desde, hasta=hasta, zona=zona, id_bano=id_bano, categoria=categoria)
+    if _rollup_listo(s, tzinfo, "rollup_diario_tz"):
+        q = select(ReporteDiario.dia, ReporteDiario.id_bano, func.sum(ReporteDiario.total))
+        q = _filtrar_rollup(q, ReporteDiario, **filtros)
+        q = q.group_by(ReporteDiario.dia, ReporteDiario.id_bano)
+        fuente = "rollup"
+    else:
+        q = _q_crudo_local(s, ("dia", "id_bano"), tzinfo=tzinfo, **filtros)
+        fuente = "reportes"
+    filas = s.execute(q).all()
+    if fuente == "reportes":
+        filas += _agrupar_archivo(s, ("dia", "id_bano"), tzinfo=tzinfo, **filtros)
+
+    conteos: Dict[str, Dict[datetime.date, int]] = {}
+    for dia, id_b, n in filas:
+        serie = conteos.setdefault(id_b, {})
+        serie[_fecha(dia)] = serie.get(_fecha(dia), 0) + int(n)
+
+    todos_dias = [d for serie in conteos.values() for d in serie]
+    d0 = datetime.date.fromisoformat(desde) if desde else min(todos_dias, default=None)
+    d1 = datetime.date.fromisoformat(hasta) if hasta else max(todos_dias, default=None)
+    dias = [] if d0 is None or d1 is None else [
+        d0 + datetime.timedelta(days=i) for i in range((d1 - d0).days + 1)
+    ]
+
+    cat = catalogo_banos.obtener(s)
+    series = []
+    for id_b, serie in conteos.items():
+        b = cat.por_id.get(id_b, {})
+        series.append({
+            "id_bano": id_b,
+            "nombre": b.get("nombre", id_b),
+            "zona": b.get("zona"),
+            "total": sum(serie.values()),
+            "valores": [serie.get(d, 0) for d in dias],
+        })
+    series.sort(key=lambda x: x["total"], reverse=True)
+    return {
+        "dias": [d.isoformat() for d in dias],
+        "series": series[:max(1, top)],
+        "fuente": fuente,
+    }
+
+
+# =================== Búsqueda de texto ======================
+#
+# Índice de texto para el buscador "q" del dashboard. Un documento por
+# reporte con categoria, comentario y los datos del baño (nombre, id, zona,
+# piso), con semántica de subcadena sin distinguir mayúsculas (como ILIKE):
+# - SQLite: tabla virtual FTS5 `reportes_fts` con tokenizer trigram (rowid = id).
+# - Postgres: tabla `reportes_busqueda` + índice GIN gin_trgm_ops (pg_trgm).
+# Términos de menos de 3 caracteres siguen usando ILIKE.
+# Las estructuras las crea la migración 1 (migraciones.py).
+
+_busqueda_soportada: Optional[bool] = None   # existen las estructuras
+_busqueda_lista = False                      # ya se pobló (meta 'busqueda_lista')
+
+
+def _tabla_busqueda(s: Session) -> Tuple[str, str]:
+    if s.get_bind().dialect.name == "postgresql":
+        return "reportes_busqueda", "reporte_id"
+    return "reportes_fts", "rowid"
+
+
+def _busqueda_existe(s: Session) -> bool:
+    """Detecta (una vez por proceso) si el índice de texto existe en la BD."""
+    global _busqueda_soportada
+    if _busqueda_soportada is None:
+        tabla, _ = _tabla_busqueda(s)
+        if s.get_bind().dialect.name == "postgresql":
+            existe = s.scalar(text("SELECT to_regclass(:t) IS NOT NULL"), {"t": tabla})
+        else:
+            existe = s.scalar(
+                text("SELECT count(*) FROM sqlite_master WHERE name = :t"), {"t": tabla}
+            )
+        _busqueda_soportada = bool(existe)
+    return _busqueda_soportada
+
+
+def busqueda_disponible(s: Session) -> bool:
+    """True si el índice existe y ya se pobló; list_reportes lo usa solo entonces."""
+    global _busqueda_lista
+    if not _busqueda_lista and _busqueda_existe(s):
+        _busqueda_lista = get_meta(s, "busqueda_lista") == "1"
+    return _busqueda_lista
+
+
+def _doc_busqueda(categoria: str, comentario: Optional[str], bano: Dict[str, Any]) -> str:
+    partes = [categoria, comentario, bano.get("nombre"), bano.get("id"), bano.get("zona"), bano.get("piso")]
+    return " ".join(p for p in partes if p)
+
+
+def indexar_busqueda(s: Session, docs: Iterable[Tuple[int, str]]) -> None:
+    """Agrega documentos (id_reporte, texto) al índice. No hace commit."""
+    filas = [{"id": i, "doc": d} for i, d in docs]
+    if not filas or not _busqueda_existe(s):
+        return
+    # Reemplaza si el id ya estaba (p. ej. ids reutilizados tras borrar reportes)
+    if s.get_bind().dialect.name == "postgresql":
+        sql = (
+            "INSERT INTO reportes_busqueda (reporte_id, doc) VALUES (:id, :doc) "
+            "ON CONFLICT (reporte_id) DO UPDATE SET doc = excluded.doc"
+        )
+    else:
+        sql = "INSERT OR REPLACE INTO reportes_fts (rowid, doc) VALUES (:id, :doc)"
+    s.execute(text(sql), filas)
+
+
+def _q_busqueda(s: Session, termino: str):
+    """Subconsulta con los ids de reportes cuyo documento contiene `termino`."""
+    if s.get_bind().dialect.name == "postgresql":
+        return text(
+            "SELECT reporte_id FROM reportes_busqueda WHERE doc ILIKE :like"
+        ).bindparams(like=f"%{termino}%")
+    # Frase entre comillas: el tokenizer trigram la trata como subcadena
+    frase = '"' + termino.replace('"', '""') + '"'
+    return text(
+        "SELECT rowid FROM reportes_fts WHERE reportes_fts MATCH :frase"
+    ).bindparams(frase=frase)
+
+
+def reconstruir_busqueda(s: Session) -> int:
+    """Repuebla el índice de texto desde reportes + banos. Hace commit."""
+    global _busqueda_lista
+    tabla, col_id = _tabla_busqueda(s)
+    sep = " || ' ' || "
+    doc = sep.join(
+        f"COALESCE({c}, '')"
+        for c in ("r.categoria", "r.comentario", "b.nombre", "b.id", "b.zona", "b.piso")
+    )
+    s.execute(text(f"DELETE FROM {tabla}"))
+    s.execute(text(
+        f"INSERT INTO {tabla} ({col_id}, doc) "
+        f"SELECT r.id, {doc} FROM reportes r JOIN banos b ON b.id = r.id_bano"
+    ))
+    n = s.scalar(text(f"SELECT count(*) FROM {tabla}")) or 0
+    set_meta(s, "busqueda_lista", "1")
+    s.commit()
+    _busqueda_lista = True
+    return int(n)
+
+
+def asegurar_busqueda(s: Session) -> None:
+    """Puebla el índice la primera vez que arranca con él."""
+    if _busqueda_existe(s) and get_meta(s, "busqueda_lista") != "1":
+        reconstruir_busqueda(s)
+
+
+# =================== Archivo de reportes ====================
+#
+# `archivar_reportes` mueve los reportes anteriores a ARCHIVO_MESES meses a
+# archivos mensuales (archivo.py) y los borra de `reportes`; meta
+# 'archivo_corte' guarda el instante UTC antes del cual todo está archivado.
+# Los rollups no se tocan. list_reportes, iter_reportes y los KPIs que no
+# salen del rollup leen el archivo solo si el rango pedido empieza antes del
+# corte (sin `desde`, o `desde` anterior al corte).
+
+def corte_archivo(s: Session) -> Optional[datetime.datetime]:
+    """Instante UTC antes del cual los reportes están archivados (None si nunca se archivó)."""
+    valor = get_meta(s, "archivo_corte")
+    return datetime.datetime.fromisoformat(valor) if valor else None
+
+
+class _MesArchivo:
+    """Un mes archivado visto con los filtros de una consulta (carga perezosa)."""
+
+    def __init__(self, mes, inicio, fin, banos, categoria, termino):
+        self.mes = mes
+        self.inicio = inicio        # None = desde el principio del mes
+        self.fin = fin              # None = hasta el final del mes
+        self.banos = banos          # id -> dict del baño (ya filtrados por zona/id_bano)
+        self.categoria = categoria
+        self.termino = termino      # búsqueda en minúsculas
+        self._filas: Optional[List[Tuple[Dict[str, Any], Dict[str, Any]]]] = None
+
+    def filas(self) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """[(reporte, baño)] que cumplen los filtros, del más reciente al más viejo."""
+        if self._filas is None:
+            res = []
+            for f in archivo.leer_mes(self.mes):
+                ts = f["creado_en"]
+                if (self.fin is not None and ts >= self.fin) or (self.inicio is not None and ts < self.inicio):
+                    continue
+                b = self.banos.get(f["id_bano"])
+                if b is None or (self.categoria and f["categoria"] != self.categoria):
+                    continue
+                if self.termino and self.termino not in _doc_busqueda(f["categoria"], f["comentario"], b).lower():
+                    continue
+                res.append((f, b))
+            self._filas = res
+        return self._filas
+
+    def total(self) -> int:
+        if self._filas is None and self.inicio is None and self.fin is None and not self.termino:
+            # Mes completo: sale del archivo de conteos sin descomprimir
+            conteos = archivo.conteos_mes(self.mes)
+            return sum(
+                n
+                for id_b, por_cat in conteos.items() if id_b in self.banos
+                for c, n in por_cat.items() if not self.categoria or c == self.categoria
+            )
+        return len(self.filas())
+
+
+def _meses_archivo(
+    s: Session,
+    *,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    zona: Optional[str] = None,
+    id_bano: Optional[str] = None,
+    categoria: Optional[str] = None,
+    search: Optional[str] = None,
+    tzinfo: datetime.tzinfo = datetime.timezone.utc,
+) -> List[_MesArchivo]:
+    """Meses archivados que alcanza el rango (más reciente primero); [] si no llega al corte."""
+    corte = corte_archivo(s)
+    if corte is None:
+        return []
+    inicio, fin = rango_utc(desde, hasta, tzinfo)
+    if inicio is not None and inicio >= corte:
+        return []
+    fin = corte if fin is None else min(fin, corte)
+    cat = catalogo_banos.obtener(s)
+    banos = {
+        b["id"]: b for b in cat.todos
+        if (not zona or b["zona"] == zona) and (not id_bano or b["id"] == id_bano)
+    }
+    termino = search.lower() if search else None
+    res = []
+    for mes in archivo.meses_en_rango(inicio, fin):
+        sig = archivo.sumar_meses(mes, 1)
+        res.append(_MesArchivo(
+            mes,
+            inicio if inicio is not None and inicio > mes else None,
+            fin if fin < sig else None,
+            banos, categoria, termino,
+        ))
+    return res
+
+
+def _pagina_archivo(meses: List[_MesArchivo], offset: int, limite: int):
+    """[(reporte, baño)] de las posiciones [offset, offset + limite) del archivo."""
+    res: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+    for m in meses:
+        if len(res) >= limite:
+            break
+        n = m.total()
+        if offset >= n:
+            offset -= n
+            continue
+        res.extend(m.filas()[offset: offset + limite - len(res)])
+        offset = 0
+    return res
+
+
+def _fila_archivada(f: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    """Reporte archivado con las columnas de COLUMNAS_LISTA (para _fila_lista)."""
+    creado = f["creado_en"]
+    return {
+        "id": f["id"],
+        "id_bano": f["id_bano"],
+        "categoria": f["categoria"],
+        "comentario": f.get("comentario"),
+        "foto_url": f.get("foto_url"),
+        "foto_thumb_url": f.get("foto_thumb_url"),
+        "origen": f.get("origen"),
+        "creado_en": creado.replace(tzinfo=None) if IS_SQLITE else creado,
+        "creado_por_ip": f.get("creado_por_ip"),
+        "estado": f.get("estado"),
+        "nombre_bano": b["nombre"],
+        "zona": b["zona"],
+        "piso": b["piso"],
+        "sexo": b["sexo"],
+    }
+
+
+def _agrupar_archivo(s: Session, partes: Tuple[str, ...], **filtros) -> List[tuple]:
+    """
+    Como _q_crudo_local pero sobre el archivo: [(*partes, n)]. Las partes
+    pueden ser columnas del reporte, "zona", "dia" o "hora" (locales en tzinfo).
+    """
+    tzinfo = filtros.get("tzinfo", datetime.timezone.utc)
+    conteos: Dict[tuple, int] = {}
+    for m in _meses_archivo(s, **filtros):
+        for f, b in m.filas():
+            local = f["creado_en"].astimezone(tzinfo)
+            k = tuple(
+                local.date() if p == "dia" else local.hour if p == "hora"
+                else b["zona"] if p == "zona" else f[p]
+                for p in partes
+            )
+            conteos[k] = conteos.get(k, 0) + 1
+    return [(*k, n) for k, n in conteos.items()]
+
+
+def _sumar_kpis(res: Dict[str, Any], otro: Dict[str, Any]) -> None:
+    """Suma en `res` los conteos de `otro` (mismo formato que _plegar_conteos)."""
+    res["total"] += otro["total"]
+    for k in ("por_categoria", "por_bano", "por_zona", "por_dia"):
+        for clave, n in otro[k].items():
+            res[k][clave] = res[k].get(clave, 0) + n
+
+
+def archivar_reportes(s: Session, meses: int = archivo.ARCHIVO_MESES) -> Dict[str, int]:
+    """
+    Mueve a archivo los reportes anteriores al inicio del mes UTC de hace
+    `meses` meses, un mes a la vez: escribe el archivo, y en una transacción
+    borra las filas (o la partición entera) y avanza 'archivo_corte'. Si se
+    corta a la mitad, el mes en curso queda en la BD y se reintenta.
+    Devuelve {mes 'AAAA-MM': reportes archivados}.
+    """
+    if meses < 1:
+        raise ValueError("meses debe ser >= 1")
+    ahora = datetime.datetime.now(datetime.timezone.utc)
+    corte = archivo.sumar_meses(archivo.inicio_mes(ahora), -meses)
+    previo = corte_archivo(s)
+    tabla_busqueda, col_busqueda = _tabla_busqueda(s)
+    particionada = reportes_particionado(s)
+    columnas = [getattr(Reporte, c) for c in archivo.COLUMNAS]
+
+    hechos: Dict[str, int] = {}
+    minimo = s.scalar(select(func.min(Reporte.creado_en)).where(Reporte.creado_en < _bind_ts(corte)))
+    mes = archivo.inicio_mes(minimo) if minimo is not None else corte
+    while mes < corte:
+        sig = archivo.sumar_meses(mes, 1)
+        rango = (Reporte.creado_en >= _bind_ts(mes), Reporte.creado_en < _bind_ts(sig))
+        filas = [dict(zip(archivo.COLUMNAS, r)) for r in s.execute(select(*columnas).where(*rango))]
+        if filas:
+            archivo.escribir_mes(mes, filas)
+            if _busqueda_existe(s):
+                t = table(tabla_busqueda, column(col_busqueda))
+                s.execute(delete(t).where(t.c[col_busqueda].in_(select(Reporte.id).where(*rango))))
+            if _usa_reportes_uuid(s):
+                u = table("reportes_uuid", column("reporte_id"))
+                s.execute(delete(u).where(u.c.reporte_id.in_(select(Reporte.id).where(*rango))))
+            nombre = _nombre_particion(mes)
+            if particionada and s.scalar(text("SELECT to_regclass(:t) IS NOT NULL"), {"t": nombre}):
+                s.execute(text(f"ALTER TABLE reportes DETACH PARTITION {nombre}"))
+                s.execute(text(f"DROP TABLE {nombre}"))
+            # Restos en la partición default (o todo, sin particiones)
+            s.execute(delete(Reporte).where(*rango))
+            hechos[f"{mes:%Y-%m}"] = len(filas)
+        if previo is None or sig > previo:
+            set_meta(s, "archivo_corte", sig.isoformat())
+        s.commit()
+        mes = sig
+    if previo is None or corte > previo:
+        set_meta(s, "archivo_corte", corte.isoformat())
+        s.commit()
+    # El job mensual también deja creadas las particiones que vienen
+    asegurar_particiones(s)
+    return hechos
+
+
+# =================== Particiones mensuales (Postgres) =======
+#
+# REPORTES_PARTICIONADO=1 convierte `reportes` (en `manage.py migrate`) en una
+# tabla particionada por rango de creado_en, una partición por mes UTC
+# (reportes_pAAAA_MM) más una default. Los filtros por fecha descartan
+# particiones enteras y archivar un mes es un DROP de su partición.
+#
+# Las particiones de los próximos PARTICIONES_ADELANTE meses se crean en cada
+# migrate, `manage.py particiones` y `manage.py archivar` (job mensual); si aun
+# así llega una fila fuera de ellas cae en la default (no falla el INSERT) y
+# se mueve a su partición cuando esta se crea.
+#
+# La PK pasa a ser (id, creado_en) y los índices únicos de `reportes` deben
+# incluir creado_en: (uuid_cliente, creado_en) ya no impide dos filas con el
+# mismo uuid y distinta fecha (p. ej. un reintento sin creado_en del cliente).
+# La unicidad que exige la idempotencia (insertar_lote_cliente, Idempotency-Key)
+# la da la tabla sin particionar reportes_uuid (uuid_cliente PK -> reporte_id):
+# insertar_reportes la llena en la misma transacción, así que un uuid repetido
+# sigue fallando con IntegrityError, y ids_por_uuid la consulta en vez de
+# recorrer el índice de cada partición. archivar_reportes borra sus filas.
+
+REPORTES_PARTICIONADO = os.getenv("REPORTES_PARTICIONADO", "0") == "1"
+# Meses hacia adelante que se dejan creados en cada migrate / `manage.py particiones` / archivar
+PARTICIONES_ADELANTE = int(os.getenv("PARTICIONES_ADELANTE", "3"))
+# Llave de pg_advisory_xact_lock: migrate y archivar no crean la misma partición a la vez
+_LOCK_PARTICIONES = 481517
+
+# URL del engine -> existe reportes_uuid (una consulta por proceso; migrate
+# corre antes que los workers y particionar_reportes la reinicia)
+_reportes_uuid: Dict[str, bool] = {}
+
+
+def _usa_reportes_uuid(s: Session) -> bool:
+    bind = s.get_bind()
+    if bind.dialect.name != "postgresql":
+        return False
+    clave = bind.url.render_as_string(hide_password=False)
+    if clave not in _reportes_uuid:
+        _reportes_uuid[clave] = bool(s.scalar(text("SELECT to_regclass('reportes_uuid') IS NOT NULL")))
+    return _reportes_uuid[clave]
+
+
+def _nombre_particion(mes: datetime.datetime) -> str:
+    return f"reportes_p{mes:%Y_%m}"
+
+
+def reportes_particionado(s: Session) -> bool:
+    if s.get_bind().dialect.name != "postgresql":
+        return False
+    return bool(s.scalar(text(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('reportes')"
+    )))
+
+
+def _crear_particiones(s: Session, desde_mes: datetime.datetime, hasta_mes: datetime.datetime) -> List[str]:
+    """
+    Crea las particiones de [desde_mes, hasta_mes] que falten. Si la default
+    ya tiene filas de ese mes, las mueve a la partición nueva antes de
+    adjuntarla. No hace commit.
+    """
+    creadas = []
+    hay_default = s.scalar(text("SELECT to_regclass('reportes_pdefault') IS NOT NULL"))
+    mes = desde_mes
+    while mes <= hasta_mes:
+        sig = archivo.sumar_meses(mes, 1)
+        nombre = _nombre_particion(mes)
+        if not s.scalar(text("SELECT to_regclass(:t) IS NOT NULL"), {"t": nombre}):
+            a, b = f"{mes:%Y-%m-%d} 00:00:00+00", f"{sig:%Y-%m-%d} 00:00:00+00"
+            s.execute(text(f"CREATE TABLE {nombre} (LIKE reportes INCLUDING DEFAULTS)"))
+            if hay_default:
+                s.execute(text(
+                    f"WITH m AS (DELETE FROM reportes_pdefault"
+                    f" WHERE creado_en >= '{a}' AND creado_en < '{b}' RETURNING *)"
+                    f" INSERT INTO {nombre} SELECT * FROM m"
+                ))
+            s.execute(text(f"ALTER TABLE reportes ATTACH PARTITION {nombre} FOR VALUES FROM ('{a}') TO ('{b}')"))
+            creadas.append(nombre)
+        mes = sig
+    return creadas
+
+
+def asegurar_particiones(s: Session) -> List[str]:
+    """Deja creadas las particiones del mes actual y PARTICIONES_ADELANTE siguientes. Hace commit."""
+    if not reportes_particionado(s):
+        return []
+    s.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": _LOCK_PARTICIONES})
+    actual = archivo.inicio_mes(datetime.datetime.now(datetime.timezone.utc))
+    creadas = _crear_particiones(s, actual, archivo.sumar_meses(actual, PARTICIONES_ADELANTE))
+    s.commit()
+    return creadas
+
+
+def particionar_reportes(s: Session) -> bool:
+    """
+    Convierte `reportes` en tabla particionada por mes (solo Postgres), en una
+    sola transacción con la tabla bloqueada: copia las filas y recrea PK,
+    llave foránea e índices. Devuelve False si no aplica o ya estaba. Hace commit.
+    """
+    if s.get_bind().dialect.name != "postgresql" or reportes_particionado(s):
+        return False
+    s.execute(text("LOCK TABLE reportes IN ACCESS EXCLUSIVE MODE"))
+    secuencia = s.scalar(text("SELECT pg_get_serial_sequence('reportes', 'id')"))
+    # La llave foránea del índice de texto exige id único: ya no lo es solo
+    if s.scalar(text("SELECT to_regclass('reportes_busqueda') IS NOT NULL")):
+        s.execute(text("ALTER TABLE reportes_busqueda DROP CONSTRAINT IF EXISTS reportes_busqueda_reporte_id_fkey"))
+    # Libera los nombres de PK e índices para la tabla nueva
+    for (nombre,) in s.execute(text(
+        "SELECT conname FROM pg_constraint WHERE conrelid = 'reportes'::regclass AND contype IN ('p', 'u')"
+    )).all():
+        s.execute(text(f'ALTER TABLE reportes DROP CONSTRAINT "{nombre}"'))
+    for (nombre,) in s.execute(text(
+        "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = 'reportes'"
+    )).all():
+        s.execute(text(f'DROP INDEX "{nombre}"'))
+    if secuencia:
+        s.execute(text(f"ALTER SEQUENCE {secuencia} OWNED BY NONE"))
+
+    s.execute(text("ALTER TABLE reportes RENAME TO reportes_sin_particionar"))
+    s.execute(text(
+        "CREATE TABLE reportes (LIKE reportes_sin_particionar INCLUDING DEFAULTS)"
+        " PARTITION BY RANGE (creado_en)"
+    ))
+    s.execute(text("ALTER TABLE reportes ADD PRIMARY KEY (id, creado_en)"))
+    s.execute(text("ALTER TABLE reportes ADD FOREIGN KEY (id_bano) REFERENCES banos(id) ON DELETE CASCADE"))
+    s.execute(text("CREATE TABLE reportes_pdefault PARTITION OF reportes DEFAULT"))
+    actual = archivo.inicio_mes(datetime.datetime.now(datetime.timezone.utc))
+    minimo = s.scalar(text("SELECT min(creado_en) FROM reportes_sin_particionar"))
+    _crear_particiones(
+        s,
+        archivo.inicio_mes(minimo) if minimo is not None else actual,
+        archivo.sumar_meses(actual, PARTICIONES_ADELANTE),
+    )
+    s.execute(text("INSERT INTO reportes SELECT * FROM reportes_sin_particionar"))
+    if secuencia:
+        s.execute(text(f"ALTER SEQUENCE {secuencia} OWNED BY reportes.id"))
+    s.execute(text("DROP TABLE reportes_sin_particionar"))
+    s.execute(text(
+        "CREATE TABLE IF NOT EXISTS reportes_uuid ("
+        " uuid_cliente VARCHAR PRIMARY KEY, reporte_id BIGINT NOT NULL)"
+    ))
+    s.execute(text(
+        "INSERT INTO reportes_uuid (uuid_cliente, reporte_id)"
+        " SELECT uuid_cliente, id FROM reportes WHERE uuid_cliente IS NOT NULL"
+        " ON CONFLICT DO NOTHING"
+    ))
+
+    conn = s.connection()
+    for idx in Reporte.__table__.indexes:
+        if idx.unique:
+            # Un índice único de tabla particionada debe incluir la llave de partición
+            cols = ", ".join(c.name for c in idx.columns)
+            s.execute(text(f"CREATE UNIQUE INDEX {idx.name} ON reportes ({cols}, creado_en)"))
+        else:
+            idx.create(conn)
+    s.commit()
+    _reportes_uuid.clear()
+    return True
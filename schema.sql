@@ -1,3 +1,5 @@
+-- Referencia del esquema (SQLite). La fuente de verdad es models.py +
+-- migraciones.py: `python manage.py migrate` crea/actualiza la BD.
 PRAGMA foreign_keys = ON;
 
 CREATE TABLE IF NOT EXISTS banos (
@@ -15,13 +17,45 @@ CREATE TABLE IF NOT EXISTS reportes (
   categoria TEXT NOT NULL,
   comentario TEXT,
   foto_url TEXT,
+  foto_thumb_url TEXT,
   origen TEXT DEFAULT 'qr',
   creado_en DATETIME DEFAULT CURRENT_TIMESTAMP,
   creado_por_ip TEXT,
   estado TEXT DEFAULT 'abierto',
+  uuid_cliente TEXT,
   FOREIGN KEY (id_bano) REFERENCES banos(id)
 );
 
 CREATE INDEX IF NOT EXISTS idx_reportes_bano_fecha ON reportes(id_bano, creado_en DESC);
+CREATE INDEX IF NOT EXISTS idx_reportes_fecha_id ON reportes(creado_en DESC, id DESC);
 CREATE INDEX IF NOT EXISTS idx_reportes_categoria ON reportes(categoria);
 CREATE INDEX IF NOT EXISTS idx_reportes_estado ON reportes(estado);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_reportes_uuid_cliente ON reportes(uuid_cliente);
+
+-- Rollup por día local (ROLLUP_TZ), baño y categoría; lo mantiene create_reporte
+CREATE TABLE IF NOT EXISTS reportes_diarios (
+  dia DATE NOT NULL,
+  id_bano TEXT NOT NULL,
+  categoria TEXT NOT NULL,
+  total INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (dia, id_bano, categoria)
+);
+
+-- Rollup por día y hora local, baño y categoría (heatmap); lo mantiene create_reporte
+CREATE TABLE IF NOT EXISTS reportes_horarios (
+  dia DATE NOT NULL,
+  hora INTEGER NOT NULL,
+  id_bano TEXT NOT NULL,
+  categoria TEXT NOT NULL,
+  total INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (dia, hora, id_bano, categoria)
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+  clave TEXT PRIMARY KEY,
+  valor TEXT
+);
+
+-- Índice de texto del buscador (rowid = reportes.id). En Postgres se usa
+-- reportes_busqueda + GIN gin_trgm_ops (ver models.init_busqueda)
+CREATE VIRTUAL TABLE IF NOT EXISTS reportes_fts USING fts5(doc, tokenize='trigram');
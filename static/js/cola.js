@@ -0,0 +1,149 @@
+// Cola local de reportes (IndexedDB) para el kiosko y el QR.
+// Cada reporte se guarda primero aquí con un uuid propio y luego se envía
+// en lotes a /api/reportes/bulk, que es idempotente: si la red se cae a
+// medio envío, reenviar el mismo uuid no duplica el reporte. Los que llevan
+// foto (el lote es JSON) se guardan con ella y van de uno en uno a
+// /api/reportes en multipart, con el uuid como Idempotency-Key.
+(function(){
+  const DB = 'banos-cola', STORE = 'reportes', LOTE = 50, REINTENTO_MS = 30000;
+
+  function abrir(){
+    return new Promise((ok, err)=>{
+      const r = indexedDB.open(DB, 1);
+      r.onupgradeneeded = ()=> r.result.createObjectStore(STORE, { keyPath: 'uuid' });
+      r.onsuccess = ()=> ok(r.result);
+      r.onerror = ()=> err(r.error);
+    });
+  }
+
+  // Ejecuta fn(store) en una transacción y resuelve con el resultado de su request
+  async function enStore(modo, fn){
+    const db = await abrir();
+    return new Promise((ok, err)=>{
+      const t = db.transaction(STORE, modo);
+      const req = fn(t.objectStore(STORE));
+      t.oncomplete = ()=>{ db.close(); ok(req && 'result' in req ? req.result : undefined); };
+      t.onerror = ()=>{ db.close(); err(t.error); };
+    });
+  }
+
+  function nuevoUuid(){
+    if (crypto.randomUUID) return crypto.randomUUID();
+    const b = crypto.getRandomValues(new Uint8Array(16));
+    b[6] = (b[6] & 0x0f) | 0x40; b[8] = (b[8] & 0x3f) | 0x80;
+    const h = Array.from(b, x=>x.toString(16).padStart(2, '0')).join('');
+    return `${h.slice(0,8)}-${h.slice(8,12)}-${h.slice(12,16)}-${h.slice(16,20)}-${h.slice(20)}`;
+  }
+
+  async function encolar(rep){
+    rep.uuid = rep.uuid || nuevoUuid();
+    rep.creado_en = rep.creado_en || new Date().toISOString();
+    await enStore('readwrite', st=> st.put(rep));
+    return rep;
+  }
+
+  function pendientes(){
+    return enStore('readonly', st=> st.getAll());
+  }
+
+  // Un reporte (con su foto) por /api/reportes. Resuelve con el resultado
+  // del servidor, o null si hay que reintentar (429/5xx); sin red lanza.
+  async function enviarUno(rep){
+    const fd = new FormData();
+    ['id_bano', 'categoria', 'comentario', 'origen', 'creado_en'].forEach(k=>{
+      if (rep[k] != null) fd.append(k, rep[k]);
+    });
+    if (rep.foto) fd.append('foto', rep.foto, rep.foto.name || 'foto.jpg');
+    const r = await fetch('/api/reportes', {
+      method: 'POST',
+      headers: { 'Idempotency-Key': rep.uuid },
+      body: fd,
+    });
+    if (r.status === 429 || r.status >= 500) return null;
+    let j;
+    try { j = await r.json(); }
+    catch (e) { j = { ok: false, error: r.status === 413 ? 'La foto es demasiado grande' : 'Error al enviar' }; }
+    return { ...j, uuid: rep.uuid };
+  }
+
+  // Envía lo pendiente por lotes. Resuelve con {uuid: resultado} de lo que
+  // el servidor confirmó; lo que no se pudo enviar queda en la cola.
+  let enCurso = null;
+  function sincronizar(){
+    if (enCurso) return enCurso;
+    enCurso = (async ()=>{
+      const hechos = {};
+      try {
+        for (const rep of (await pendientes()).filter(x=> x.foto)) {
+          const x = await enviarUno(rep);
+          if (!x) break;   // 429/5xx: se reintenta más tarde
+          hechos[x.uuid] = x;
+          await enStore('readwrite', st=> st.delete(x.uuid));
+        }
+        for (;;) {
+          const lote = (await pendientes()).filter(x=> !x.foto).slice(0, LOTE);
+          if (!lote.length) break;
+          const r = await fetch('/api/reportes/bulk', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ reportes: lote }),
+          });
+          if (!r.ok) break;   // 429/5xx: se reintenta más tarde
+          const j = await r.json();
+          // Los rechazados (baño inexistente, etc.) también salen de la cola;
+          // los frenados por el límite del baño (reintentar) se quedan
+          await enStore('readwrite', st=>{
+            j.resultados.forEach(x=>{
+              if (x.reintentar) return;
+              hechos[x.uuid] = x; st.delete(x.uuid);
+            });
+          });
+          if (j.resultados.some(x=> x.reintentar)) break;
+        }
+      } catch (e) {
+        // sin red: queda pendiente
+      }
+      return hechos;
+    })().finally(()=>{ enCurso = null; });
+    return enCurso;
+  }
+
+  // Resultado de un reporte recién encolado (undefined = sigue pendiente).
+  // Si ya había una sincronización en curso pudo haber leído la cola antes
+  // de que llegara este uuid: se espera a que termine y se lanza otra.
+  async function sincronizarUno(uuid){
+    const previa = enCurso;
+    let hechos = await sincronizar();
+    if (!(uuid in hechos) && previa) hechos = await sincronizar();
+    return hechos[uuid];
+  }
+
+  // Envío desde el formulario. Resuelve con el resultado del servidor, o
+  // undefined si quedó guardado en la cola para enviarse después. Sin cola
+  // (sin IndexedDB, modo privado) se envía directo con el mismo uuid y lo
+  // que falle se informa: no hay nada guardado para reintentar.
+  async function enviar(rep){
+    rep.uuid = nuevoUuid();
+    rep.creado_en = new Date().toISOString();
+    try {
+      await encolar(rep);
+    } catch (e) {
+      try {
+        return (await enviarUno(rep)) || { ok: false, error: 'El servidor está ocupado, intenta de nuevo' };
+      } catch (e2) {
+        return { ok: false, error: 'Sin conexión, intenta de nuevo' };
+      }
+    }
+    return sincronizarUno(rep.uuid);
+  }
+
+  window.addEventListener('online', sincronizar);
+  setInterval(sincronizar, REINTENTO_MS);
+  document.addEventListener('DOMContentLoaded', sincronizar);
+
+  if ('serviceWorker' in navigator) {
+    navigator.serviceWorker.register('/sw.js').catch(()=>{});
+  }
+
+  window.ColaReportes = { encolar, enviar, pendientes, sincronizar, sincronizarUno };
+})();
@@ -106,29 +106,43 @@ document.addEventListener('DOMContentLoaded', async ()=>{
     });
   });
 
-  // Envío
+  // Envío: primero a la cola local (IndexedDB) y de ahí al servidor (js/cola.js);
+  // si no hay red el reporte, con su foto, se envía solo al reconectar.
   document.getElementById('f').addEventListener('submit', async (e)=>{
     e.preventDefault();
     if(!idBano.value){ alert('Selecciona un baño'); return; }
     if(!inCat.value){ alert('Selecciona una categoría'); return; }
+    btnEnviar.disabled = true;   // evita el doble toque mientras se envía
     const fd = new FormData(e.target);
-    const r = await fetch('/api/reportes', { method:'POST', body:fd });
-    const j = await r.json();
-    const s = document.getElementById('status');
-    if(j.ok){
-      s.textContent = '¡Gracias! Ticket #' + j.reporte_id;
-      s.style.color = '#2e7d32';
-      // limpiar para siguiente persona
+    const foto = fd.get('foto');
+    const j = await ColaReportes.enviar({
+      id_bano: fd.get('id_bano'),
+      categoria: fd.get('categoria'),
+      comentario: fd.get('comentario') || '',
+      origen: 'kiosko',
+      foto: foto && foto.size ? foto : undefined,
+    });
+    if(!j || j.ok){
+      // limpiar para siguiente persona (si falló, se conserva para reintentar)
       e.target.reset();
       chips.forEach(x=>x.classList.remove('active'));
       inCat.value = '';
-      btnEnviar.disabled = true;
       // mantenemos el baño seleccionado para agilizar múltiples reportes
-      s.scrollIntoView({behavior:'smooth', block:'center'});
+    }
+    btnEnviar.disabled = !inCat.value;
+
+    const s = document.getElementById('status');
+    if(!j){
+      s.textContent = 'Sin conexión: el reporte se guardó y se enviará automáticamente.';
+      s.style.color = '#8a6d00';
+    }else if(j.ok){
+      s.textContent = '¡Gracias! Ticket #' + j.reporte_id;
+      s.style.color = '#2e7d32';
     }else{
       s.textContent = 'Error: ' + (j.error||'intenta de nuevo');
       s.style.color = 'crimson';
     }
+    s.scrollIntoView({behavior:'smooth', block:'center'});
   });
 
   // Go!
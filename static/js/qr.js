@@ -12,23 +12,39 @@ document.addEventListener('DOMContentLoaded', ()=>{
     });
   });
 
+  // Envío vía la cola local (js/cola.js): sin red queda guardado, con su
+  // foto, y se envía al reconectar
   document.getElementById('f').addEventListener('submit', async (e)=>{
     e.preventDefault();
     if(!inCat.value){
       alert('Selecciona una categoría antes de enviar.');
       return;
     }
+    btn.disabled = true;   // evita el doble toque mientras se envía
     const fd = new FormData(e.target);
-    const r = await fetch('/api/reportes', { method:'POST', body:fd });
-    const j = await r.json();
-    const s = document.getElementById('status');
-    if(j.ok){
-      s.textContent = '¡Gracias! Ticket #' + j.reporte_id;
-      s.style.color = '#2e7d32';
+    const foto = fd.get('foto');
+    const j = await ColaReportes.enviar({
+      id_bano: fd.get('id_bano'),
+      categoria: fd.get('categoria'),
+      comentario: fd.get('comentario') || '',
+      origen: 'qr',
+      foto: foto && foto.size ? foto : undefined,
+    });
+    if(!j || j.ok){
+      // si falló, el formulario se conserva para reintentar
       e.target.reset();
       chips.forEach(x=>x.classList.remove('active'));
       inCat.value = '';
-      btn.disabled = true;
+    }
+    btn.disabled = !inCat.value;
+
+    const s = document.getElementById('status');
+    if(!j){
+      s.textContent = 'Sin conexión: el reporte se guardó y se enviará automáticamente.';
+      s.style.color = '#8a6d00';
+    }else if(j.ok){
+      s.textContent = '¡Gracias! Ticket #' + j.reporte_id;
+      s.style.color = '#2e7d32';
     }else{
       s.textContent = 'Error: ' + (j.error||'intenta de nuevo');
       s.style.color = 'crimson';
@@ -6,10 +6,12 @@ function $(id){ return document.getElementById(id); }
 // ------------------ Persistencia y estado ------------------
 const STORAGE_KEY = 'reportes.filters.v1';
 const AR_KEY = 'reportes.autorefresh.v1';
-let H = { page:1, pages:1, per_page:10 };     // paginación
+let H = { page:1, per_page:10, cursors:[''], next:null };  // paginación por cursor
 let AUTO = { enabled:false, interval:10 };    // autorefresh
 let autoTimer = null;
 let isRefreshing = false;
+let live = null;            // EventSource de /api/stream
+let liveTimer = null;
 
 const TZ = Intl.DateTimeFormat().resolvedOptions().timeZone || "";
 
@@ -97,6 +99,33 @@ function startAuto(){
   }, AUTO.interval * 1000);
 }
 
+// ------------------ En vivo (SSE) ------------------
+// Con el stream abierto no se sondea: cada reporte nuevo dispara un refresh
+// (agrupado). Si el stream no está disponible se vuelve al intervalo.
+function scheduleRefresh(){
+  if(liveTimer) return;
+  liveTimer = setTimeout(()=>{
+    liveTimer = null;
+    if(!document.hidden) refreshAll();
+  }, 800);
+}
+function stopLive(){
+  if(live){ live.close(); live = null; }
+}
+function startLive(){
+  stopLive();
+  if(!AUTO.enabled || typeof EventSource === 'undefined') return;
+  const q = new URLSearchParams();
+  if(TZ) q.append('tz', TZ);
+  live = new EventSource(`/api/stream?${q.toString()}`);
+  live.addEventListener('open', ()=> stopAuto());
+  live.addEventListener('reporte', ()=> scheduleRefresh());
+  live.addEventListener('error', ()=>{
+    // CLOSED = el servidor rechazó (p. ej. 503); CONNECTING = reintenta solo
+    if(live && live.readyState === EventSource.CLOSED){ live = null; startAuto(); }
+  });
+}
+
 // ------------------ Render helpers ------------------
 function fmtFechaLocal(s){
   try{
@@ -178,17 +207,19 @@ async function cargarHist(){
     if(zona)  q.append('zona', zona);
     if(bano)  q.append('id_bano', bano);
     if(TZ)    q.append('tz', TZ);
-    q.append('page', H.page);
+    q.append('cursor', H.cursors[H.page-1] || '');
     q.append('per_page', H.per_page);
 
     const r = await fetch(`/api/reportes_list?${q.toString()}`);
     const j = await r.json();
-    H.pages = j.pages || 1;
+    H.next = j.next_cursor || null;
+    if(H.next) H.cursors[H.page] = H.next;
 
     const info = $('hist_info');
     if(info){
+      const de = (j.total == null) ? '' : ` de ${j.total_exacto ? '' : '~'}${j.total}`;
       info.textContent =
-        `Mostrando ${j.items.length ? ((H.page-1)*H.per_page+1) : 0}–${(H.page-1)*H.per_page + j.items.length} de ${j.total}`;
+        `Mostrando ${j.items.length ? ((H.page-1)*H.per_page+1) : 0}–${(H.page-1)*H.per_page + j.items.length}${de}`;
     }
 
     const tb = $('hist_tbody');
@@ -204,7 +235,7 @@ async function cargarHist(){
           <td>${it.zona || '-'}</td>
           <td>${it.piso || '-'}</td>
           <td>${it.sexo || '-'}</td>
-          <td>${it.comentario ? it.comentario : '-'}</td>
+          <td>${it.comentario ? it.comentario : '-'}${it.foto_thumb_url ? ` <a href="${it.foto_url}" target="_blank"><img src="${it.foto_thumb_url}" alt="foto" loading="lazy" style="height:40px;vertical-align:middle;border-radius:4px;"></a>` : ''}</td>
         `;
         tb.appendChild(tr);
       });
@@ -212,12 +243,13 @@ async function cargarHist(){
 
     const prev = $('hist_prev'), next = $('hist_next');
     if(prev) prev.disabled = (H.page <= 1);
-    if(next) next.disabled = (H.page >= H.pages);
+    if(next) next.disabled = !H.next;
 
     const f = readFiltersFromUI();
-    if((j.total||0) === 0 && anyFiltersActive(f)){
+    const vacio = H.page === 1 && !(j.items||[]).length;
+    if(vacio && anyFiltersActive(f)){
       setHint('Sin resultados con los filtros actuales. Prueba “Limpiar filtros”.');
-    }else if((j.total||0) === 0){
+    }else if(vacio){
       setHint('Aún no hay respuestas registradas.');
     }else{
       setHint('');
@@ -274,8 +306,13 @@ async function initFiltros(){
   saveFilters(readFiltersFromUI());
 }
 
+function resetPaginacion(){
+  H.page = 1; H.cursors = ['']; H.next = null;
+}
+
 function clearFilters(){
   try{ localStorage.removeItem(STORAGE_KEY); }catch{}
+  resetPaginacion();
   if($('f_zona')) $('f_zona').value = '';
   if($('f_bano')) $('f_bano').value = '';
   if($('desde')) $('desde').value = toYMD(daysAgo(5));
@@ -284,7 +321,9 @@ function clearFilters(){
 }
 
 document.addEventListener('visibilitychange', ()=>{
-  // no reiniciamos timers aquí; usamos la guarda document.hidden en el tick
+  // no reiniciamos timers aquí; usamos la guarda document.hidden en el tick.
+  // En vivo, al volver a la pestaña se recupera lo que llegó oculto.
+  if(!document.hidden && live) refreshAll();
 });
 
 document.addEventListener('DOMContentLoaded', ()=>{
@@ -293,13 +332,14 @@ document.addEventListener('DOMContentLoaded', ()=>{
     if(H.page > 1){ H.page--; await cargarHist(); }
   });
   $('hist_next')?.addEventListener('click', async ()=>{
-    if(H.page < H.pages){ H.page++; await cargarHist(); }
+    if(H.next){ H.page++; await cargarHist(); }
   });
 
   // Botón Actualizar
   $('refrescar')?.addEventListener('click', async ()=>{
     normalizeDateRange();
     saveFilters(readFiltersFromUI());
+    resetPaginacion();   // los cursores dependen de los filtros
     await refreshAll();
   });
 
@@ -309,6 +349,19 @@ document.addEventListener('DOMContentLoaded', ()=>{
     await refreshAll();
   });
 
+  // Exportar (descarga en streaming con los filtros actuales)
+  $('exportar')?.addEventListener('click', ()=>{
+    normalizeDateRange();
+    const q = new URLSearchParams({ formato:'csv' });
+    const {desde, hasta, zona, bano} = readFiltersFromUI();
+    if(desde) q.append('desde', desde);
+    if(hasta) q.append('hasta', hasta);
+    if(zona)  q.append('zona', zona);
+    if(bano)  q.append('id_bano', bano);
+    if(TZ)    q.append('tz', TZ);
+    window.location.href = `/api/reportes/export?${q.toString()}`;
+  });
+
   // Auto-save filtros
   wireAutoSaveFilters();
 
@@ -318,16 +371,16 @@ document.addEventListener('DOMContentLoaded', ()=>{
 
   $('auto_toggle')?.addEventListener('change', ()=>{
     readARfromUI();
-    if(AUTO.enabled){ startAuto(); refreshAll(); } else { stopAuto(); }
+    if(AUTO.enabled){ startAuto(); startLive(); refreshAll(); } else { stopAuto(); stopLive(); }
   });
   $('auto_interval')?.addEventListener('change', ()=>{
     readARfromUI();
-    if(AUTO.enabled){ startAuto(); } // reinicia con nuevo intervalo
+    if(AUTO.enabled && !live){ startAuto(); } // reinicia con nuevo intervalo
   });
 
   // Primer render + arranque auto si aplica
   initFiltros().then(async ()=>{
     await refreshAll();
-    if(AUTO.enabled){ startAuto(); }
+    if(AUTO.enabled){ startAuto(); startLive(); }
   });
 });
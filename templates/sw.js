@@ -0,0 +1,54 @@
+// Service worker del kiosko y del formulario QR (lo genera /sw.js).
+// - /assets/* (URLs con huella): cache-first, nunca cambian.
+// - /encuesta, /qr y /api/banos: red primero y, sin red, la última copia.
+// Los envíos no pasan por aquí: la cola vive en IndexedDB (js/cola.js).
+const CACHE = 'banos-{{ version }}';
+const SHELL = {{ shell | tojson }};
+
+self.addEventListener('install', e=>{
+  e.waitUntil(caches.open(CACHE).then(c=> c.addAll(SHELL)).then(()=> self.skipWaiting()));
+});
+
+self.addEventListener('activate', e=>{
+  e.waitUntil(
+    caches.keys()
+      .then(ks=> Promise.all(ks.filter(k=> k.startsWith('banos-') && k !== CACHE).map(k=> caches.delete(k))))
+      .then(()=> self.clients.claim())
+  );
+});
+
+async function redPrimero(req, respaldo){
+  const cache = await caches.open(CACHE);
+  try {
+    const r = await fetch(req);
+    if (r.ok) cache.put(req, r.clone());
+    return r;
+  } catch (e) {
+    return (await cache.match(req)) || (respaldo && await cache.match(respaldo)) || Response.error();
+  }
+}
+
+async function cachePrimero(req){
+  const cache = await caches.open(CACHE);
+  const hit = await cache.match(req);
+  if (hit) return hit;
+  const r = await fetch(req);
+  if (r.ok) cache.put(req, r.clone());
+  return r;
+}
+
+self.addEventListener('fetch', e=>{
+  const req = e.request;
+  if (req.method !== 'GET') return;
+  const url = new URL(req.url);
+  if (url.origin !== location.origin) return;
+
+  if (url.pathname.startsWith('/assets/')) {
+    e.respondWith(cachePrimero(req));
+  } else if (req.mode === 'navigate' && (url.pathname === '/encuesta' || url.pathname === '/qr')) {
+    // Un QR nunca visitado cae al kiosko, que deja elegir el baño
+    e.respondWith(redPrimero(req, '/encuesta'));
+  } else if (url.pathname === '/api/banos') {
+    e.respondWith(redPrimero(req));
+  }
+});